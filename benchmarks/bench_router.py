@@ -0,0 +1,62 @@
+﻿# benchmarks/bench_router.py
+"""Micro-benchmark : chaîne if/elif sur query.data contre CallbackRouter.
+
+Usage : python -m benchmarks.bench_router
+"""
+import timeit
+
+from modules.callbacks import CallbackCodec
+from modules.router import CallbackRouter
+
+ROUTE_COUNTS = (10, 40, 160)
+NUMBER = 20000
+
+
+async def _handler(update, context, *args):
+    return args
+
+
+def build_chain(count):
+    """Reproduit l'ancien handle_normal_buttons : == puis startswith, dans l'ordre"""
+    exact = [f"button_{i}" for i in range(count)]
+    prefixes = [f"prefix_{i}_" for i in range(count)]
+
+    def dispatch(data):
+        for value in exact:
+            if data == value:
+                return ()
+        for prefix in prefixes:
+            if data.startswith(prefix):
+                return tuple(data[len(prefix):].split("_", 1))
+        return None
+
+    return dispatch
+
+
+def build_router(count):
+    codec = CallbackCodec(actions={f"action_{i}": (f"a{i}", ('id',)) for i in range(count)})
+    router = CallbackRouter(codec)
+    for i in range(count):
+        router.add_exact(f"button_{i}", _handler)
+        router.add_action(f"action_{i}", _handler)
+    return router, codec
+
+
+def main():
+    print(f"{'routes':>8} {'cible':>10} {'elif (µs)':>12} {'routeur (µs)':>14}")
+    for count in ROUTE_COUNTS:
+        chain = build_chain(count)
+        router, codec = build_router(count)
+        last = count - 1
+        cases = {
+            'exact': (f"button_{last}", f"button_{last}"),
+            'préfixe': (f"prefix_{last}_Catégorie_Produit", codec.encode(f"action_{last}", 4242)),
+        }
+        for label, (chain_data, router_data) in cases.items():
+            chain_time = timeit.timeit(lambda: chain(chain_data), number=NUMBER)
+            router_time = timeit.timeit(lambda: router.resolve(router_data), number=NUMBER)
+            print(f"{count:>8} {label:>10} {chain_time / NUMBER * 1e6:>12.3f} {router_time / NUMBER * 1e6:>14.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+﻿# benchmarks/bench_users.py
+"""Benchmark : dict de dicts (ancien format) contre UserRegistry.
+
+Mesure la mémoire occupée, le chargement depuis le JSON, la sauvegarde et
+l'obtention de la première page des utilisateurs les plus récents.
+
+Usage : python -m benchmarks.bench_users [taille ...]
+"""
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from modules.users import LAST_SEEN_FORMAT, SORT_RECENT, UserRegistry
+
+SIZES = (100_000, 1_000_000)
+FIRST_NAMES = ['Jean', 'Marie', 'Pierre', 'Sophie', 'Lucas', 'Emma', 'Hugo', 'Léa', 'Louis', 'Chloé']
+LAST_NAMES = ['Martin', 'Bernard', 'Dubois', 'Thomas', 'Robert', 'Richard', 'Petit', 'Durand', None, None]
+
+
+def build_legacy_json(size):
+    """Fichier users.json dans l'ancien format (last_seen en texte)"""
+    now = int(time.time())
+    users = {}
+    for user_id in range(10_000_000, 10_000_000 + size):
+        users[str(user_id)] = {
+            'username': f"user{user_id}" if user_id % 3 else None,
+            'first_name': random.choice(FIRST_NAMES),
+            'last_name': random.choice(LAST_NAMES),
+            'last_seen': datetime.utcfromtimestamp(now - random.randrange(90 * 86400)).strftime(LAST_SEEN_FORMAT)
+        }
+    return json.dumps(users)
+
+
+def measure(build):
+    """Retourne (objet, durée en s, mémoire allouée en Mo) ; la durée est mesurée sans tracemalloc"""
+    gc.collect()
+    start = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    memory = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    return result, elapsed, memory
+
+
+def load_dicts(raw):
+    return {int(k): v for k, v in json.loads(raw).items()}
+
+
+def load_registry(raw):
+    registry = UserRegistry()
+    registry.load(json.loads(raw))
+    return registry
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def bench_dicts(size, raw):
+    """Ancien format ; la mémoire est libérée au retour de la fonction"""
+    users, load_time, memory = measure(lambda: load_dicts(raw))
+    save_time = timed(lambda: json.dumps({str(k): v for k, v in users.items()}, indent=4))
+    page_time = timed(lambda: sorted(users.items(), key=lambda item: item[1]['last_seen'], reverse=True)[:20])
+    print(f"{size:>9} {'dicts':>10} {memory:>13.1f} {load_time:>15.2f} {save_time:>15.2f} {page_time * 1e3:>10.2f}")
+
+
+def bench_registry(size, raw):
+    """UserRegistry chargé depuis l'ancien format ; retourne le JSON compact sauvegardé"""
+    registry, load_time, memory = measure(lambda: load_registry(raw))
+    compact = None
+
+    def save():
+        nonlocal compact
+        compact = json.dumps(registry.snapshot())
+
+    save_time = timed(save)
+    page_time = timed(lambda: registry.page(SORT_RECENT, 0, 20))
+    print(f"{size:>9} {'registre':>10} {memory:>13.1f} {load_time:>15.2f} {save_time:>15.2f} {page_time * 1e3:>10.2f}")
+    return compact
+
+
+def bench_compact(size, compact):
+    """Rechargement du fichier compact (last_seen déjà en epoch)"""
+    _, load_time, memory = measure(lambda: load_registry(compact))
+    print(f"{size:>9} {'compact':>10} {memory:>13.1f} {load_time:>15.2f} {'-':>15} {'-':>10}")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    print(f"{'taille':>9} {'format':>10} {'mémoire (Mo)':>13} {'chargement (s)':>15} "
+          f"{'sauvegarde (s)':>15} {'page (ms)':>10}")
+    for size in sizes:
+        raw = build_legacy_json(size)
+        bench_dicts(size, raw)
+        compact = bench_registry(size, raw)
+        bench_compact(size, compact)
+
+
+if __name__ == '__main__':
+    main()
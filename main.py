@@ -5,7 +5,7 @@ import shutil
 import os
 import pytz
 from datetime import datetime, time
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto, InputMediaVideo
 from telegram.ext import (
     Application, 
     CommandHandler, 
@@ -13,12 +13,28 @@ from telegram.ext import (
     MessageHandler, 
     filters, 
     ContextTypes, 
-    ConversationHandler
+    ConversationHandler,
+    TypeHandler
 )
 
 from config.states import *  # Importe tous les états
 from modules.ui_handlers import UIHandler
 from modules.access_control import AccessControl
+from modules.stats import StatsEngine
+from modules.storage import create_storage
+from modules.catalog_cache import CatalogCache
+from modules.product_index import ProductIndex
+from modules.events import CATEGORY_DELETED, EventBus
+from modules.callbacks import callback_codec
+from modules.router import CallbackRouter
+from modules.render_cache import RenderCache
+from modules.media_assets import MediaAssetCache
+from modules.broadcast import BroadcastJobStore, BroadcastProgress, create_broadcast_engine
+from modules.scheduler import ADMIN, BULK, create_rate_limiter
+from modules.message_state import create_message_state
+from modules.prober import create_user_prober
+from modules.activity import ActiveUserCounter, ActivityTracker
+from modules.users import SORT_NAME, SORT_RECENT, UserRegistry
 
 os.makedirs('data', exist_ok=True)
 os.makedirs('config', exist_ok=True)
@@ -65,21 +81,9 @@ EDITING_PRODUCT = "EDITING_PRODUCT"
 
 
 # 4. Définition des fonctions utilitaires
-def save_catalog():
-    """Sauvegarde le catalogue dans le fichier"""
-    try:
-        with open(CONFIG['catalog_file'], 'w', encoding='utf-8') as f:
-            json.dump(CATALOG, f, indent=4, ensure_ascii=False)
-    except Exception as e:
-        print(f"Erreur lors de la sauvegarde du catalogue : {e}")
-
 def load_catalog():
-    """Charge le catalogue depuis le fichier"""
-    try:
-        with open(CONFIG['catalog_file'], 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+    """Charge le catalogue depuis le backend de stockage"""
+    return storage.load_catalog()
 
 def save_config():
     """Sauvegarde la configuration dans le fichier"""
@@ -89,20 +93,28 @@ def save_config():
     except Exception as e:
         print(f"Erreur lors de la sauvegarde de la configuration : {e}")
 
-def save_active_users(active_users):
-    """Sauvegarde la liste des utilisateurs actifs"""
+def save_active_users(users_data):
+    """Enregistre (insertion ou mise à jour) les utilisateurs fournis"""
     try:
-        with open('data/active_users.json', 'w', encoding='utf-8') as f:
-            json.dump(active_users, f, indent=4, ensure_ascii=False)
+        storage.save_users(users_data)
     except Exception as e:
         print(f"Erreur lors de la sauvegarde des utilisateurs actifs : {e}")
 
+def delete_active_users(user_ids):
+    """Supprime des utilisateurs du registre et du stockage"""
+    try:
+        user_registry.remove(user_ids)
+        storage.delete_users(user_ids)
+        user_prober.forget(user_ids)
+    except Exception as e:
+        print(f"Erreur lors de la suppression des utilisateurs : {e}")
+
 def load_active_users():
-    """Charge la liste des utilisateurs actifs"""
+    """Charge les données des utilisateurs actifs depuis le stockage"""
     try:
-        with open('data/active_users.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
+        return storage.load_users()
+    except Exception as e:
+        print(f"Erreur lors du chargement des utilisateurs actifs: {e}")
         return {}
 
 # Charger la configuration
@@ -118,153 +130,106 @@ except KeyError as e:
     print(f"Erreur: La clé {e} est manquante dans le fichier config.json!")
     exit(1)
 
+# Backend de stockage (JSON par défaut, SQLite via CONFIG['storage'])
+storage = create_storage(CONFIG)
+
+# Cache partagé des catégories/produits indexés par id
+catalog_cache = CatalogCache(storage)
+
 # Charger le catalogue avant d'initialiser ui_handler
 CATALOG = load_catalog()
-ACTIVE_USERS = load_active_users()
+
+# Registre compact des utilisateurs ; le stockage JSON l'utilise pour ses sauvegardes
+user_registry = UserRegistry()
+user_registry.load(load_active_users())
+storage.attach_users(user_registry.snapshot)
+
+# Suppressions et renommages du catalogue, suivis par les modules abonnés
+catalog_events = EventBus()
+
+# Les compteurs de vues vivent dans leur propre moteur, hors du catalogue
+stats_engine = StatsEngine(delay=CONFIG.get('stats_flush_delay', 30.0))
+stats_engine.subscribe(catalog_events)
+legacy_stats = CATALOG.pop('stats', None)
+stats_engine.load(legacy_stats)
+if legacy_stats is not None:
+    storage.save_catalog(CATALOG)
+
+# Index des produits par (catégorie, nom) et par id stable
+product_index = ProductIndex(CATALOG, catalog_events)
+for category, product in product_index.build():
+    storage.put_catalog_product(category, product)
+
+# Moteur de diffusion (débit global et par chat via CONFIG['broadcast'])
+broadcast_engine = create_broadcast_engine(CONFIG)
+broadcast_jobs = BroadcastJobStore()
+BROADCAST_ALBUM_DELAY = 1.5  # Secondes d'attente des autres éléments d'un album
+
+# Ordonnanceur des requêtes sortantes : interactif > admin > masse ;
+# les éditions identiques au message affiché ne sont pas envoyées
+# (CONFIG['message_state']['skip_unchanged'], un seul processus uniquement)
+message_state = create_message_state(CONFIG)
+rate_limiter = create_rate_limiter(CONFIG, message_state)
+
+# Vérification en arrière-plan des utilisateurs inactifs (CONFIG['prober'])
+user_prober = create_user_prober(CONFIG)
+user_prober.load()
+PROBE_INTERVAL = CONFIG.get('prober', {}).get('interval', 6 * 3600)
+
+# last_seen et profils mis à jour depuis les updates reçus, écrits par lots
+activity_tracker = ActivityTracker(user_registry, storage.save_users, flush_interval=CONFIG.get('activity_flush_interval', 30.0))
+
+# Utilisateurs actifs distincts par jour (DAU/WAU/MAU), sur 30 jours glissants
+active_counter = ActiveUserCounter('data/active_days.json', delay=CONFIG.get('stats_flush_delay', 30.0))
+active_counter.load()
+broadcast_jobs.load()
+
+# Jetons courts des catégories pour les callback_data
+callback_codec.register_categories(CATALOG.keys())
+
+# Aiguillage de tous les boutons inline (une route par action)
+callback_router = CallbackRouter(callback_codec)
 
 from modules.ui_handlers import UIHandler
 from modules.access_control import AccessControl
 
 # Initialiser les modules dans le bon ordre
-ui_handler = UIHandler(CONFIG, save_active_users, CATALOG, ADMIN_IDS)  # Ajout de ADMIN_IDS
-access_control = AccessControl(CONFIG, save_config, ADMIN_IDS)
-access_control.set_default_callback(ui_handler.show_home)
+# Écrans déjà rendus (textes et claviers), par version du catalogue
+render_cache = RenderCache(CONFIG.get('render_cache_size', 512))
 
-# Variables globales pour les statistiques
-STATS_CACHE = None
-LAST_CACHE_UPDATE = None
+# file_id des fichiers locaux déjà envoyés (bannière), à côté de CONFIG['banner_image']
+asset_cache = MediaAssetCache(CONFIG.setdefault('media_assets', {}), save_config)
 
-def save_active_users(users_data):
-    """Sauvegarde les données des utilisateurs actifs dans un fichier"""
-    try:
-        with open('data/active_users.json', 'w', encoding='utf-8') as f:
-            # Convertir les IDs en strings pour le JSON
-            data = {str(user_id): info for user_id, info in users_data.items()}
-            json.dump(data, f, indent=4, ensure_ascii=False)
-    except Exception as e:
-        print(f"Erreur lors de la sauvegarde des utilisateurs actifs: {e}")
+ui_handler = UIHandler(CONFIG, save_active_users, CATALOG, ADMIN_IDS, catalog_cache, render_cache,
+                       asset_cache)  # Ajout de ADMIN_IDS
+access_control = AccessControl(CONFIG, storage, ADMIN_IDS)
+access_control.set_default_callback(ui_handler.show_home)
 
-def load_active_users():
-    """Charge les données des utilisateurs actifs depuis le fichier"""
-    try:
-        with open('data/active_users.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            if isinstance(data, list):  # Ancien format (liste d'IDs)
-                # Convertir en nouveau format
-                return {int(user_id): {
-                    'username': None,
-                    'first_name': None,
-                    'last_name': None,
-                    'last_seen': datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-                } for user_id in data}
-            else:  # Nouveau format (dictionnaire)
-                return {int(k): v for k, v in data.items()}
-    except FileNotFoundError:
-        return {}
-    except Exception as e:
-        print(f"Erreur lors du chargement des utilisateurs actifs: {e}")
-        return {}
+# Routes servies par les modules
+callback_router.add_exact('admin', ui_handler.show_admin_menu)
+callback_router.add_exact('back_to_home', ui_handler.show_home)
+callback_router.add_action('show_category_id', ui_handler.show_products)
+callback_router.add_action('product_details_id', ui_handler.show_product_details)
+callback_router.add_exact('toggle_access_control', access_control.toggle_access_control)
+callback_router.add_exact('generate_code', access_control.generate_new_code)
 
 # Fonctions de gestion du catalogue
 
 def save_catalog(catalog):
-    with open(CONFIG['catalog_file'], 'w', encoding='utf-8') as f:
-        json.dump(catalog, f, indent=4, ensure_ascii=False)
-
-def clean_stats():
-    """Nettoie les statistiques des produits et catégories qui n'existent plus"""
-    if 'stats' not in CATALOG:
-        return
-    
-    stats = CATALOG['stats']
-    
-    # Nettoyer les vues par catégorie
-    if 'category_views' in stats:
-        categories_to_remove = []
-        for category in stats['category_views']:
-            if category not in CATALOG or category == 'stats':
-                categories_to_remove.append(category)
-        
-        for category in categories_to_remove:
-            del stats['category_views'][category]
-            print(f"🧹 Suppression des stats de la catégorie: {category}")
-
-    # Nettoyer les vues par produit
-    if 'product_views' in stats:
-        categories_to_remove = []
-        for category in stats['product_views']:
-            if category not in CATALOG or category == 'stats':
-                categories_to_remove.append(category)
-                continue
-            
-            products_to_remove = []
-            existing_products = [p['name'] for p in CATALOG[category]]
-            
-            for product_name in stats['product_views'][category]:
-                if product_name not in existing_products:
-                    products_to_remove.append(product_name)
-            
-            # Supprimer les produits qui n'existent plus
-            for product in products_to_remove:
-                del stats['product_views'][category][product]
-                print(f"🧹 Suppression des stats du produit: {product} dans {category}")
-            
-            # Si la catégorie est vide après nettoyage, la marquer pour suppression
-            if not stats['product_views'][category]:
-                categories_to_remove.append(category)
-        
-        # Supprimer les catégories vides
-        for category in categories_to_remove:
-            if category in stats['product_views']:
-                del stats['product_views'][category]
+    """Enregistre le catalogue complet dans le backend de stockage"""
+    storage.save_catalog(catalog)
 
-    # Mettre à jour la date de dernière modification
-    stats['last_updated'] = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-    save_catalog(CATALOG)
+def format_trend(trend):
+    """Résumé d'une tendance : vues 24 h / 7 jours et évolution sur une semaine"""
+    text = f"24 h: {trend['last_24h']}, 7 j: {trend['last_7d']}"
+    if trend['week_over_week'] is not None:
+        arrow = "↗️" if trend['week_over_week'] >= 0 else "↘️"
+        text += f", {arrow} {trend['week_over_week']:+.0f} %"
+    return text
 
 def get_stats():
-    global STATS_CACHE, LAST_CACHE_UPDATE
-    current_time = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # Si le cache existe et a moins de 30 secondes
-    if STATS_CACHE and LAST_CACHE_UPDATE and (current_time - LAST_CACHE_UPDATE).seconds < 30:
-        return STATS_CACHE
-        
-    # Sinon, lire le fichier et mettre à jour le cache
-    STATS_CACHE = load_catalog()['stats']
-    LAST_CACHE_UPDATE = current_time
-    return STATS_CACHE
-
-def save_active_users(users_data):
-    """Sauvegarde les données des utilisateurs actifs dans un fichier"""
-    try:
-        with open('data/active_users.json', 'w', encoding='utf-8') as f:
-            # Convertir les IDs en strings pour le JSON
-            data = {str(user_id): info for user_id, info in users_data.items()}
-            json.dump(data, f, indent=4, ensure_ascii=False)
-    except Exception as e:
-        print(f"Erreur lors de la sauvegarde des utilisateurs actifs: {e}")
-
-def load_active_users():
-    """Charge les données des utilisateurs actifs depuis le fichier"""
-    try:
-        with open('data/active_users.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            if isinstance(data, list):  # Ancien format (liste d'IDs)
-                # Convertir en nouveau format
-                return {int(user_id): {
-                    'username': None,
-                    'first_name': None,
-                    'last_name': None,
-                    'last_seen': datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-                } for user_id in data}
-            else:  # Nouveau format (dictionnaire)
-                return {int(k): v for k, v in data.items()}
-    except FileNotFoundError:
-        return {}
-    except Exception as e:
-        print(f"Erreur lors du chargement des utilisateurs actifs: {e}")
-        return {}
+    """Retourne les statistiques courantes"""
+    return stats_engine.to_dict()
 
 def backup_data():
     """Crée une sauvegarde des fichiers de données"""
@@ -282,15 +247,18 @@ def backup_data():
     if os.path.exists("config/catalog.json"):
         shutil.copy2("config/catalog.json", f"{backup_dir}/catalog_{timestamp}.json")
 
+    # Backup stats.json
+    if os.path.exists(stats_engine.path):
+        shutil.copy2(stats_engine.path, f"{backup_dir}/stats_{timestamp}.json")
+
 def print_catalog_debug():
     """Fonction de debug pour afficher le contenu du catalogue"""
     for category, products in CATALOG.items():
-        if category != 'stats':
-            print(f"\nCatégorie: {category}")
-            for product in products:
-                print(f"  Produit: {product['name']}")
-                if 'media' in product:
-                    print(f"    Médias ({len(product['media'])}): {product['media']}")
+        print(f"\nCatégorie: {category}")
+        for product in products:
+            print(f"  Produit: {product['name']}")
+            if 'media' in product:
+                print(f"    Médias ({len(product['media'])}): {product['media']}")
 
 # Fonctions de base
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -299,96 +267,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if has_access:
         return await ui_handler.show_home(update, context)
     return WAITING_ACCESS_CODE
-    
-    # Sauvegarder les informations de l'utilisateur
-    context.bot_data['active_users'][user.id] = {
-        'username': user.username,
-        'first_name': user.first_name,
-        'last_name': user.last_name,
-        'last_seen': datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-    }
-    save_active_users(context.bot_data['active_users'])
-    # Supprimer le message /start
-    await update.message.delete()
-    
-    # Supprimer les anciens messages si nécessaire
-    if 'menu_message_id' in context.user_data:
-        try:
-            await context.bot.delete_message(
-                chat_id=chat_id,
-                message_id=context.user_data['menu_message_id']
-            )
-        except:
-            pass
-    
-    # Nouveau clavier simplifié pour l'accueil
-    keyboard = [
-        [InlineKeyboardButton("📋 MENU", callback_data="show_categories")]
-    ]
-
-    # Ajouter le bouton admin si l'utilisateur est administrateur
-    if str(update.effective_user.id) in ADMIN_IDS:
-        keyboard.append([InlineKeyboardButton("🔧 Menu Admin", callback_data="admin")])
-
-    # Ajouter les boutons de contact et canaux
-    keyboard.extend([
-        [
-            InlineKeyboardButton("📞 Contact telegram", url=f"https://t.me/{CONFIG['contact_username']}"),
-            InlineKeyboardButton("📝 Canal telegram", url="https://t.me/+LT2G6gMsMjY3MWFk"),
-        ],
-        [InlineKeyboardButton("🥔 Canal potato", url="https://doudlj.org/joinchat/5ZEmn25bOsTR7f-aYdvC0Q")]
-    ])
-    
-    welcome_text = (
-        "🌿 *Bienvenue sur le bot test de DDLAD* 🌿\n\n"
-        "Ceci n'est pas le produit final.\n"
-        "Ce bot est juste un bot test, pour tester mes conneries dessus.\n\n"
-        "📋 Cliquez sur MENU pour voir les catégories"
-    )
-
-    try:
-        # Vérifier si une image banner est configurée
-        if CONFIG.get('banner_image'):
-            # Si un ancien message banner existe, le supprimer
-            if 'banner_message_id' in context.user_data:
-                try:
-                    await context.bot.delete_message(
-                        chat_id=chat_id,
-                        message_id=context.user_data['banner_message_id']
-                    )
-                except:
-                    pass
-            
-            # Envoyer la nouvelle image banner
-            banner_message = await context.bot.send_photo(
-                chat_id=chat_id,
-                photo=CONFIG['banner_image']
-            )
-            context.user_data['banner_message_id'] = banner_message.message_id
-
-        # Envoyer le menu d'accueil
-        menu_message = await context.bot.send_message(
-            chat_id=chat_id,
-            text=welcome_text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode='Markdown'
-        )
-        context.user_data['menu_message_id'] = menu_message.message_id
-        
-    except Exception as e:
-        print(f"Erreur lors du démarrage: {e}")
-        # En cas d'erreur, envoyer au moins le menu
-        menu_message = await context.bot.send_message(
-            chat_id=chat_id,
-            text=welcome_text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode='Markdown'
-        )
-        context.user_data['menu_message_id'] = menu_message.message_id
-    
-    return CHOOSING
 
 
+@callback_router.route("about")
 async def about(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Affiche la page À propos"""
     keyboard = [[InlineKeyboardButton("🔙 Retour", callback_data="back_to_home")]]
@@ -410,6 +291,7 @@ async def about(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
     return CHOOSING
 
+@callback_router.route("contact")
 async def contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Affiche la page Contact"""
     keyboard = [[InlineKeyboardButton("🔙 Retour", callback_data="back_to_home")]]
@@ -431,6 +313,7 @@ async def contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
     return CHOOSING
 
+@callback_router.route("back_to_admin", "cancel_add_category")
 async def admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Gère l'accès au menu administrateur"""
     user_id = str(update.effective_user.id)
@@ -520,11 +403,8 @@ async def finish_adding_media(update: Update, context: ContextTypes.DEFAULT_TYPE
         'media': context.user_data.get('temp_product_media')
     }
     
-    if category not in CATALOG:
-        CATALOG[category] = []
-    
-    CATALOG[category].append(new_product)
-    save_catalog(CATALOG)
+    product_index.add(category, new_product)
+    storage.put_catalog_product(category, new_product)
     
     await query.message.edit_text(
         "✅ Produit ajouté avec succès !",
@@ -544,7 +424,7 @@ async def add_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Afficher les catégories disponibles
     keyboard = []
     for category in CATALOG.keys():
-        keyboard.append([InlineKeyboardButton(category, callback_data=f"select_category_{category}")])
+        keyboard.append([InlineKeyboardButton(category, callback_data=callback_codec.encode('select_category', category))])
     
     keyboard.append([InlineKeyboardButton("🔙 Annuler", callback_data="cancel_add_product")])
     
@@ -566,7 +446,7 @@ async def handle_product_category_button(update: Update, context: ContextTypes.D
     query = update.callback_query
     await query.answer()
     
-    category = query.data.replace("select_category_", "")
+    _, (category,) = callback_codec.decode(query.data)
     context.user_data['temp_product_category'] = category
     
     await query.message.edit_text(
@@ -593,10 +473,8 @@ async def confirm_add_product(update: Update, context: ContextTypes.DEFAULT_TYPE
         'media': context.user_data.get('temp_product_media', [])
     }
 
-    if category not in CATALOG:
-        CATALOG[category] = []
-    CATALOG[category].append(new_product)
-    save_catalog(CATALOG)
+    product_index.add(category, new_product)
+    storage.put_catalog_product(category, new_product)
     
     await query.message.edit_text(
         "✅ Produit ajouté avec succès !",
@@ -620,7 +498,7 @@ async def remove_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
             keyboard.append([
                 InlineKeyboardButton(
                     f"{product['name']} ({category})", 
-                    callback_data=f"remove_product_{category}_{product['name']}"
+                    callback_data=callback_codec.encode('remove_product', product['id'])
                 )
             ])
     
@@ -638,12 +516,14 @@ async def confirm_remove_product(update: Update, context: ContextTypes.DEFAULT_T
     await query.answer()
     
     try:
-        _, category, product_name = query.data.replace("remove_product_", "").split("_", 2)
+        _, (product_id,) = callback_codec.decode(query.data)
+        category, product = product_index.get_by_id(product_id)
+        product_name = product['name']
         
         keyboard = [
             [
                 InlineKeyboardButton("✅ Oui, supprimer", 
-                    callback_data=f"really_remove_product_{category}_{product_name}"),
+                    callback_data=callback_codec.encode('really_remove_product', product_id)),
                 InlineKeyboardButton("❌ Non, annuler", 
                     callback_data="cancel_remove_product")
             ]
@@ -667,7 +547,7 @@ async def edit_product_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     try:
-        _, product_id = query.data.split("_", 1)
+        _, (product_id,) = callback_codec.decode(query.data)
         context.user_data['editing_product_id'] = product_id
         
         keyboard = [
@@ -692,15 +572,15 @@ async def edit_product_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def daily_maintenance(context: ContextTypes.DEFAULT_TYPE):
     """Tâches de maintenance quotidiennes"""
     try:
+        # Écrire les modifications en attente avant la sauvegarde
+        await activity_tracker.flush()
+        await storage.flush()
+        await stats_engine.writer.flush()
+        await active_counter.writer.flush()
+
         # Backup des données
         backup_data()
         
-        # Nettoyage des utilisateurs inactifs
-        await clean_inactive_users(context)
-        
-        # Nettoyage des stats
-        clean_stats()
-        
     except Exception as e:
         print(f"Erreur lors de la maintenance quotidienne : {e}")
 
@@ -735,6 +615,7 @@ async def daily_maintenance(context: ContextTypes.DEFAULT_TYPE):
     
     return WAITING_PRODUCT_MEDIA
 
+@callback_router.route("add_category")
 async def add_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Démarre le processus d'ajout d'une catégorie"""
     keyboard = [[InlineKeyboardButton("❌ Annuler", callback_data="cancel_add_category")]]
@@ -754,26 +635,18 @@ async def handle_category_name(update: Update, context: ContextTypes.DEFAULT_TYP
     """Gère la réception du nom de la nouvelle catégorie"""
     category_name = update.message.text
     
-    try:
-        # Charger les catégories existantes
-        with open('data/categories.json', 'r', encoding='utf-8') as f:
-            categories = json.load(f)
-    except FileNotFoundError:
-        categories = []
+    # Charger les catégories existantes
+    categories = catalog_cache.categories()
     
     # Créer un nouvel ID unique
     new_id = str(max([int(cat['id']) for cat in categories] + [0]) + 1)
     
     # Ajouter la nouvelle catégorie
-    categories.append({
+    catalog_cache.save_category({
         'id': new_id,
         'name': category_name
     })
     
-    # Sauvegarder les modifications
-    with open('data/categories.json', 'w', encoding='utf-8') as f:
-        json.dump(categories, f, ensure_ascii=False, indent=4)
-    
     # Confirmer l'ajout
     keyboard = [[InlineKeyboardButton("🔙 Retour au menu admin", callback_data="back_to_admin")]]
     await update.message.reply_text(
@@ -784,18 +657,17 @@ async def handle_category_name(update: Update, context: ContextTypes.DEFAULT_TYP
     
     return CHOOSING
 
+@callback_router.route("remove_category")
 async def remove_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Affiche la liste des catégories à supprimer"""
-    try:
-        with open('data/categories.json', 'r', encoding='utf-8') as f:
-            categories = json.load(f)
-        
+    categories = catalog_cache.categories()
+    if categories:
         keyboard = []
         for category in categories:
             keyboard.append([
                 InlineKeyboardButton(
                     f"❌ {category['name']}", 
-                    callback_data=f"delete_category_{category['id']}"
+                    callback_data=callback_codec.encode('delete_category_id', category['id'])
                 )
             ])
         
@@ -810,7 +682,7 @@ async def remove_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         return REMOVING_CATEGORY
         
-    except FileNotFoundError:
+    else:
         keyboard = [[InlineKeyboardButton("🔙 Retour", callback_data="back_to_admin")]]
         await update.callback_query.answer()
         await update.callback_query.message.edit_text(
@@ -819,23 +691,17 @@ async def remove_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return CHOOSING
 
-async def handle_category_deletion(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@callback_router.action("delete_category_id")
+async def handle_category_deletion(update: Update, context: ContextTypes.DEFAULT_TYPE, category_id):
     """Gère la suppression d'une catégorie"""
     query = update.callback_query
-    category_id = query.data.split('_')[2]
     
     try:
-        # Charger les catégories
-        with open('data/categories.json', 'r', encoding='utf-8') as f:
-            categories = json.load(f)
-        
         # Trouver et supprimer la catégorie
-        category_name = ""
-        categories = [cat for cat in categories if cat['id'] != category_id]
-        
-        # Sauvegarder les modifications
-        with open('data/categories.json', 'w', encoding='utf-8') as f:
-            json.dump(categories, f, ensure_ascii=False, indent=4)
+        category = catalog_cache.get_category(category_id)
+        catalog_cache.delete_category(category_id)
+        if category is not None and category['name'] not in CATALOG:
+            catalog_events.emit(CATEGORY_DELETED, category['name'])
         
         keyboard = [[InlineKeyboardButton("🔙 Retour au menu admin", callback_data="back_to_admin")]]
         await query.answer()
@@ -846,7 +712,8 @@ async def handle_category_deletion(update: Update, context: ContextTypes.DEFAULT
         
         return CHOOSING
         
-    except FileNotFoundError:
+    except Exception as e:
+        print(f"Erreur lors de la suppression de la catégorie: {e}")
         keyboard = [[InlineKeyboardButton("🔙 Retour", callback_data="back_to_admin")]]
         await query.answer()
         await query.message.edit_text(
@@ -929,18 +796,17 @@ async def handle_product_media(update: Update, context: ContextTypes.DEFAULT_TYP
     
     return WAITING_PRODUCT_MEDIA
 
+@callback_router.route("finish_media")
 async def finish_product_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Termine l'ajout des médias et passe à la sélection de la catégorie"""
-    try:
-        with open('data/categories.json', 'r', encoding='utf-8') as f:
-            categories = json.load(f)
-        
+    categories = catalog_cache.categories()
+    if categories:
         keyboard = []
         for category in categories:
             keyboard.append([
                 InlineKeyboardButton(
                     category['name'], 
-                    callback_data=f"select_category_{category['id']}"
+                    callback_data=callback_codec.encode('select_category_id', category['id'])
                 )
             ])
         
@@ -954,7 +820,7 @@ async def finish_product_media(update: Update, context: ContextTypes.DEFAULT_TYP
         
         return WAITING_PRODUCT_CATEGORY
         
-    except FileNotFoundError:
+    else:
         keyboard = [[InlineKeyboardButton("🔙 Retour", callback_data="back_to_admin")]]
         await update.callback_query.answer()
         await update.callback_query.message.edit_text(
@@ -964,12 +830,8 @@ async def finish_product_media(update: Update, context: ContextTypes.DEFAULT_TYP
         return CHOOSING
 
 async def save_product(context: ContextTypes.DEFAULT_TYPE, category_id: str):
-    """Sauvegarde le produit dans le fichier JSON"""
-    try:
-        with open('data/products.json', 'r', encoding='utf-8') as f:
-            products = json.load(f)
-    except FileNotFoundError:
-        products = []
+    """Sauvegarde le produit dans le backend de stockage"""
+    products = catalog_cache.products()
     
     # Créer un nouvel ID unique
     new_id = str(max([int(prod['id']) for prod in products] + [0]) + 1)
@@ -984,12 +846,8 @@ async def save_product(context: ContextTypes.DEFAULT_TYPE, category_id: str):
         'category_id': category_id
     }
     
-    # Ajouter le produit à la liste
-    products.append(new_product)
-    
-    # Sauvegarder les modifications
-    with open('data/products.json', 'w', encoding='utf-8') as f:
-        json.dump(products, f, ensure_ascii=False, indent=4)
+    # Sauvegarder le produit
+    catalog_cache.save_product(new_product)
     
     return new_product
 
@@ -1013,116 +871,183 @@ async def handle_contact_username(update: Update, context: ContextTypes.DEFAULT_
     
     return await show_admin_menu(update, context)
 
-async def handle_normal_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Gestion des boutons normaux"""
+@callback_router.route("add_product")
+async def handle_add_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Choix de la catégorie d'un nouveau produit"""
     query = update.callback_query
     await query.answer()
+    keyboard = []
+    for category in CATALOG.keys():
+        keyboard.append([InlineKeyboardButton(category, callback_data=callback_codec.encode('select_category', category))])
+    keyboard.append([InlineKeyboardButton("🔙 Annuler", callback_data="cancel_add_product")])
 
-    if query.data == "admin":
-        if str(update.effective_user.id) in ADMIN_IDS:
-            return await show_admin_menu(update, context)
-        else:
-            await query.edit_message_text("❌ Vous n'êtes pas autorisé à accéder au menu d'administration.")
-            return CHOOSING
+    await query.message.edit_text(
+        "📝 Sélectionnez la catégorie pour le nouveau produit:",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return SELECTING_CATEGORY
+
+@callback_router.action("select_category", "select_category_id")
+async def handle_select_category(update: Update, context: ContextTypes.DEFAULT_TYPE, category):
+    """Catégorie choisie pour le nouveau produit"""
+    query = update.callback_query
+    await query.answer()
+    context.user_data['temp_product_category'] = category
+
+    await query.message.edit_text(
+        "📝 Veuillez entrer le nom du nouveau produit:",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Annuler", callback_data="cancel_add_product")
+        ]])
+    )
+    return WAITING_PRODUCT_NAME
+
+@callback_router.action("delete_product_category")
+async def handle_delete_product_category(update: Update, context: ContextTypes.DEFAULT_TYPE, category):
+    """Liste des produits à supprimer d'une catégorie"""
+    query = update.callback_query
+    await query.answer()
+    products = CATALOG.get(category, [])
+
+    keyboard = []
+    for product in products:
+        if isinstance(product, dict):
+            keyboard.append([
+                InlineKeyboardButton(
+                    product['name'], 
+                    callback_data=callback_codec.encode('confirm_delete_product', product['id'])
+                )
+            ])
+    keyboard.append([InlineKeyboardButton("🔙 Annuler", callback_data="cancel_delete_product")])
+
+    await query.message.edit_text(
+        f"⚠️ Sélectionnez le produit à supprimer de *{category}* :",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode='Markdown'
+    )
+    return SELECTING_PRODUCT_TO_DELETE
+
+@callback_router.route("delete_category")
+async def handle_delete_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Choix de la catégorie à supprimer"""
+    query = update.callback_query
+    await query.answer()
+    keyboard = []
+    for category in CATALOG.keys():
+        keyboard.append([InlineKeyboardButton(category, callback_data=callback_codec.encode('confirm_delete_category', category))])
+    keyboard.append([InlineKeyboardButton("🔙 Annuler", callback_data="cancel_delete_category")])
+
+    await query.message.edit_text(
+        "⚠️ Sélectionnez la catégorie à supprimer:",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return SELECTING_CATEGORY_TO_DELETE
 
+@callback_router.action("confirm_delete_category")
+async def handle_confirm_delete_category(update: Update, context: ContextTypes.DEFAULT_TYPE, category):
+    """Demande de confirmation avant suppression d'une catégorie"""
+    query = update.callback_query
+    await query.answer()
+    # Ajoutez une étape de confirmation
+    keyboard = [
+        [
+            InlineKeyboardButton("✅ Oui, supprimer", callback_data=callback_codec.encode('really_delete_category', category)),
+            InlineKeyboardButton("❌ Non, annuler", callback_data="cancel_delete_category")
+        ]
+    ]
+    await query.message.edit_text(
+        f"⚠️ *Êtes-vous sûr de vouloir supprimer la catégorie* `{category}` *?*\n\n"
+        f"Cette action supprimera également tous les produits de cette catégorie.\n"
+        f"Cette action est irréversible !",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode='Markdown'
+    )
+    return SELECTING_CATEGORY_TO_DELETE
 
-    elif query.data == "add_category":
+@callback_router.action("really_delete_category")
+async def handle_really_delete_category(update: Update, context: ContextTypes.DEFAULT_TYPE, category):
+    """Suppression d'une catégorie du catalogue"""
+    query = update.callback_query
+    await query.answer()
+    if category in CATALOG:
+        product_index.remove_category(category)
+        storage.delete_catalog_category(category)
         await query.message.edit_text(
-            "📝 Veuillez entrer le nom de la nouvelle catégorie:",
+            f"✅ La catégorie *{category}* a été supprimée avec succès !",
+            parse_mode='Markdown',
             reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔙 Annuler", callback_data="cancel_add_category")
+                InlineKeyboardButton("🔙 Retour au menu", callback_data="admin")
             ]])
         )
-        return WAITING_CATEGORY_NAME
+    return CHOOSING
 
-    elif query.data == "add_product":
-        keyboard = []
-        for category in CATALOG.keys():
-            if category != 'stats':
-                keyboard.append([InlineKeyboardButton(category, callback_data=f"select_category_{category}")])
-        keyboard.append([InlineKeyboardButton("🔙 Annuler", callback_data="cancel_add_product")])
-        
-        await query.message.edit_text(
-            "📝 Sélectionnez la catégorie pour le nouveau produit:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-        return SELECTING_CATEGORY
-
-    elif query.data.startswith("select_category_"):
-        # Ne traiter que si ce n'est PAS une action de suppression
-        if not query.data.startswith("select_category_to_delete_"):
-            category = query.data.replace("select_category_", "")
-            context.user_data['temp_product_category'] = category
-            
-            await query.message.edit_text(
-                "📝 Veuillez entrer le nom du nouveau produit:",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Annuler", callback_data="cancel_add_product")
-                ]])
+@callback_router.route("delete_product")
+async def handle_delete_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Choix de la catégorie du produit à supprimer"""
+    query = update.callback_query
+    await query.answer()
+    keyboard = []
+    for category in CATALOG.keys():
+        keyboard.append([
+            InlineKeyboardButton(
+                category, 
+                callback_data=callback_codec.encode('delete_product_category', category)
             )
-            return WAITING_PRODUCT_NAME
+        ])
+    keyboard.append([InlineKeyboardButton("🔙 Annuler", callback_data="cancel_delete_product")])
 
-    elif query.data.startswith("delete_product_category_"):
-        category = query.data.replace("delete_product_category_", "")
-        products = CATALOG.get(category, [])
-    
-        keyboard = []
-        for product in products:
-            if isinstance(product, dict):
-                keyboard.append([
-                    InlineKeyboardButton(
-                        product['name'], 
-                        callback_data=f"confirm_delete_product_{category}_{product['name']}"
-                    )
-                ])
-        keyboard.append([InlineKeyboardButton("🔙 Annuler", callback_data="cancel_delete_product")])
-    
-        await query.message.edit_text(
-            f"⚠️ Sélectionnez le produit à supprimer de *{category}* :",
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode='Markdown'
-        )
-        return SELECTING_PRODUCT_TO_DELETE
+    await query.message.edit_text(
+        "⚠️ Sélectionnez la catégorie du produit à supprimer:",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return SELECTING_CATEGORY_TO_DELETE
 
-    elif query.data == "delete_category":
-        keyboard = []
-        for category in CATALOG.keys():
-            if category != 'stats':
-                keyboard.append([InlineKeyboardButton(category, callback_data=f"confirm_delete_category_{category}")])
-        keyboard.append([InlineKeyboardButton("🔙 Annuler", callback_data="cancel_delete_category")])
-        
-        await query.message.edit_text(
-            "⚠️ Sélectionnez la catégorie à supprimer:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-        return SELECTING_CATEGORY_TO_DELETE
+@callback_router.action("confirm_delete_product")
+async def handle_confirm_delete_product(update: Update, context: ContextTypes.DEFAULT_TYPE, product_id):
+    """Demande de confirmation avant suppression d'un produit"""
+    query = update.callback_query
+    await query.answer()
+    try:
+        # Retrouver le produit à partir de son id
+        category, product = product_index.get_by_id(product_id)
+        product_name = product['name']
 
-    elif query.data.startswith("confirm_delete_category_"):
-        # Ajoutez une étape de confirmation
-        category = query.data.replace("confirm_delete_category_", "")
+        # Créer le clavier de confirmation
         keyboard = [
             [
-                InlineKeyboardButton("✅ Oui, supprimer", callback_data=f"really_delete_category_{category}"),
-                InlineKeyboardButton("❌ Non, annuler", callback_data="cancel_delete_category")
+                InlineKeyboardButton("✅ Oui, supprimer", 
+                    callback_data=callback_codec.encode('really_delete_product', product['id'])),
+                InlineKeyboardButton("❌ Non, annuler", 
+                    callback_data="cancel_delete_product")
             ]
         ]
+
         await query.message.edit_text(
-            f"⚠️ *Êtes-vous sûr de vouloir supprimer la catégorie* `{category}` *?*\n\n"
-            f"Cette action supprimera également tous les produits de cette catégorie.\n"
+            f"⚠️ *Êtes-vous sûr de vouloir supprimer le produit* `{product_name}` *?*\n\n"
             f"Cette action est irréversible !",
             reply_markup=InlineKeyboardMarkup(keyboard),
             parse_mode='Markdown'
         )
-        return SELECTING_CATEGORY_TO_DELETE
+        return SELECTING_PRODUCT_TO_DELETE
+
+    except Exception as e:
+        print(f"Erreur lors de la confirmation de suppression: {e}")
+        return await show_admin_menu(update, context)
 
+@callback_router.action("really_delete_product")
+async def handle_really_delete_product(update: Update, context: ContextTypes.DEFAULT_TYPE, product_id):
+    """Suppression d'un produit du catalogue"""
+    query = update.callback_query
+    await query.answer()
+    try:
+        category, product = product_index.get_by_id(product_id)
 
-    elif query.data.startswith("really_delete_category_"):
-        category = query.data.replace("really_delete_category_", "")
-        if category in CATALOG:
-            del CATALOG[category]
-            save_catalog(CATALOG)
+        if product is not None:
+            product_name = product['name']
+            product_index.remove(category, product_name)
+            storage.delete_catalog_product(category, product_name)
             await query.message.edit_text(
-                f"✅ La catégorie *{category}* a été supprimée avec succès !",
+                f"✅ Le produit *{product_name}* a été supprimé avec succès !",
                 parse_mode='Markdown',
                 reply_markup=InlineKeyboardMarkup([[
                     InlineKeyboardButton("🔙 Retour au menu", callback_data="admin")
@@ -1130,772 +1055,654 @@ async def handle_normal_buttons(update: Update, context: ContextTypes.DEFAULT_TY
             )
         return CHOOSING
 
-    elif query.data == "delete_product":
-        keyboard = []
-        for category in CATALOG.keys():
-            if category != 'stats':
-                keyboard.append([
-                    InlineKeyboardButton(
-                        category, 
-                        callback_data=f"delete_product_category_{category}"
-                    )
-                ])
-        keyboard.append([InlineKeyboardButton("🔙 Annuler", callback_data="cancel_delete_product")])
-        
-        await query.message.edit_text(
-            "⚠️ Sélectionnez la catégorie du produit à supprimer:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-        return SELECTING_CATEGORY_TO_DELETE
+    except Exception as e:
+        print(f"Erreur lors de la suppression du produit: {e}")
+        return await show_admin_menu(update, context)
 
-    elif query.data.startswith("confirm_delete_product_"):
-        try:
-            # Extraire la catégorie et le nom du produit
-            parts = query.data.replace("confirm_delete_product_", "").split("_")
-            category = parts[0]
-            product_name = "_".join(parts[1:])  # Pour gérer les noms avec des underscores
-        
-            # Créer le clavier de confirmation
-            keyboard = [
-                [
-                    InlineKeyboardButton("✅ Oui, supprimer", 
-                        callback_data=f"really_delete_product_{category}_{product_name}"),
-                    InlineKeyboardButton("❌ Non, annuler", 
-                        callback_data="cancel_delete_product")
-                ]
-            ]
-        
-            await query.message.edit_text(
-                f"⚠️ *Êtes-vous sûr de vouloir supprimer le produit* `{product_name}` *?*\n\n"
-                f"Cette action est irréversible !",
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
-            return SELECTING_PRODUCT_TO_DELETE
-        
-        except Exception as e:
-            print(f"Erreur lors de la confirmation de suppression: {e}")
-            return await show_admin_menu(update, context)
+@callback_router.route("show_stats")
+async def handle_show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Affiche les statistiques du catalogue"""
+    query = update.callback_query
+    await query.answer()
 
-    elif query.data.startswith("really_delete_product_"):
-        try:
-            parts = query.data.replace("really_delete_product_", "").split("_")
-            category = parts[0]
-            product_name = "_".join(parts[1:])
-        
-            if category in CATALOG:
-                CATALOG[category] = [p for p in CATALOG[category] if p['name'] != product_name]
-                save_catalog(CATALOG)
-                await query.message.edit_text(
-                    f"✅ Le produit *{product_name}* a été supprimé avec succès !",
-                    parse_mode='Markdown',
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Retour au menu", callback_data="admin")
-                    ]])
-                )
-            return CHOOSING
-        
-        except Exception as e:
-            print(f"Erreur lors de la suppression du produit: {e}")
-            return await show_admin_menu(update, context)
+    text = "📊 *Statistiques du catalogue*\n\n"
+    text += f"👥 Vues totales: {stats_engine.total_views}\n"
+    text += f"🕒 Dernière mise à jour: {stats_engine.last_updated_str()}\n"
+    text += f"🔄 Dernière réinitialisation: {stats_engine.last_reset}\n"
+    text += "\n"
+
+    # Utilisateurs actifs distincts (estimation)
+    actives = active_counter.summary()
+    text += "👥 *Utilisateurs actifs:*\n"
+    text += f"- Aujourd'hui: {actives['daily']}\n"
+    text += f"- 7 derniers jours: {actives['weekly']}\n"
+    text += f"- 30 derniers jours: {actives['monthly']}\n"
+    text += "\n"
+
+    # Tendances sur les tampons horaires et journaliers
+    text += "📆 *Tendances:*\n"
+    text += f"- Toutes vues: {format_trend(stats_engine.trends())}\n"
+    text += "\n"
+
+    # Vues par catégorie
+    text += "📈 *Vues par catégorie:*\n"
+    if stats_engine.category_views:
+        # Les 10 catégories les plus vues, sans trier tout le compteur
+        for category, views in stats_engine.top_categories(10):
+            if category in CATALOG:  # Vérifier que la catégorie existe toujours
+                text += f"- {category}: {views} vues ({format_trend(stats_engine.trends(category))})\n"
+    else:
+        text += "Aucune vue enregistrée.\n"
+
+    # Séparateur
+    text += "\n━━━━━━━━━━━━━━━\n\n"
+
+    # Vues par produit
+    text += "🔥 *Produits les plus populaires:*\n"
+    if stats_engine.product_views:
+        # Classement tenu à jour à chaque vue ; les 5 premiers produits encore existants
+        top_products = [
+            (category, product_name, views)
+            for category, product_name, views in stats_engine.top_products()
+            if product_index.get(category, product_name)
+        ][:5]
+        for category, product_name, views in top_products:
+            text += f"- {product_name} ({category}): {views} vues\n"
+            text += f"  {format_trend(stats_engine.trends(category, product_name))}\n"
+    else:
+        text += "Aucune vue enregistrée sur les produits.\n"
+
+    # Files d'envoi vers Telegram
+    text += "\n━━━━━━━━━━━━━━━\n\n"
+    text += "📤 *Files d'envoi:*\n"
+    for priority, metrics in rate_limiter.metrics().items():
+        text += (f"- {priority}: {metrics['queued']} en attente (max {metrics['max_queued']}), "
+                 f"attente moy. {metrics['avg_wait'] * 1000:.0f} ms\n")
+    text += (f"- Cache d'affichage: {render_cache.hits} hits, {render_cache.misses} rendus, "
+             f"{len(render_cache)} entrées\n")
+    edits = message_state.metrics()
+    text += f"- Éditions évitées: {edits['skipped']}, {edits['edits']} envoyées\n"
+    text += f"- Éditions inutiles envoyées: {edits['not_modified']} (refusées par Telegram)\n"
+
+    # Ajouter le bouton de réinitialisation des stats
+    keyboard = [
+        [InlineKeyboardButton("🔄 Réinitialiser les statistiques", callback_data="confirm_reset_stats")],
+        [InlineKeyboardButton("🔙 Retour", callback_data="admin")]
+    ]
+    await query.message.edit_text(
+        text,
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode='Markdown'
+    )
 
+@callback_router.route("edit_contact")
+async def handle_edit_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Demande le nouveau contact"""
+    query = update.callback_query
+    await query.answer()
+    await query.message.edit_text(
+        "📱 Veuillez entrer le nouveau nom d'utilisateur Telegram pour le contact (avec ou sans @):",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Annuler", callback_data="cancel_edit_contact")
+        ]])
+    )
+    return WAITING_CONTACT_USERNAME
 
-    elif query.data == "show_stats":
-        if 'stats' not in CATALOG:
-            CATALOG['stats'] = {
-                "total_views": 0,
-                "category_views": {},
-                "product_views": {},
-                "last_updated": datetime.utcnow().strftime("%H:%M:%S"),  # Format heure uniquement
-                "last_reset": datetime.utcnow().strftime("%Y-%m-%d")  # Format date uniquement
-            }
-        
-        # Nettoyer les stats avant l'affichage
-        clean_stats()
-        
-        stats = CATALOG['stats']
-        text = "📊 *Statistiques du catalogue*\n\n"
-        text += f"👥 Vues totales: {stats.get('total_views', 0)}\n"
-        
-        # Convertir le format de l'heure si nécessaire
-        last_updated = stats.get('last_updated', 'Jamais')
-        if len(last_updated) > 8:  # Si la date contient plus que HH:MM:SS
-            try:
-                last_updated = datetime.strptime(last_updated, "%Y-%m-%d %H:%M:%S").strftime("%H:%M:%S")
-            except:
-                pass
-        text += f"🕒 Dernière mise à jour: {last_updated}\n"
-        
-        if 'last_reset' in stats:
-            text += f"🔄 Dernière réinitialisation: {stats.get('last_reset', 'Jamais')}\n"
-        text += "\n"
-        
-        # Vues par catégorie
-        text += "📈 *Vues par catégorie:*\n"
-        category_views = stats.get('category_views', {})
-        if category_views:
-            sorted_categories = sorted(category_views.items(), key=lambda x: x[1], reverse=True)
-            for category, views in sorted_categories:
-                if category in CATALOG:  # Vérifier que la catégorie existe toujours
-                    text += f"- {category}: {views} vues\n"
-        else:
-            text += "Aucune vue enregistrée.\n"
+@callback_router.route("cancel_add_product", "cancel_delete_category", "cancel_delete_product",
+                      "cancel_edit_contact", "cancel_edit", "cancel_broadcast")
+async def handle_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Boutons d'annulation"""
+    query = update.callback_query
+    await query.answer()
+    return await show_admin_menu(update, context)
 
-        # Séparateur
-        text += "\n━━━━━━━━━━━━━━━\n\n"
-        
-        # Vues par produit
-        text += "🔥 *Produits les plus populaires:*\n"
-        product_views = stats.get('product_views', {})
-        if product_views:
-            # Créer une liste de tous les produits existants avec leurs vues
-            all_products = []
-            for category, products in product_views.items():
-                if category in CATALOG:  # Vérifier que la catégorie existe
-                    existing_products = [p['name'] for p in CATALOG[category]]
-                    for product_name, views in products.items():
-                        if product_name in existing_products:  # Vérifier que le produit existe
-                            all_products.append((category, product_name, views))
-            
-            # Trier par nombre de vues et prendre les 5 premiers
-            sorted_products = sorted(all_products, key=lambda x: x[2], reverse=True)[:5]
-            for category, product_name, views in sorted_products:
-                text += f"- {product_name} ({category}): {views} vues\n"
-        else:
-            text += "Aucune vue enregistrée sur les produits.\n"
-        
-        # Ajouter le bouton de réinitialisation des stats
-        keyboard = [
-            [InlineKeyboardButton("🔄 Réinitialiser les statistiques", callback_data="confirm_reset_stats")],
-            [InlineKeyboardButton("🔙 Retour", callback_data="admin")]
-        ]
-        await query.message.edit_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode='Markdown'
-        )
-
-    elif query.data == "edit_contact":
-        await query.message.edit_text(
-            "📱 Veuillez entrer le nouveau nom d'utilisateur Telegram pour le contact (avec ou sans @):",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔙 Annuler", callback_data="cancel_edit_contact")
-            ]])
-        )
-        return WAITING_CONTACT_USERNAME
-
-    # Boutons d'annulation
-    elif query.data in ["cancel_add_category", "cancel_add_product", "cancel_delete_category", 
-                       "cancel_delete_product", "cancel_edit_contact"]:
-        return await show_admin_menu(update, context)
+@callback_router.route("back_to_categories")
+async def handle_back_to_categories(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Retour à la liste des catégories"""
+    query = update.callback_query
+    await query.answer()
+    keyboard = []
+    for category in CATALOG.keys():
+        keyboard.append([InlineKeyboardButton(category, callback_data=callback_codec.encode('view_category', category))])
 
-    elif query.data == "back_to_categories":
-        keyboard = []
-        for category in CATALOG.keys():
-            if category != 'stats':
-                keyboard.append([InlineKeyboardButton(category, callback_data=f"view_{category}")])
-        
-        # Ajout des boutons de contact/redirection
-        contact_buttons = [
+    # Ajout des boutons de contact/redirection
+    contact_buttons = [
         [
             InlineKeyboardButton("📞 Contact telegram", url=f"https://t.me/{CONFIG['contact_username']}"),
             InlineKeyboardButton("📝 Canal telegram", url="https://t.me/+LT2G6gMsMjY3MWFk"),
         ],
         [InlineKeyboardButton("🥔 Canal potato", url="https://doudlj.org/joinchat/5ZEmn25bOsTR7f-aYdvC0Q")]
     ]
-        keyboard.extend(contact_buttons)
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        welcome_text = (
-            "🌿 *Bienvenue chez Green Attack* 🌿\n\n"
-            "Ceci n'est pas le produit final\n"
-            "Ce bot est juste un bot test, pour tester mes conneries dessus.\n\n"
-            "📱 Cliquez sur MENU pour voir les catégories\n"
-        )
-        
+    keyboard.extend(contact_buttons)
+
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    welcome_text = (
+        "🌿 *Bienvenue chez Green Attack* 🌿\n\n"
+        "Ceci n'est pas le produit final\n"
+        "Ce bot est juste un bot test, pour tester mes conneries dessus.\n\n"
+        "📱 Cliquez sur MENU pour voir les catégories\n"
+    )
+
+    await query.edit_message_text(
+        welcome_text,
+        reply_markup=reply_markup,
+        parse_mode='Markdown'
+    )
+
+@callback_router.route("skip_media")
+async def handle_skip_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ajoute le produit sans média"""
+    query = update.callback_query
+    await query.answer()
+    category = context.user_data.get('temp_product_category')
+    if category:
+        new_product = {
+            'name': context.user_data.get('temp_product_name'),
+            'price': context.user_data.get('temp_product_price'),
+            'description': context.user_data.get('temp_product_description')
+        }
+
+        product_index.add(category, new_product)
+        storage.put_catalog_product(category, new_product)
+
+        context.user_data.clear()
+        return await show_admin_menu(update, context)
+
+def product_caption(product):
+    """Légende d'un produit (nom, prix, description)"""
+    caption = f"📱 *{product['name']}*\n\n"
+    caption += f"💰 *Prix:*\n{product['price']}\n\n"
+    caption += f"📝 *Description:*\n{product['description']}"
+    return caption
+
+def product_keyboard(category, product, index=0):
+    """Boutons du carrousel de médias d'un produit affichant le média `index`.
+
+    La position cible est portée par le callback_data de chaque bouton :
+    aucun état de session n'est nécessaire pour servir un clic.
+    """
+    keyboard = []
+    total_media = len(product['media'])
+    if total_media > 1:
+        keyboard.append([
+            InlineKeyboardButton("⬅️ Précédent", callback_data=callback_codec.encode(
+                'show_media', product['id'], (index - 1) % total_media)),
+            InlineKeyboardButton("➡️ Suivant", callback_data=callback_codec.encode(
+                'show_media', product['id'], (index + 1) % total_media))
+        ])
+    keyboard.append([InlineKeyboardButton("🔙 Retour à la catégorie", callback_data=callback_codec.encode('view_category', category))])
+    return InlineKeyboardMarkup(keyboard)
+
+def render_product(category, product, index=0):
+    """Légende et clavier d'un produit (mis en cache jusqu'à la prochaine modification du catalogue)"""
+    return render_cache.get(
+        'product', (product['id'], index), product_index.version, False,
+        lambda: (product_caption(product), product_keyboard(category, product, index))
+    )
+
+@callback_router.action("product")
+async def handle_show_product(update: Update, context: ContextTypes.DEFAULT_TYPE, product_id):
+    """Affiche un produit et son premier média"""
+    query = update.callback_query
+    await query.answer()
+    category, product = product_index.get_by_id(product_id)
+
+    if product:
+        if 'media' in product and product['media']:
+            # Les médias sont déjà triés par order_index (ProductIndex)
+            current_media = product['media'][0]
+            caption, reply_markup = render_product(category, product)
+
+            await query.message.delete()
+
+            if current_media['media_type'] == 'photo':
+                message = await context.bot.send_photo(
+                    chat_id=query.message.chat_id,
+                    photo=current_media['media_id'],
+                    caption=caption,
+                    reply_markup=reply_markup,
+                    parse_mode='Markdown'
+                )
+            else:
+                message = await context.bot.send_video(
+                    chat_id=query.message.chat_id,
+                    video=current_media['media_id'],
+                    caption=caption,
+                    reply_markup=reply_markup,
+                    parse_mode='Markdown'
+                )
+            # Le carrousel modifie ensuite ce même message
+            context.user_data['last_product_message_id'] = message.message_id
+    if product:
+        # Incrémenter les stats du produit
+        stats_engine.record_product_view(category, product['name'])
+
+@callback_router.action("show_media")
+async def handle_show_media(update: Update, context: ContextTypes.DEFAULT_TYPE, product_id, index):
+    """Navigation entre les médias d'un produit (le média est remplacé dans le même message)"""
+    query = update.callback_query
+    await query.answer()
+    try:
+        category, product = product_index.get_by_id(product_id)
+
+        if product and product.get('media'):
+            media_list = product['media']
+            current_index = int(index) % len(media_list)  # Les médias ont pu changer depuis l'envoi
+            current_media = media_list[current_index]
+
+            caption, reply_markup = render_product(category, product, current_index)
+            input_media = InputMediaPhoto if current_media['media_type'] == 'photo' else InputMediaVideo
+            await query.edit_message_media(
+                media=input_media(
+                    media=current_media['media_id'],
+                    caption=caption,
+                    parse_mode='Markdown'
+                ),
+                reply_markup=reply_markup
+            )
+
+    except Exception as e:
+        print(f"Erreur lors de la navigation des médias: {e}")
+
+@callback_router.route("show_categories")
+async def handle_show_categories(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Menu des catégories du catalogue"""
+    query = update.callback_query
+    await query.answer()
+    new_text, reply_markup = render_cache.get(
+        'categories', None, product_index.version, False, render_categories_menu
+    )
+
+    # Vérifier si le message est différent avant de le modifier
+    if query.message.text != new_text or query.message.reply_markup != reply_markup:
         await query.edit_message_text(
-            welcome_text,
+            new_text,
             reply_markup=reply_markup,
             parse_mode='Markdown'
         )
+    else:
+        await query.answer()
 
-    elif query.data == "skip_media":
-        category = context.user_data.get('temp_product_category')
-        if category:
-            new_product = {
-                'name': context.user_data.get('temp_product_name'),
-                'price': context.user_data.get('temp_product_price'),
-                'description': context.user_data.get('temp_product_description')
-            }
-            
-            if category not in CATALOG:
-                CATALOG[category] = []
-            CATALOG[category].append(new_product)
-            save_catalog(CATALOG)
-            
-            context.user_data.clear()
-            return await show_admin_menu(update, context)
-
-    elif query.data.startswith("product_"):
-            _, category, product_name = query.data.split("_", 2)
-            product = next((p for p in CATALOG[category] if p['name'] == product_name), None)
-        
-            if product:
-                caption = f"📱 *{product['name']}*\n\n"
-                caption += f"💰 *Prix:*\n{product['price']}\n\n"
-                caption += f"📝 *Description:*\n{product['description']}"
-            
-                if 'media' in product and product['media']:
-                    media_list = product['media']
-                    media_list = sorted(media_list, key=lambda x: x.get('order_index', 0))
-                    total_media = len(media_list)
-                    context.user_data['current_media_index'] = 0  # AJOUTER CETTE LIGNE
-                    current_media = media_list[0]
-                
-                    keyboard = []
-                    if total_media > 1:
-                        keyboard.append([
-                            InlineKeyboardButton("⬅️ Précédent", callback_data=f"prev_media_{category}_{product_name}"),
-                            InlineKeyboardButton("➡️ Suivant", callback_data=f"next_media_{category}_{product_name}")
-                        ])
-                    keyboard.append([InlineKeyboardButton("🔙 Retour à la catégorie", callback_data=f"view_{category}")])
-                
-                    await query.message.delete()
-                
-                    if current_media['media_type'] == 'photo':
-                        message = await context.bot.send_photo(
-                            chat_id=query.message.chat_id,
-                            photo=current_media['media_id'],
-                            caption=caption,
-                            reply_markup=InlineKeyboardMarkup(keyboard),
-                            parse_mode='Markdown'
-                        )
-                        context.user_data['last_product_message_id'] = message.message_id
-                    else:
-                        message = await context.bot.send_video(
-                            chat_id=query.message.chat_id,
-                            video=current_media['media_id'],
-                            caption=caption,
-                            reply_markup=InlineKeyboardMarkup(keyboard),
-                            parse_mode='Markdown'
-                        )
-            if product:
-                # Incrémenter les stats du produit
-                if 'stats' not in CATALOG:
-                    CATALOG['stats'] = {...}  # même initialisation que ci-dessus
-    
-                if 'product_views' not in CATALOG['stats']:
-                    CATALOG['stats']['product_views'] = {}
-                if category not in CATALOG['stats']['product_views']:
-                    CATALOG['stats']['product_views'][category] = {}
-                if product['name'] not in CATALOG['stats']['product_views'][category]:
-                    CATALOG['stats']['product_views'][category][product['name']] = 0
-    
-                CATALOG['stats']['product_views'][category][product['name']] += 1
-                CATALOG['stats']['total_views'] += 1
-                CATALOG['stats']['last_updated'] = datetime.utcnow().strftime("%H:%M:%S")
-                save_catalog(CATALOG)
+def render_categories_menu():
+    """Texte et clavier du menu des catégories"""
+    keyboard = []
+    # Créer uniquement les boutons de catégories
+    for category in CATALOG.keys():
+        keyboard.append([InlineKeyboardButton(category, callback_data=callback_codec.encode('view_category', category))])
 
-    # Ajoutez ces gestionnaires pour la navigation entre les médias
-    elif query.data.startswith(("next_media_", "prev_media_")):
-            try:
-                _, direction, category, product_name = query.data.split("_", 3)
-                product = next((p for p in CATALOG[category] if p['name'] == product_name), None)
-
-                if product and 'media' in product:
-                    media_list = sorted(product['media'], key=lambda x: x.get('order_index', 0))
-                    total_media = len(media_list)
-                    current_index = context.user_data.get('current_media_index', 0)
-
-                    # Navigation simple
-                    if direction == "next":
-                        current_index = current_index + 1
-                        if current_index >= total_media:
-                            current_index = 0
-                    else:  # prev
-                        current_index = current_index - 1
-                        if current_index < 0:
-                            current_index = total_media - 1
-
-                    # Une seule fois !
-                    context.user_data['current_media_index'] = current_index
-                    current_media = media_list[current_index]
-
-                    caption = f"📱 *{product['name']}*\n\n"
-                    caption += f"💰 *Prix:*\n{product['price']}\n\n"
-                    caption += f"📝 *Description:*\n{product['description']}"
-
-                    keyboard = []
-                    if total_media > 1:
-                        keyboard.append([
-                            InlineKeyboardButton("⬅️ Précédent", callback_data=f"prev_media_{category}_{product_name}"),
-                            InlineKeyboardButton("➡️ Suivant", callback_data=f"next_media_{category}_{product_name}")
-                        ])
-                    keyboard.append([InlineKeyboardButton("🔙 Retour à la catégorie", callback_data=f"view_{category}")])
-
-                    try:
-                        await query.message.delete()
-                    except Exception as e:
-                        print(f"Erreur lors de la suppression du message: {e}")
-
-                    if current_media['media_type'] == 'photo':
-                        message = await context.bot.send_photo(
-                            chat_id=query.message.chat_id,
-                            photo=current_media['media_id'],
-                            caption=caption,
-                            reply_markup=InlineKeyboardMarkup(keyboard),
-                            parse_mode='Markdown'
-                        )
-                    else:  # video
-                        message = await context.bot.send_video(
-                            chat_id=query.message.chat_id,
-                            video=current_media['media_id'],
-                            caption=caption,
-                            reply_markup=InlineKeyboardMarkup(keyboard),
-                            parse_mode='Markdown'
-                        )
-                    context.user_data['last_product_message_id'] = message.message_id
+    # Ajouter uniquement le bouton retour à l'accueil
+    keyboard.append([InlineKeyboardButton("🔙 Retour à l'accueil", callback_data="back_to_home")])
 
-            except Exception as e:
-                print(f"Erreur lors de la navigation des médias: {e}")
-                await query.answer("Une erreur est survenue")
+    text = "📋 *Menu des catégories*\n\n" \
+           "Choisissez une catégorie pour voir les produits :"
+    return text, InlineKeyboardMarkup(keyboard)
 
-    elif query.data == "show_categories":
-        keyboard = []
-        # Créer uniquement les boutons de catégories
-        for category in CATALOG.keys():
-            if category != 'stats':
-                keyboard.append([InlineKeyboardButton(category, callback_data=f"view_{category}")])
-    
-        # Ajouter uniquement le bouton retour à l'accueil
-        keyboard.append([InlineKeyboardButton("🔙 Retour à l'accueil", callback_data="back_to_home")])
-    
-        new_text = "📋 *Menu des catégories*\n\n" \
-                   "Choisissez une catégorie pour voir les produits :"
-    
-        # Vérifier si le message est différent avant de le modifier
-        if query.message.text != new_text or query.message.reply_markup != InlineKeyboardMarkup(keyboard):
-            await query.edit_message_text(
-                new_text,
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
+@callback_router.route("edit_product")
+async def handle_edit_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Choix de la catégorie du produit à modifier"""
+    query = update.callback_query
+    await query.answer()
+    keyboard = []
+    for category in CATALOG.keys():
+        keyboard.append([
+            InlineKeyboardButton(
+                category, 
+                callback_data=callback_codec.encode('edit_category', category)
             )
-        else:
-            await query.answer()
+        ])
+    keyboard.append([InlineKeyboardButton("🔙 Annuler", callback_data="cancel_edit")])
 
-    elif query.data == "edit_product":
-        keyboard = []
-        for category in CATALOG.keys():
-            if category != 'stats':
-                keyboard.append([
-                    InlineKeyboardButton(
-                        category, 
-                        callback_data=f"editcat_{category}"  # Raccourci ici
-                    )
-                ])
-        keyboard.append([InlineKeyboardButton("🔙 Annuler", callback_data="cancel_edit")])
-        
-        await query.message.edit_text(
-            "✏️ Sélectionnez la catégorie du produit à modifier:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-        return SELECTING_CATEGORY
+    await query.message.edit_text(
+        "✏️ Sélectionnez la catégorie du produit à modifier:",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return SELECTING_CATEGORY
 
-    elif query.data.startswith("editcat_"):  # Nouveau gestionnaire avec nom plus court
-        category = query.data.replace("editcat_", "")
-        products = CATALOG.get(category, [])
-        
-        keyboard = []
-        for product in products:
-            if isinstance(product, dict):
-                # Créer un callback_data plus court
-                callback_data = f"editp_{category}_{product['name']}"[:64]  # Limite à 64 caractères
-                keyboard.append([
-                    InlineKeyboardButton(product['name'], callback_data=callback_data)
-                ])
-        keyboard.append([InlineKeyboardButton("🔙 Annuler", callback_data="cancel_edit")])
-        
-        await query.message.edit_text(
-            f"✏️ Sélectionnez le produit à modifier dans {category}:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-        return SELECTING_PRODUCT_TO_EDIT
+@callback_router.action("edit_category")
+async def handle_edit_product_category(update: Update, context: ContextTypes.DEFAULT_TYPE, category):
+    """Choix du produit à modifier dans une catégorie"""
+    query = update.callback_query
+    await query.answer()
+    products = CATALOG.get(category, [])
 
-    elif query.data.startswith("editp_"):
-        try:
-            _, category, product_name = query.data.split("_", 2)
-            context.user_data['editing_category'] = category
-            context.user_data['editing_product'] = product_name
-            
-            keyboard = [
-                [InlineKeyboardButton("📝 Nom", callback_data="edit_name")],
-                [InlineKeyboardButton("💰 Prix", callback_data="edit_price")],
-                [InlineKeyboardButton("📝 Description", callback_data="edit_desc")],
-                [InlineKeyboardButton("🖼️ Photo/Vidéo", callback_data="edit_media")],
-                [InlineKeyboardButton("🔙 Annuler", callback_data="cancel_edit")]
-            ]
-            
-            await query.message.edit_text(
-                f"✏️ Que souhaitez-vous modifier pour *{product_name}* ?\n"
-                "Sélectionnez un champ à modifier:",
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
-            return EDITING_PRODUCT_FIELD
-        except Exception as e:
-            print(f"Erreur dans editp_: {e}")
-            return await show_admin_menu(update, context)
+    keyboard = []
+    for product in products:
+        if isinstance(product, dict):
+            keyboard.append([
+                InlineKeyboardButton(product['name'], callback_data=callback_codec.encode('edit_product', product['id']))
+            ])
+    keyboard.append([InlineKeyboardButton("🔙 Annuler", callback_data="cancel_edit")])
 
-    elif query.data in ["edit_name", "edit_price", "edit_desc", "edit_media"]:
-        field_mapping = {
-            "edit_name": "name",
-            "edit_price": "price",
-            "edit_desc": "description",
-            "edit_media": "media"
-        }
-        field = field_mapping[query.data]
-        context.user_data['editing_field'] = field
-        
-        category = context.user_data.get('editing_category')
-        product_name = context.user_data.get('editing_product')
-        
-        product = next((p for p in CATALOG[category] if p['name'] == product_name), None)
-        
-        if product:
-            current_value = product.get(field, "Non défini")
-            if field == 'media':
-                await query.message.edit_text(
-                    "📸 Envoyez une nouvelle photo ou vidéo pour ce produit:\n"
-                    "(ou cliquez sur Annuler pour revenir en arrière)",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Annuler", callback_data="cancel_edit")
-                    ]])
-                )
-                return WAITING_PRODUCT_MEDIA
-            else:
-                field_names = {
-                    'name': 'nom',
-                    'price': 'prix',
-                    'description': 'description'
-                }
-                await query.message.edit_text(
-                    f"✏️ Modification du {field_names.get(field, field)}\n"
-                    f"Valeur actuelle : {current_value}\n\n"
-                    "Envoyez la nouvelle valeur :",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Annuler", callback_data="cancel_edit")
-                    ]])
-                )
-                return WAITING_NEW_VALUE
+    await query.message.edit_text(
+        f"✏️ Sélectionnez le produit à modifier dans {category}:",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return SELECTING_PRODUCT_TO_EDIT
 
-    elif query.data == "cancel_edit":
-        return await show_admin_menu(update, context)
+@callback_router.action("edit_product")
+async def handle_edit_product_select(update: Update, context: ContextTypes.DEFAULT_TYPE, product_id):
+    """Choix du champ à modifier"""
+    query = update.callback_query
+    await query.answer()
+    try:
+        category, product = product_index.get_by_id(product_id)
+        if product is None:
+            return await show_admin_menu(update, context)
+        product_name = product['name']
+        context.user_data['editing_category'] = category
+        context.user_data['editing_product'] = product_name
+        context.user_data['editing_product_id'] = product['id']
 
-    elif query.data == "confirm_reset_stats":
-        # Demander confirmation avant de réinitialiser
         keyboard = [
-            [
-                InlineKeyboardButton("✅ Oui, réinitialiser", callback_data="reset_stats_confirmed"),
-                InlineKeyboardButton("❌ Non, annuler", callback_data="admin")
-            ]
+            [InlineKeyboardButton("📝 Nom", callback_data="edit_name")],
+            [InlineKeyboardButton("💰 Prix", callback_data="edit_price")],
+            [InlineKeyboardButton("📝 Description", callback_data="edit_desc")],
+            [InlineKeyboardButton("🖼️ Photo/Vidéo", callback_data="edit_media")],
+            [InlineKeyboardButton("🔙 Annuler", callback_data="cancel_edit")]
         ]
-        
-        await query.message.edit_text(
-            "⚠️ *Êtes-vous sûr de vouloir réinitialiser toutes les statistiques ?*\n\n"
-            "Cette action est irréversible et supprimera :\n"
-            "• Toutes les vues des catégories\n"
-            "• Toutes les vues des produits\n"
-            "• Le compteur de vues total",
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode='Markdown'
-        )
-        
-    elif query.data == "reset_stats_confirmed":
-        # Réinitialiser les statistiques
-        now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-        CATALOG['stats'] = {
-            "total_views": 0,
-            "category_views": {},
-            "product_views": {},
-            "last_updated": now.strftime("%H:%M:%S"),         # Juste l'heure
-            "last_reset": now.strftime("%Y-%m-%d")           # Juste la date
-        }
-        save_catalog(CATALOG)
-        
-        # Afficher un message de confirmation
-        keyboard = [[InlineKeyboardButton("🔙 Retour au menu", callback_data="admin")]]
+
         await query.message.edit_text(
-            "✅ *Les statistiques ont été réinitialisées avec succès!*\n\n"
-            f"Date de réinitialisation : {CATALOG['stats']['last_reset']}\n\n"
-            "Toutes les statistiques sont maintenant à zéro.",
+            f"✏️ Que souhaitez-vous modifier pour *{product_name}* ?\n"
+            "Sélectionnez un champ à modifier:",
             reply_markup=InlineKeyboardMarkup(keyboard),
             parse_mode='Markdown'
         )
+        return EDITING_PRODUCT_FIELD
+    except Exception as e:
+        print(f"Erreur dans edit_product: {e}")
+        return await show_admin_menu(update, context)
 
-    elif query.data.startswith("view_"):
-            category = query.data.replace("view_", "")
-            if category in CATALOG:
-                # D'abord supprimer le message de produit actuel
-                try:
-                    await query.message.delete()
-                except Exception as e:
-                    print(f"Erreur lors de la suppression du message de query: {e}")
-
-                # Si on a un message produit précédent, le supprimer aussi
-                if 'last_product_message_id' in context.user_data:
-                    try:
-                        await context.bot.delete_message(
-                            chat_id=query.message.chat_id,
-                            message_id=context.user_data['last_product_message_id']
-                        )
-                        del context.user_data['last_product_message_id']
-                    except Exception as e:
-                        print(f"Erreur lors de la suppression du message produit: {e}")
-
-            if category in CATALOG:
-                # Incrémenter le compteur total
-                if 'stats' not in CATALOG:
-                    CATALOG['stats'] = {
-                        "total_views": 0,
-                        "category_views": {},
-                        "product_views": {},
-                        "last_updated": datetime.utcnow().strftime("%H:%M:%S")
-                    }
-    
-                # Incrémenter les vues de la catégorie
-                if 'category_views' not in CATALOG['stats']:
-                    CATALOG['stats']['category_views'] = {}
-                if category not in CATALOG['stats']['category_views']:
-                    CATALOG['stats']['category_views'][category] = 0
-                CATALOG['stats']['category_views'][category] += 1
-    
-                CATALOG['stats']['total_views'] += 1
-                CATALOG['stats']['last_updated'] = datetime.utcnow().strftime("%H:%M:%S")
-                save_catalog(CATALOG)
-
-                products = CATALOG[category]
-                # Afficher la liste des produits
-                text = f"*{category}*\n\n"
-                keyboard = []
-                for product in products:
-                    keyboard.append([InlineKeyboardButton(
-                        product['name'],
-                        callback_data=f"product_{category}_{product['name']}"
-                    )])
-            
-                keyboard.append([InlineKeyboardButton("🔙 Retour au menu", callback_data="show_categories")])
-            
-                # Envoyer un nouveau message avec la liste des produits
-                await context.bot.send_message(
-                    chat_id=query.message.chat_id,
-                    text=text,
-                    reply_markup=InlineKeyboardMarkup(keyboard),
-                    parse_mode='Markdown'
-                )    
-                
-    elif query.data == "show_categories":
-        keyboard = []
-        # Créer uniquement les boutons de catégories
-        for category in CATALOG.keys():
-            if category != 'stats':
-                keyboard.append([InlineKeyboardButton(category, callback_data=f"view_{category}")])
-        
-        # Ajouter uniquement le bouton retour à l'accueil
-        keyboard.append([InlineKeyboardButton("🔙 Retour à l'accueil", callback_data="back_to_home")])
-        
-        await query.edit_message_text(
-            "📋 *Menu des catégories*\n\n"
-            "Choisissez une catégorie pour voir les produits :",
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode='Markdown'
-        )
+@callback_router.route("edit_name", "edit_price", "edit_desc", "edit_description", "edit_media")
+async def handle_edit_field(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Demande la nouvelle valeur d'un champ"""
+    query = update.callback_query
+    await query.answer()
+    field_mapping = {
+        "edit_name": "name",
+        "edit_price": "price",
+        "edit_desc": "description",
+        "edit_description": "description",
+        "edit_media": "media"
+    }
+    field = field_mapping[query.data]
+    context.user_data['editing_field'] = field
 
-    elif query.data == "back_to_home":
-        # Créer le keyboard de base
-        keyboard = [
-            [InlineKeyboardButton("📋 MENU", callback_data="show_categories")]
+    category, product = product_index.get_by_id(context.user_data.get('editing_product_id'))
+
+    if product:
+        current_value = product.get(field, "Non défini")
+        if field == 'media':
+            await query.message.edit_text(
+                "📸 Envoyez une nouvelle photo ou vidéo pour ce produit:\n"
+                "(ou cliquez sur Annuler pour revenir en arrière)",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 Annuler", callback_data="cancel_edit")
+                ]])
+            )
+            return WAITING_PRODUCT_MEDIA
+        else:
+            field_names = {
+                'name': 'nom',
+                'price': 'prix',
+                'description': 'description'
+            }
+            await query.message.edit_text(
+                f"✏️ Modification du {field_names.get(field, field)}\n"
+                f"Valeur actuelle : {current_value}\n\n"
+                "Envoyez la nouvelle valeur :",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 Annuler", callback_data="cancel_edit")
+                ]])
+            )
+            return WAITING_NEW_VALUE
+
+@callback_router.route("confirm_reset_stats")
+async def handle_confirm_reset_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Demande de confirmation avant réinitialisation des statistiques"""
+    query = update.callback_query
+    await query.answer()
+    # Demander confirmation avant de réinitialiser
+    keyboard = [
+        [
+            InlineKeyboardButton("✅ Oui, réinitialiser", callback_data="reset_stats_confirmed"),
+            InlineKeyboardButton("❌ Non, annuler", callback_data="admin")
         ]
-    
+    ]
 
-        if str(update.effective_user.id) in ADMIN_IDS:
-            keyboard.append([InlineKeyboardButton("🔧 Menu Admin", callback_data="admin")])
-    
+    await query.message.edit_text(
+        "⚠️ *Êtes-vous sûr de vouloir réinitialiser toutes les statistiques ?*\n\n"
+        "Cette action est irréversible et supprimera :\n"
+        "• Toutes les vues des catégories\n"
+        "• Toutes les vues des produits\n"
+        "• Le compteur de vues total\n\n"
+        "L'historique des tendances (24 h, 7 jours) est conservé.",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode='Markdown'
+    )
 
-        keyboard.extend([
-            [
-                InlineKeyboardButton("📞 Contact telegram", url=f"https://t.me/{CONFIG['contact_username']}"),
-                InlineKeyboardButton("📝 Canal telegram", url="https://t.me/+LT2G6gMsMjY3MWFk"),
-            ],
-            [InlineKeyboardButton("🥔 Canal potato", url="https://doudlj.org/joinchat/5ZEmn25bOsTR7f-aYdvC0Q")]
-        ])
-        
-        welcome_text = (
-            "🌿 *Bienvenue sur le bot test de DDLAD* 🌿\n\n"
-            "Ceci n'est pas le produit final'.\n"
-            "Ce bot est juste un bot test, pour tester mes conneries dessus.\n\n"
-            "📋 Cliquez sur MENU pour voir les catégories"
+@callback_router.route("reset_stats_confirmed")
+async def handle_reset_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Réinitialise les statistiques"""
+    query = update.callback_query
+    await query.answer()
+    # Réinitialiser les statistiques
+    stats_engine.reset()
+
+    # Afficher un message de confirmation
+    keyboard = [[InlineKeyboardButton("🔙 Retour au menu", callback_data="admin")]]
+    await query.message.edit_text(
+        "✅ *Les statistiques ont été réinitialisées avec succès!*\n\n"
+        f"Date de réinitialisation : {stats_engine.last_reset}\n\n"
+        "Toutes les statistiques sont maintenant à zéro.",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode='Markdown'
+    )
+
+@callback_router.action("view_category")
+async def handle_view_category(update: Update, context: ContextTypes.DEFAULT_TYPE, category):
+    """Affiche les produits d'une catégorie"""
+    query = update.callback_query
+    await query.answer()
+    if category in CATALOG:
+        # D'abord supprimer le message de produit actuel
+        try:
+            await query.message.delete()
+        except Exception as e:
+            print(f"Erreur lors de la suppression du message de query: {e}")
+
+        # Si on a un message produit précédent, le supprimer aussi
+        if 'last_product_message_id' in context.user_data:
+            try:
+                await context.bot.delete_message(
+                    chat_id=query.message.chat_id,
+                    message_id=context.user_data['last_product_message_id']
+                )
+                del context.user_data['last_product_message_id']
+            except Exception as e:
+                print(f"Erreur lors de la suppression du message produit: {e}")
+
+    if category in CATALOG:
+        # Incrémenter les vues de la catégorie
+        stats_engine.record_category_view(category)
+
+        text, reply_markup = render_cache.get(
+            'category', category, product_index.version, False, lambda: render_category(category)
         )
-        
-        await query.edit_message_text(
-            welcome_text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
+
+        # Envoyer un nouveau message avec la liste des produits
+        await context.bot.send_message(
+            chat_id=query.message.chat_id,
+            text=text,
+            reply_markup=reply_markup,
             parse_mode='Markdown'
+        )    
+
+def render_category(category):
+    """Texte et clavier de la liste des produits d'une catégorie"""
+    text = f"*{category}*\n\n"
+    keyboard = []
+    for product in CATALOG[category]:
+        keyboard.append([InlineKeyboardButton(
+            product['name'],
+            callback_data=callback_codec.encode('product', product['id'])
+        )])
+
+    keyboard.append([InlineKeyboardButton("🔙 Retour au menu", callback_data="show_categories")])
+    return text, InlineKeyboardMarkup(keyboard)
+
+@callback_router.route("start_broadcast")
+async def handle_start_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Passe en mode diffusion"""
+    query = update.callback_query
+    await query.answer()
+    if str(update.effective_user.id) not in ADMIN_IDS:
+        await query.answer("❌ Vous n'êtes pas autorisé à utiliser cette fonction.")
+        return CHOOSING
+
+    await query.message.edit_text(
+        "📢 *Mode Diffusion*\n\n"
+        "Envoyez le message que vous souhaitez diffuser à tous les utilisateurs.\n"
+        "Le message peut contenir du texte, des photos ou des vidéos.\n\n"
+        "Pour annuler, cliquez sur Annuler.",
+        parse_mode='Markdown',
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("❌ Annuler", callback_data="cancel_broadcast")
+        ]])
+    )
+    return WAITING_BROADCAST_MESSAGE
+
+USERS_PAGE_SIZE = 20
+USER_SORTS = (SORT_RECENT, SORT_NAME)  # Position dans le callback_data
+
+def render_users_page(sort_index=0, page=0):
+    """Texte et boutons de navigation d'une page de la liste des utilisateurs"""
+    sort_index = sort_index if 0 <= sort_index < len(USER_SORTS) else 0
+    page_count = max(1, -(-len(user_registry) // USERS_PAGE_SIZE))
+    page = min(max(page, 0), page_count - 1)
+
+    label = "les plus récents d'abord" if USER_SORTS[sort_index] == SORT_RECENT else "par nom"
+    text = f"\nListe des utilisateurs ({label}, page {page + 1}/{page_count}) :\n"
+    for record in user_registry.page(USER_SORTS[sort_index], page * USERS_PAGE_SIZE, USERS_PAGE_SIZE):
+        text += f"\n• {record.full_name}"
+        if record.username:
+            text += f" (@{record.username})"
+        text += f"\nDernière activité : {record.last_seen_str()}\n"
+
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton(
+            "◀️ Précédent", callback_data=callback_codec.encode('users_page', sort_index, page - 1)))
+    if page < page_count - 1:
+        navigation.append(InlineKeyboardButton(
+            "Suivant ▶️", callback_data=callback_codec.encode('users_page', sort_index, page + 1)))
+    other_sort = 1 - sort_index
+    sort_label = "🔤 Trier par nom" if USER_SORTS[other_sort] == SORT_NAME else "🕒 Trier par activité"
+    keyboard = [navigation] if navigation else []
+    keyboard.append([InlineKeyboardButton(sort_label, callback_data=callback_codec.encode('users_page', other_sort, 0))])
+    return text, keyboard
+
+@callback_router.route("manage_users")
+async def handle_manage_users(update: Update, context: ContextTypes.DEFAULT_TYPE, sort_index=0, page=0):
+    """Gestion des utilisateurs (liste paginée)"""
+    query = update.callback_query
+    await query.answer()
+
+    # Créer le texte sans formatage spécial d'abord
+    text = "👥 Gestion des utilisateurs\n\n"
+    text += f"Utilisateurs actifs : {len(user_registry)}\n"
+    text += prober_report()
+
+    page_text, keyboard = render_users_page(sort_index, page)
+    text += page_text
+    keyboard += [
+        [InlineKeyboardButton("🔄 Nettoyer la liste", callback_data="clean_users")],
+        [InlineKeyboardButton("🔙 Retour", callback_data="admin")]
+    ]
+
+    # Envoyer le message sans parse_mode
+    await query.message.edit_text(
+        text=text,
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+@callback_router.action("users_page")
+async def handle_users_page(update: Update, context: ContextTypes.DEFAULT_TYPE, sort_index, page):
+    """Changement de page ou de tri de la liste des utilisateurs"""
+    return await handle_manage_users(update, context, int(sort_index), int(page))
+
+@callback_router.route("clean_users")
+async def handle_clean_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Vérification et nettoyage des utilisateurs"""
+    query = update.callback_query
+    await query.answer()
+    try:
+        # La vérification tourne en arrière-plan ; l'écran affiche le dernier résultat
+        if not user_prober.running:
+            context.application.create_task(clean_inactive_users(context))
+            await asyncio.sleep(0)
+
+        text = "👥 Rapport de vérification\n\n"
+        text += prober_report()
+        text += f"• Utilisateurs restants : {len(user_registry)}\n"
+
+        # Première page de la liste, les plus récents d'abord
+        page_text, keyboard = render_users_page()
+        text += page_text
+        keyboard += [
+            [InlineKeyboardButton("🔄 Vérifier à nouveau", callback_data="clean_users")],
+            [InlineKeyboardButton("🔙 Retour", callback_data="admin")]
+        ]
+
+        await query.message.edit_text(
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard)
         )
 
-    elif query.data == "start_broadcast":
-        if str(update.effective_user.id) not in ADMIN_IDS:
-            await query.answer("❌ Vous n'êtes pas autorisé à utiliser cette fonction.")
-            return CHOOSING
-            
+    except Exception as e:
+        print(f"[ERROR] Erreur lors du nettoyage : {e}")
+        # Message de fallback en cas d'erreur
         await query.message.edit_text(
-            "📢 *Mode Diffusion*\n\n"
-            "Envoyez le message que vous souhaitez diffuser à tous les utilisateurs.\n"
-            "Le message peut contenir du texte, des photos ou des vidéos.\n\n"
-            "Pour annuler, cliquez sur Annuler.",
-            parse_mode='Markdown',
+            "Une erreur est survenue lors du nettoyage.\n"
+            "Veuillez réessayer plus tard.",
             reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("❌ Annuler", callback_data="cancel_broadcast")
+                InlineKeyboardButton("🔙 Retour", callback_data="admin")
             ]])
         )
-        return WAITING_BROADCAST_MESSAGE
-
-    elif query.data == "cancel_broadcast":
-        return await show_admin_menu(update, context)
 
-    elif query.data == "manage_users":
-            active_users = context.bot_data.get('active_users', {})
-            if 'active_users' not in context.bot_data:
-                context.bot_data['active_users'] = load_active_users()
-        
-            cleaned = await clean_inactive_users(context)
-        
-            # Créer le texte sans formatage spécial d'abord
-            text = "👥 Gestion des utilisateurs\n\n"
-            text += f"Utilisateurs actifs : {len(active_users)}\n"
-            text += f"Utilisateurs nettoyés : {cleaned}\n\n"
-            text += "Liste des utilisateurs actifs :\n"
-        
-            # Liste des utilisateurs (limité à 20)
-            for user_id, user_data in list(active_users.items())[:20]:
-                username = user_data.get('username', '')
-                first_name = user_data.get('first_name', '')
-                last_name = user_data.get('last_name', '')
-                last_seen = user_data.get('last_seen', 'Inconnu')
-            
-                full_name = f"{first_name} {last_name}".strip() or "Nom inconnu"
-            
-                text += f"\n• {full_name}"
-                if username:
-                    text += f" (@{username})"
-                text += f"\nDernière activité : {last_seen}\n"
-        
-            if len(active_users) > 20:
-                text += f"\n... et {len(active_users) - 20} autres utilisateurs"
-        
-            keyboard = [
-                [InlineKeyboardButton("🔄 Nettoyer la liste", callback_data="clean_users")],
-                [InlineKeyboardButton("🔙 Retour", callback_data="admin")]
-            ]
-        
-            # Envoyer le message sans parse_mode
-            await query.message.edit_text(
-                text=text,
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-
-    elif query.data == "clean_users":
-            try:
-                # Afficher un message de chargement
-                await query.answer("🔄 Vérification des utilisateurs...")
-                initial_count = len(context.bot_data.get('active_users', {}))
-                cleaned = await clean_inactive_users(context)
-                final_count = len(context.bot_data.get('active_users', {}))
-            
-                text = "👥 Rapport de vérification\n\n"
-                text += f"• Utilisateurs scannés : {initial_count}\n"
-            
-                if cleaned > 0:
-                    text += f"• Utilisateurs supprimés : {cleaned}\n"
-                    text += f"• Utilisateurs restants : {final_count}\n"
-                else:
-                    text += "✅ Tous les utilisateurs sont actifs !\n"
-            
-                text += "\nListe des utilisateurs :\n"
-            
-                # Liste des utilisateurs actifs
-                active_users = context.bot_data.get('active_users', {})
-                for user_id, user_data in list(active_users.items())[:20]:
-                    username = user_data.get('username', '')
-                    first_name = user_data.get('first_name', '')
-                    last_name = user_data.get('last_name', '')
-                    last_seen = user_data.get('last_seen', 'Inconnu')
-                
-                    full_name = f"{first_name} {last_name}".strip() or "Nom inconnu"
-                    text += f"\n• {full_name}"
-                    if username:
-                        text += f" (@{username})"
-                    text += f"\nDernière activité : {last_seen}\n"
-            
-                if len(active_users) > 20:
-                    text += f"\n... et {len(active_users) - 20} autres utilisateurs"
-            
-                keyboard = [
-                    [InlineKeyboardButton("🔄 Vérifier à nouveau", callback_data="clean_users")],
-                    [InlineKeyboardButton("🔙 Retour", callback_data="admin")]
-                ]
-            
-                await query.message.edit_text(
-                    text,
-                    reply_markup=InlineKeyboardMarkup(keyboard)
-                )
-            
-            except Exception as e:
-                print(f"[ERROR] Erreur lors du nettoyage : {e}")
-                # Message de fallback en cas d'erreur
-                await query.message.edit_text(
-                    "Une erreur est survenue lors du nettoyage.\n"
-                    "Veuillez réessayer plus tard.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Retour", callback_data="admin")
-                    ]])
-                )
 
 async def handle_new_value(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Gère la nouvelle valeur pour le champ en cours de modification"""
-    category = context.user_data.get('editing_category')
-    product_name = context.user_data.get('editing_product')
+    category, product = product_index.get_by_id(context.user_data.get('editing_product_id'))
     field = context.user_data.get('editing_field')
     new_value = update.message.text
     
-    if not all([category, product_name, field]):
+    if not all([category, product, field]):
         await update.message.reply_text("❌ Une erreur est survenue. Veuillez réessayer.")
         return await show_admin_menu(update, context)
     
-    # Trouver et modifier le produit
-    for product in CATALOG.get(category, []):
-        if product['name'] == product_name:
-            old_value = product.get(field)
-            product[field] = new_value
-            save_catalog(CATALOG)
-            
-            # Supprimer les messages précédents
-            await context.bot.delete_message(
-                chat_id=update.effective_chat.id,
-                message_id=update.message.message_id - 1
-            )
-            await update.message.delete()
-            
-            # Envoyer confirmation
-            keyboard = [[InlineKeyboardButton("🔙 Retour au menu", callback_data="admin")]]
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text=f"✅ Modification effectuée avec succès !\n\n"
-                     f"Ancien {field}: {old_value}\n"
-                     f"Nouveau {field}: {new_value}",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-            break
+    # Modifier le produit (l'index suit un éventuel renommage)
+    product_name = product['name']
+    old_value = product.get(field)
+    product_index.update(category, product_name, field, new_value)
+    storage.put_catalog_product(category, product, old_name=product_name)
+    
+    # Supprimer les messages précédents
+    await context.bot.delete_message(
+        chat_id=update.effective_chat.id,
+        message_id=update.message.message_id - 1
+    )
+    await update.message.delete()
+    
+    # Envoyer confirmation
+    keyboard = [[InlineKeyboardButton("🔙 Retour au menu", callback_data="admin")]]
+    await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=f"✅ Modification effectuée avec succès !\n\n"
+             f"Ancien {field}: {old_value}\n"
+             f"Nouveau {field}: {new_value}",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
     
     return CHOOSING
 
@@ -1911,91 +1718,75 @@ async def get_file_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"✅ Image banner enregistrée!\nFile ID: {file_id}"
         )
 
-async def handle_broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Gère l'envoi du message de broadcast"""
-    if str(update.effective_user.id) not in ADMIN_IDS:
-        await update.message.reply_text("❌ Vous n'êtes pas autorisé à utiliser cette fonction.")
-        return CHOOSING
+def schedule_broadcast_job(job_queue, job_id):
+    """Programme l'exécution (ou la reprise) d'un job de diffusion"""
+    job_queue.run_once(run_broadcast_job, when=0, data=job_id, name=f"broadcast:{job_id}")
 
-    try:
-        if 'active_users' not in context.bot_data:
-            context.bot_data['active_users'] = load_active_users()
-        
-        active_users = context.bot_data['active_users']
-        
-        # Convertir en dictionnaire si c'est encore un set
-        if isinstance(active_users, set):
-            active_users = {user_id: {
-                'username': None,
-                'first_name': None,
-                'last_name': None,
-                'last_seen': datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-            } for user_id in active_users}
-            context.bot_data['active_users'] = active_users
-        
-        if not active_users:
-            await update.message.reply_text(
-                "❌ Aucun utilisateur actif trouvé.",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Retour au menu admin", callback_data="admin")
-                ]])
+async def run_broadcast_job(context: ContextTypes.DEFAULT_TYPE):
+    """Diffuse le message aux destinataires restants du job puis envoie le rapport à l'admin"""
+    job = broadcast_jobs.get(context.job.data)
+    if job is None:
+        return
+    payload = job['message']
+    from_chat_id = payload['from_chat_id']
+    message_ids = payload.get('message_ids') or [payload['message_id']]
+
+    # Copie du message original de l'admin : un seul appel léger par destinataire,
+    # quel que soit le type de contenu, avec sa mise en forme d'origine
+    async def send(user_id):
+        if len(message_ids) > 1:
+            await context.bot.copy_messages(
+                chat_id=user_id,
+                from_chat_id=from_chat_id,
+                message_ids=message_ids,
+                rate_limit_args=BULK
+            )
+        else:
+            await context.bot.copy_message(
+                chat_id=user_id,
+                from_chat_id=from_chat_id,
+                message_id=message_ids[0],
+                rate_limit_args=BULK
             )
-            return CHOOSING
 
-        success_count = 0
-        fail_count = 0
-        users_to_remove = set()  # Utiliser un set pour stocker les IDs à supprimer
-        
-        # Envoyer le message à chaque utilisateur
-        for user_id in list(active_users.keys()):
-            try:
-                if update.message.photo:
-                    await context.bot.send_photo(
-                        chat_id=user_id,
-                        photo=update.message.photo[-1].file_id,
-                        caption=update.message.caption if update.message.caption else None,
-                        parse_mode='Markdown'
-                    )
-                elif update.message.video:
-                    await context.bot.send_video(
-                        chat_id=user_id,
-                        video=update.message.video.file_id,
-                        caption=update.message.caption if update.message.caption else None,
-                        parse_mode='Markdown'
-                    )
-                else:
-                    await context.bot.send_message(
-                        chat_id=user_id,
-                        text=update.message.text,
-                        parse_mode='Markdown'
-                    )
-                success_count += 1
-                # Mettre à jour la dernière activité
-                active_users[user_id]['last_seen'] = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-            except Exception as e:
-                print(f"Erreur d'envoi à {user_id}: {e}")
-                fail_count += 1
-                if "bot was blocked" in str(e).lower() or "chat not found" in str(e).lower():
-                    users_to_remove.add(user_id)
-
-        # Supprimer les utilisateurs inactifs
-        for user_id in users_to_remove:
-            del active_users[user_id]
-        
-        # Sauvegarder les changements
-        save_active_users(active_users)
+    async def show_progress(progress):
+        if job['status_message_id'] is None:
+            return
+        await context.bot.edit_message_text(
+            f"📢 Diffusion en cours : {progress.done}/{progress.total}\n"
+            f"✅ {progress.sent}  ❌ {progress.failed}  ⚡ {progress.rate:.1f} msg/s",
+            chat_id=job['admin_chat_id'],
+            message_id=job['status_message_id'],
+            rate_limit_args=ADMIN
+        )
+
+    try:
+        broadcast_jobs.set_status(job, 'running')
+        progress = BroadcastProgress(len(job['recipients']), job['sent'], job['failed'])
+        await broadcast_engine.run(
+            broadcast_jobs.remaining(job), send,
+            on_progress=show_progress,
+            on_result=lambda user_id, outcome: broadcast_jobs.record(job, user_id, outcome),
+            progress=progress
+        )
+
+        # Supprimer les utilisateurs qui ont bloqué le bot
+        delete_active_users(job['unreachable'])
 
         # Envoyer le rapport
         report = (
             "📊 *Rapport de diffusion*\n\n"
-            f"✅ Envois réussis : {success_count}\n"
-            f"❌ Échecs : {fail_count}\n"
-            f"📨 Total : {success_count + fail_count}\n\n"
-            f"👥 Utilisateurs actifs restants : {len(active_users)}"
+            f"✅ Envois réussis : {job['sent']}\n"
+            f"❌ Échecs : {job['failed']}\n"
+            f"📨 Total : {job['sent'] + job['failed']}\n"
+            f"⏱ Durée : {progress.elapsed:.0f}s\n\n"
+            f"👥 Utilisateurs actifs restants : {len(user_registry)}"
         )
+        broadcast_jobs.remove(job['id'])
         
-        await update.message.reply_text(
-            report,
+        await context.bot.send_message(
+            chat_id=job['admin_chat_id'],
+            text=report,
             parse_mode='Markdown',
             reply_markup=InlineKeyboardMarkup([[
                 InlineKeyboardButton("🔙 Retour au menu admin", callback_data="admin")
@@ -2004,7 +1795,100 @@ async def handle_broadcast_message(update: Update, context: ContextTypes.DEFAULT
         
     except Exception as e:
         print(f"Erreur lors du broadcast: {e}")
-        await update.message.reply_text(
+        await context.bot.send_message(
+            chat_id=job['admin_chat_id'],
+            text=f"❌ Une erreur est survenue : {str(e)}",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Retour au menu admin", callback_data="admin")
+            ]])
+        )
+
+async def start_broadcast_job(context: ContextTypes.DEFAULT_TYPE, chat_id, message_ids):
+    """Crée et programme le job de diffusion des messages de l'admin"""
+    recipients = user_registry.ids()
+    if not recipients:
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text="❌ Aucun utilisateur actif trouvé.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Retour au menu admin", callback_data="admin")
+            ]])
+        )
+        return
+
+    status_message = await context.bot.send_message(
+        chat_id=chat_id,
+        text=f"📢 Diffusion en cours : 0/{len(recipients)}"
+    )
+
+    # L'envoi est un job persisté : le gestionnaire de l'admin rend la main
+    # et la diffusion reprend là où elle s'était arrêtée après un redémarrage
+    job = broadcast_jobs.create(
+        {'from_chat_id': chat_id, 'message_ids': sorted(message_ids)},
+        recipients,
+        admin_chat_id=chat_id,
+        status_message_id=status_message.message_id
+    )
+    await broadcast_jobs.writer.flush()
+    schedule_broadcast_job(context.job_queue, job['id'])
+
+async def finish_broadcast_album(context: ContextTypes.DEFAULT_TYPE):
+    """Lance la diffusion d'un album une fois tous ses éléments reçus"""
+    album = context.job.data
+    context.user_data.pop('broadcast_album', None)
+    try:
+        await start_broadcast_job(context, context.job.chat_id, album['message_ids'])
+    except Exception as e:
+        print(f"Erreur lors du broadcast: {e}")
+
+def collect_broadcast_album_item(context: ContextTypes.DEFAULT_TYPE, message, user_id):
+    """Ajoute un élément à l'album en attente et repousse sa diffusion à la fin de la rafale"""
+    album = context.user_data['broadcast_album']
+    if message.message_id in album['message_ids']:
+        return
+    album['message_ids'].append(message.message_id)
+
+    job_name = f"broadcast_album:{message.chat_id}"
+    for job in context.job_queue.get_jobs_by_name(job_name):
+        job.schedule_removal()
+    context.job_queue.run_once(
+        finish_broadcast_album, when=BROADCAST_ALBUM_DELAY, data=album, name=job_name,
+        chat_id=message.chat_id, user_id=user_id
+    )
+
+async def handle_broadcast_album_item(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Éléments suivants d'un album de diffusion (la conversation est déjà revenue au menu)"""
+    message = update.message
+    album = context.user_data.get('broadcast_album')
+    if message is None or album is None or message.media_group_id != album['media_group_id']:
+        return
+    collect_broadcast_album_item(context, message, update.effective_user.id)
+
+async def handle_broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Gère l'envoi du message de broadcast"""
+    if str(update.effective_user.id) not in ADMIN_IDS:
+        await update.message.reply_text("❌ Vous n'êtes pas autorisé à utiliser cette fonction.")
+        return CHOOSING
+
+    message = update.message
+    try:
+        if message.media_group_id:
+            # Les éléments d'un album arrivent en rafale, un update par élément :
+            # on les regroupe (handle_broadcast_album_item) et on attend la fin de
+            # la rafale avant de diffuser. La conversation quitte tout de suite le
+            # mode diffusion pour que le message suivant de l'admin ne soit pas diffusé.
+            context.user_data['broadcast_album'] = {
+                'media_group_id': message.media_group_id,
+                'message_ids': []
+            }
+            collect_broadcast_album_item(context, message, update.effective_user.id)
+            return CHOOSING
+
+        await start_broadcast_job(context, message.chat_id, [message.message_id])
+        
+    except Exception as e:
+        print(f"Erreur lors du broadcast: {e}")
+        await message.reply_text(
             f"❌ Une erreur est survenue : {str(e)}",
             reply_markup=InlineKeyboardMarkup([[
                 InlineKeyboardButton("🔙 Retour au menu admin", callback_data="admin")
@@ -2013,202 +1897,184 @@ async def handle_broadcast_message(update: Update, context: ContextTypes.DEFAULT
     
     return CHOOSING
 
+async def track_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Enregistre l'activité de l'utilisateur pour chaque update (groupe -1, avant la conversation)"""
+    user = update.effective_user
+    if user is None or user.is_bot:
+        return
+    activity_tracker.record(user)
+    active_counter.add(user.id)
+
 async def clean_inactive_users(context: ContextTypes.DEFAULT_TYPE):
-    """Nettoie la liste des utilisateurs inactifs"""
-    if 'active_users' not in context.bot_data:
-        context.bot_data['active_users'] = load_active_users()
-    
-    active_users = context.bot_data['active_users'].copy()  # Créer une copie pour éviter les modifications pendant l'itération
-    inactive_users = set()
-    
-    print(f"[DEBUG] Début du nettoyage - {datetime.utcnow()}")
-    print(f"[DEBUG] Utilisateurs actuels: {len(active_users)}")
-    
-    for user_id in list(active_users.keys()):
-        try:
-            print(f"[DEBUG] Vérification de l'utilisateur {user_id}")
-            
-            # Première tentative : send_chat_action
-            try:
-                await context.bot.send_chat_action(chat_id=user_id, action="typing")
-                await asyncio.sleep(0.1)  # Petit délai
-            except Exception as e:
-                print(f"[DEBUG] Échec send_chat_action pour {user_id}: {str(e)}")
-                if "blocked" in str(e).lower() or "not found" in str(e).lower() or "deactivated" in str(e).lower():
-                    raise  # Forcer le passage au except externe
-                
-            # Deuxième tentative : get_chat
-            try:
-                chat = await context.bot.get_chat(user_id)
-                active_users[user_id] = {
-                    'username': chat.username,
-                    'first_name': chat.first_name,
-                    'last_name': chat.last_name,
-                    'last_seen': datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-                }
-                print(f"[DEBUG] Utilisateur {user_id} actif et mis à jour")
-            except Exception as e:
-                print(f"[DEBUG] Échec get_chat pour {user_id}: {str(e)}")
-                raise  # Forcer le passage au except externe
-                
-        except Exception as e:
-            print(f"[DEBUG] Utilisateur {user_id} marqué comme inactif: {str(e)}")
-            inactive_users.add(user_id)
-            print(f"[DEBUG] Utilisateur {user_id} marqué comme inactif")
-            print(f"[DEBUG] Raison : {str(e)}")
-        
-        await asyncio.sleep(0.2)  # Délai entre chaque utilisateur
-    
-    # Supprimer les utilisateurs inactifs
-    users_removed = 0
-    for user_id in inactive_users:
-        if user_id in active_users:
-            print(f"[DEBUG] Suppression de l'utilisateur {user_id}")
-            del active_users[user_id]
-            users_removed += 1
-    
-    # Mettre à jour context.bot_data
-    context.bot_data['active_users'] = active_users
-    save_active_users(active_users)
-    
-    print(f"[DEBUG] Fin du nettoyage - Utilisateurs restants: {len(active_users)}")
-    print(f"[DEBUG] Utilisateurs supprimés: {users_removed}")
+    """Vérifie les utilisateurs inactifs et supprime ceux qui ont bloqué le bot"""
+    removed = set()
+
+    async def probe(user_id):
+        # Échoue (Forbidden / chat not found) si l'utilisateur a bloqué le bot ;
+        # les profils sont tenus à jour par track_activity, sans get_chat
+        await context.bot.send_chat_action(chat_id=user_id, action="typing", rate_limit_args=BULK)
+
+    def on_unreachable(user_id):
+        removed.add(user_id)
+
+    result = await user_prober.run(user_registry, probe, on_unreachable)
+
+    if removed:
+        delete_active_users(removed)
     
-    return users_removed
+    print(f"Vérification des utilisateurs : {result['checked']} vérifiés, {result['removed']} supprimés")
+    return result['removed']
+
+def prober_report():
+    """Résumé du dernier passage du prober pour les écrans admin"""
+    last_run = user_prober.last_run
+    if user_prober.running:
+        text = f"🔄 Vérification en cours : {last_run['checked']}/{last_run['checked'] + user_prober.remaining_count}\n"
+    elif last_run and last_run.get('finished'):
+        finished = datetime.utcfromtimestamp(last_run['finished']).strftime("%Y-%m-%d %H:%M:%S")
+        text = f"Dernière vérification : {finished}\n"
+    else:
+        return "Aucune vérification effectuée pour le moment.\n"
+    text += f"• Utilisateurs vérifiés : {last_run['checked']}\n"
+    text += f"• Utilisateurs supprimés : {last_run['removed']}\n"
+    return text
+
+async def post_init(application: Application):
+    """Démarre les tâches de fond une fois la boucle asyncio lancée"""
+    await storage.start()
+    await stats_engine.writer.start()
+    await broadcast_jobs.writer.start()
+    await user_prober.writer.start()
+    await activity_tracker.start()
+    await active_counter.writer.start()
+
+    # Reprendre les diffusions interrompues par un arrêt du bot
+    for job in broadcast_jobs.pending():
+        print(f"Reprise de la diffusion {job['id']} ({job['cursor']}/{len(job['recipients'])})")
+        schedule_broadcast_job(application.job_queue, job['id'])
+
+async def post_shutdown(application: Application):
+    """Écrit les données en attente à l'arrêt du bot"""
+    await activity_tracker.stop()  # Avant le stockage, qui reçoit son dernier lot
+    await storage.stop()
+    await stats_engine.writer.stop()
+    await broadcast_jobs.writer.stop()
+    await user_prober.writer.stop()
+    await active_counter.writer.stop()
 
 def main():
     """Fonction principale du bot"""
     try:
         # Créer l'application
-        application = Application.builder().token(TOKEN).build()
+        application = (
+            Application.builder()
+            .token(TOKEN)
+            .rate_limiter(rate_limiter)
+            .post_init(post_init)
+            .post_shutdown(post_shutdown)
+            .build()
+        )
+
+        # Un seul gestionnaire pour tous les boutons inline, aiguillés par le routeur
+        callback_handler = CallbackQueryHandler(callback_router.dispatch, pattern=callback_router.matches)
 
         # Gestionnaire de conversation principal
         conv_handler = ConversationHandler(
             entry_points=[CommandHandler('start', start)],
             states={
                 CHOOSING: [
-                    # Gestion des catégories et du catalogue
-                    CallbackQueryHandler(ui_handler.show_categories, pattern='^show_categories$'),
-                    CallbackQueryHandler(ui_handler.show_products, pattern='^category_'),
-                    CallbackQueryHandler(ui_handler.show_product_details, pattern='^product_'),
-            
-                    # Gestion du menu admin et ses fonctionnalités
-                    CallbackQueryHandler(ui_handler.show_admin_menu, pattern='^admin$'),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^add_product$'),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^edit_product$'),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^remove_product$'),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^broadcast$'),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^manage_access$'),
-                    CallbackQueryHandler(add_category, pattern='^add_category$'),
-                    CallbackQueryHandler(remove_category, pattern='^remove_category$'),
-            
-                    # Gestion des autres boutons du menu principal
-                    CallbackQueryHandler(about, pattern='^about$'),
-                    CallbackQueryHandler(contact, pattern='^contact$'),
-                    CallbackQueryHandler(ui_handler.show_home, pattern='^back_to_home$')
+                    callback_handler
                 ],
 
                 SELECTING_CATEGORY: [
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^select_category_'),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^cancel_'),
-                    CallbackQueryHandler(admin, pattern='^back_to_admin$')
+                    callback_handler
                 ],
 
                 WAITING_PRODUCT_NAME: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, handle_product_name),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^cancel_add_product$')
+                    callback_handler
                 ],
 
                 WAITING_PRODUCT_DESCRIPTION: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, handle_product_description),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^cancel_add_product$')
+                    callback_handler
                 ],
 
                 WAITING_PRODUCT_PRICE: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, handle_product_price),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^cancel_add_product$')
+                    callback_handler
                 ],
 
                 WAITING_PRODUCT_MEDIA: [
                     MessageHandler(filters.PHOTO | filters.VIDEO, handle_product_media),
-                    CallbackQueryHandler(finish_product_media, pattern='^finish_media$'),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^cancel_add_product$')
+                    callback_handler
                 ],
 
                 WAITING_PRODUCT_CATEGORY: [
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^select_category_'),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^cancel_add_product$')
+                    callback_handler
                 ],
 
                 CONFIRM_ADD_PRODUCT: [
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^confirm_add_product$'),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^cancel_')
+                    callback_handler
                 ],
 
                 CHOOSING_PRODUCT_TO_REMOVE: [
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^remove_product_'),
-                    CallbackQueryHandler(admin, pattern='^back_to_admin$')
+                    callback_handler
                 ],
 
                 CHOOSING_PRODUCT_TO_EDIT: [
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^edit_product_'),
-                    CallbackQueryHandler(admin, pattern='^back_to_admin$')
+                    callback_handler
                 ],
 
                 WAITING_CATEGORY_NAME: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, handle_category_name),
-                    CallbackQueryHandler(admin, pattern='^cancel_add_category$')
+                    callback_handler
                 ],
 
                 REMOVING_CATEGORY: [
-                    CallbackQueryHandler(handle_category_deletion, pattern='^delete_category_'),
-                    CallbackQueryHandler(admin, pattern='^back_to_admin$')
+                    callback_handler
                 ],
 
                 EDITING_PRODUCT: [
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^edit_name$'),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^edit_description$'),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^edit_price$'),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^edit_media$'),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^edit_category$'),
-                    CallbackQueryHandler(admin, pattern='^back_to_admin$')
+                    callback_handler
                 ],
 
                 WAITING_NEW_NAME: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, handle_new_value),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^cancel_')
+                    callback_handler
                 ],
 
                 WAITING_NEW_DESCRIPTION: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, handle_new_value),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^cancel_')
+                    callback_handler
                 ],
 
                 WAITING_NEW_PRICE: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, handle_new_value),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^cancel_')
+                    callback_handler
                 ],
 
                 WAITING_NEW_MEDIA: [
                     MessageHandler(filters.PHOTO | filters.VIDEO, handle_product_media),
-                    CallbackQueryHandler(finish_product_media, pattern='^finish_media$'),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^cancel_')
+                    callback_handler
                 ],
 
                 WAITING_NEW_CATEGORY: [
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^select_category_'),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^cancel_')
+                    callback_handler
                 ],
 
                 WAITING_ACCESS_CODE: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, access_control.verify_code),
-                    CallbackQueryHandler(ui_handler.show_home, pattern='^back_to_home$')
+                    callback_handler
+                ],
+
+                WAITING_BROADCAST_MESSAGE: [
+                    MessageHandler(filters.ALL & ~filters.COMMAND, handle_broadcast_message),
+                    callback_handler
                 ],
 
                 MANAGE_ACCESS: [
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^generate_code$'),
-                    CallbackQueryHandler(handle_normal_buttons, pattern='^revoke_access$'),
-                    CallbackQueryHandler(admin, pattern='^back_to_admin$')
+                    callback_handler
                 ],
             },
             fallbacks=[
@@ -2219,12 +2085,16 @@ def main():
             persistent=False
         )
     
+        # Suivi passif de l'activité, avant tous les autres gestionnaires
+        application.add_handler(TypeHandler(Update, track_activity), group=-1)
         application.add_handler(conv_handler)
+        # Éléments d'un album de diffusion reçus après la sortie du mode diffusion
+        application.add_handler(MessageHandler(filters.ALL & ~filters.COMMAND, handle_broadcast_album_item), group=1)
         application.job_queue.run_daily(daily_maintenance, time=time(hour=0, minute=0))
-        application.add_handler(CallbackQueryHandler(access_control.toggle_access_control, 
-                                                pattern="^toggle_access_control$"))
-        application.add_handler(CallbackQueryHandler(access_control.generate_new_code, 
-                                                pattern="^generate_code$"))
+        # Le premier passage reprend aussi une vérification interrompue par un arrêt
+        application.job_queue.run_repeating(clean_inactive_users, interval=PROBE_INTERVAL, first=60)
+        # Boutons cliqués hors conversation (par exemple après un redémarrage)
+        application.add_handler(callback_handler)
         # Démarrer le bot
         print("Bot démarré...")
         application.run_polling()
@@ -9,46 +9,39 @@ from telegram.ext import ContextTypes, ConversationHandler
 WAITING_ACCESS_CODE = 'WAITING_ACCESS_CODE'
 
 class AccessControl:
-    def __init__(self, config, save_config_callback, admin_ids):
+    def __init__(self, config, storage, admin_ids):
         self.CONFIG = config
-        self.save_config = save_config_callback
+        self.storage = storage
         self.ADMIN_IDS = admin_ids
         
-        # Initialiser la configuration si elle n'existe pas
-        if 'access_control' not in self.CONFIG:
-            self.CONFIG['access_control'] = {
-                'enabled': False,
-                'valid_codes': {}
-            }
-            self.save_config()
+        # État du contrôle d'accès (initialisé par le stockage s'il n'existe pas)
+        self.state = self.storage.load_access_control()
 
     def generate_code(self) -> str:
         """Génère un code d'accès unique de 8 caractères"""
         characters = string.ascii_uppercase + string.digits
         code = ''.join(random.choices(characters, k=8))
         
-        self.CONFIG['access_control']['valid_codes'][code] = {
+        self.storage.put_access_code(code, {
             'used': False,
             'created_at': datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.save_config()
+        })
         return code
 
     def validate_code(self, code: str) -> bool:
         """Vérifie si un code est valide et non utilisé"""
-        if not self.CONFIG['access_control']['enabled']:
+        if not self.state['enabled']:
             return True
             
-        if code not in self.CONFIG['access_control']['valid_codes']:
+        if code not in self.state['valid_codes']:
             return False
             
-        code_info = self.CONFIG['access_control']['valid_codes'][code]
+        code_info = self.state['valid_codes'][code]
         if code_info['used']:
             return False
             
         # Marquer le code comme utilisé
-        self.CONFIG['access_control']['valid_codes'][code]['used'] = True
-        self.save_config()
+        self.storage.put_access_code(code, dict(code_info, used=True))
         return True
 
     def set_default_callback(self, callback):
@@ -60,26 +53,24 @@ class AccessControl:
         current_time = datetime.utcnow()
         codes_to_remove = []
         
-        for code, info in self.CONFIG['access_control']['valid_codes'].items():
+        for code, info in self.state['valid_codes'].items():
             created_at = datetime.strptime(info['created_at'], "%Y-%m-%d %H:%M:%S")
             if current_time - created_at > timedelta(hours=24):
                 codes_to_remove.append(code)
                 
-        for code in codes_to_remove:
-            del self.CONFIG['access_control']['valid_codes'][code]
-        
-        self.save_config()
+        if codes_to_remove:
+            self.storage.delete_access_codes(codes_to_remove)
 
     def get_active_codes_count(self) -> int:
         """Retourne le nombre de codes actifs non utilisés"""
-        return len([c for c in self.CONFIG['access_control']['valid_codes'].values() 
+        return len([c for c in self.state['valid_codes'].values() 
                    if not c['used']])
 
     async def handle_admin_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Ajoute les options de contrôle d'accès au menu admin"""
         keyboard = [
             [InlineKeyboardButton(
-                "🔒 Désactiver contrôle d'accès" if self.CONFIG['access_control']['enabled'] 
+                "🔒 Désactiver contrôle d'accès" if self.state['enabled'] 
                 else "🔓 Activer contrôle d'accès", 
                 callback_data="toggle_access_control"
             )],
@@ -94,12 +85,11 @@ class AccessControl:
             await query.answer("Non autorisé")
             return False
 
-        self.CONFIG['access_control']['enabled'] = not self.CONFIG['access_control']['enabled']
-        self.save_config()
+        self.storage.set_access_enabled(not self.state['enabled'])
         
         await query.answer(
             "Contrôle d'accès " + 
-            ("activé" if self.CONFIG['access_control']['enabled'] else "désactivé")
+            ("activé" if self.state['enabled'] else "désactivé")
         )
         return True
 
@@ -128,7 +118,7 @@ class AccessControl:
             return True
             
         # Si le contrôle d'accès est désactivé, accès direct
-        if not self.CONFIG['access_control']['enabled']:
+        if not self.state['enabled']:
             return True
             
         # Vérifier si l'accès a déjà été accordé
@@ -146,18 +136,13 @@ class AccessControl:
         """Vérifie le code d'accès entré par l'utilisateur"""
         code = update.message.text
     
-        if not self.config['access_control']['enabled']:
+        if not self.state['enabled']:
             return await callback(update, context)
     
-        if code in self.config['access_control']['valid_codes']:
+        if code in self.state['valid_codes']:
             # Ajouter l'utilisateur à la liste des utilisateurs autorisés
-            if 'authorized_users' not in self.config['access_control']:
-                self.config['access_control']['authorized_users'] = []
-        
             user_id = str(update.effective_user.id)
-            if user_id not in self.config['access_control']['authorized_users']:
-                self.config['access_control']['authorized_users'].append(user_id)
-                self.save_config()
+            self.storage.add_authorized_user(user_id)
         
             # Supprimer le message contenant le code
             await update.message.delete()
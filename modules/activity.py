@@ -0,0 +1,150 @@
+﻿# modules/activity.py
+import asyncio
+import base64
+import json
+import logging
+import time
+
+from modules.hyperloglog import HyperLogLog
+from modules.persistence import WriteBehindWriter
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityTracker:
+    """Mise à jour passive de last_seen et du profil à partir des updates reçus.
+
+    Chaque update modifie l'entrée de l'utilisateur dans le UserRegistry
+    (aucun appel à l'API) et la marque comme modifiée ; une tâche de fond
+    transmet les entrées modifiées au stockage par lots toutes les
+    `flush_interval` secondes.
+    """
+
+    def __init__(self, registry, save_users, flush_interval=30.0):
+        self.registry = registry
+        self.save_users = save_users  # Callable recevant {user_id: infos}
+        self.flush_interval = flush_interval
+        self._pending = set()
+        self._task = None
+
+    def record(self, user):
+        """Enregistre l'activité d'un telegram.User"""
+        self.registry.touch(user.id, user.username, user.first_name, user.last_name)
+        self._pending.add(user.id)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """Transmet les utilisateurs modifiés au stockage"""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, set()
+        try:
+            self.save_users(self.registry.to_storage(batch))
+        except Exception as e:
+            logger.error(f"Erreur lors de l'enregistrement de l'activité: {e}")
+            # Réessayer au prochain lot
+            self._pending |= batch
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+class ActiveUserCounter:
+    """Utilisateurs actifs distincts par jour, semaine et mois (DAU/WAU/MAU).
+
+    Un sketch HyperLogLog par jour (UTC) est conservé dans un anneau de
+    `days` cases : chaque update coûte un hash et une comparaison, la
+    mémoire est fixe et les totaux sur 7 ou 30 jours s'obtiennent en
+    fusionnant les sketches, sans parcourir la table des utilisateurs.
+    """
+
+    def __init__(self, path='data/active_days.json', days=30, precision=12, delay=30.0):
+        self.path = path
+        self.days = days
+        self.precision = precision
+        self._day_numbers = [None] * days
+        self._sketches = [None] * days
+        self.writer = WriteBehindWriter(path, self.to_dict, delay=delay, indent=None)
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error(f"Erreur lors du chargement des utilisateurs actifs par jour: {e}")
+            return
+        if data.get('precision') != self.precision:
+            return
+        for day, registers in data.get('days', {}).items():
+            sketch = self._sketch(int(day))
+            if sketch is not None:
+                sketch.registers = bytearray(base64.b64decode(registers))
+
+    def to_dict(self):
+        return {
+            'precision': self.precision,
+            'days': {
+                str(day): base64.b64encode(bytes(sketch.registers)).decode('ascii')
+                for day, sketch in zip(self._day_numbers, self._sketches)
+                if sketch is not None
+            }
+        }
+
+    @staticmethod
+    def _today(now=None):
+        return int((now if now is not None else time.time()) // 86400)
+
+    def _sketch(self, day):
+        """Sketch du jour donné, en recyclant la case d'un jour sorti de la fenêtre"""
+        slot = day % self.days
+        current = self._day_numbers[slot]
+        if current is not None and current > day:
+            return None  # Jour déjà sorti de la fenêtre
+        if current != day:
+            self._day_numbers[slot] = day
+            self._sketches[slot] = HyperLogLog(self.precision)
+        return self._sketches[slot]
+
+    def add(self, user_id, now=None):
+        """Compte l'utilisateur comme actif aujourd'hui"""
+        sketch = self._sketch(self._today(now))
+        if sketch is not None and sketch.add(user_id):
+            self.writer.mark_dirty()
+
+    def count(self, days=1, now=None):
+        """Utilisateurs distincts actifs sur les `days` derniers jours (aujourd'hui inclus)"""
+        today = self._today(now)
+        merged = HyperLogLog(self.precision)
+        for day, sketch in zip(self._day_numbers, self._sketches):
+            if sketch is not None and today - min(days, self.days) < day <= today:
+                merged.merge(sketch)
+        return merged.count()
+
+    def summary(self, now=None):
+        """DAU, WAU et MAU"""
+        return {
+            'daily': self.count(1, now),
+            'weekly': self.count(7, now),
+            'monthly': self.count(30, now)
+        }
@@ -0,0 +1,307 @@
+﻿# modules/broadcast.py
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+from modules.persistence import WriteBehindWriter, atomic_write_json
+from modules.ratelimit import KeyedRateLimiter, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Erreurs indiquant que le destinataire ne peut plus recevoir de messages
+UNREACHABLE_ERRORS = ('bot was blocked', 'chat not found', 'user is deactivated', 'bot was kicked')
+
+
+def retry_after_seconds(error):
+    """Délai demandé par un RetryAfter (entier ou timedelta selon la version de PTB)"""
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class BroadcastProgress:
+    """État d'avancement d'une diffusion"""
+
+    def __init__(self, total, sent=0, failed=0):
+        self.total = total
+        self.sent = sent
+        self.failed = failed
+        self.retries = 0
+        self.unreachable = set()
+        self.started = time.monotonic()
+        self.finished = None
+        self._initial_done = sent + failed
+
+    @property
+    def done(self):
+        return self.sent + self.failed
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rate(self):
+        """Messages traités par seconde depuis le (re)démarrage"""
+        processed = self.done - self._initial_done
+        return processed / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class BroadcastEngine:
+    """Envoi d'un message à de nombreux chats sous les limites de Telegram.
+
+    Un nombre borné de workers consomme la liste des destinataires. Chaque
+    envoi prend un jeton dans un seau global (~30 messages/s) et respecte un
+    intervalle minimal par chat. Un RetryAfter suspend tout le seau pendant le
+    délai demandé puis l'envoi est retenté ; les erreurs réseau sont retentées
+    avec un backoff exponentiel.
+    """
+
+    def __init__(self, rate=30.0, concurrency=20, per_chat_interval=1.0,
+                 max_retries=5, progress_interval=3.0):
+        self.bucket = TokenBucket(rate)
+        self.chat_limiter = KeyedRateLimiter(per_chat_interval)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.progress_interval = progress_interval
+
+    async def run(self, recipients, send, on_progress=None, on_result=None, progress=None):
+        """Appelle `send(chat_id)` pour chaque destinataire ; retourne un BroadcastProgress.
+
+        `on_progress(progress)` est appelé au plus toutes les
+        `progress_interval` secondes pendant l'envoi, puis une dernière fois.
+        `on_result(chat_id, outcome)` est appelé dès qu'un destinataire est
+        traité ('sent', 'failed' ou 'unreachable').
+        """
+        recipients = list(recipients)
+        if progress is None:
+            progress = BroadcastProgress(len(recipients))
+        queue = asyncio.Queue()
+        for chat_id in recipients:
+            queue.put_nowait(chat_id)
+
+        workers = [
+            asyncio.create_task(self._worker(queue, send, progress, on_result))
+            for _ in range(min(self.concurrency, len(recipients)))
+        ]
+        reporter = asyncio.create_task(self._report(progress, on_progress)) if on_progress else None
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            if reporter:
+                reporter.cancel()
+            progress.finished = time.monotonic()
+            self.chat_limiter.prune()
+
+        if on_progress:
+            await self._notify(on_progress, progress)
+        return progress
+
+    async def _worker(self, queue, send, progress, on_result):
+        while True:
+            try:
+                chat_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            outcome = await self._deliver(chat_id, send, progress)
+            if on_result:
+                on_result(chat_id, outcome)
+
+    async def _deliver(self, chat_id, send, progress):
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            await self.chat_limiter.wait(chat_id)
+            try:
+                await send(chat_id)
+                progress.sent += 1
+                return 'sent'
+            except RetryAfter as e:
+                delay = retry_after_seconds(e)
+                logger.warning(f"RetryAfter de {delay}s pendant la diffusion")
+                self.bucket.pause(delay)
+            except (Forbidden, BadRequest) as e:
+                progress.failed += 1
+                if any(reason in str(e).lower() for reason in UNREACHABLE_ERRORS):
+                    progress.unreachable.add(chat_id)
+                    return 'unreachable'
+                logger.error(f"Erreur d'envoi à {chat_id}: {e}")
+                return 'failed'
+            except (TimedOut, NetworkError) as e:
+                logger.warning(f"Erreur réseau pour {chat_id} (tentative {attempt + 1}): {e}")
+                await asyncio.sleep(min(30.0, 2 ** attempt))
+            except Exception as e:
+                logger.error(f"Erreur d'envoi à {chat_id}: {e}")
+                progress.failed += 1
+                return 'failed'
+            progress.retries += 1
+        progress.failed += 1
+        return 'failed'
+
+    async def _report(self, progress, on_progress):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            await self._notify(on_progress, progress)
+
+    @staticmethod
+    async def _notify(on_progress, progress):
+        try:
+            await on_progress(progress)
+        except Exception as e:
+            logger.warning(f"Erreur lors de l'affichage de la progression: {e}")
+
+
+class BroadcastJobStore:
+    """Jobs de diffusion persistés pour pouvoir reprendre après un redémarrage.
+
+    Chaque job garde la liste figée de ses destinataires et un curseur :
+    tous les destinataires avant `cursor` ont été traités. Ceux traités
+    au-delà du curseur (envois concurrents terminés dans le désordre) sont
+    listés dans `done_ahead`. À la reprise, seuls les destinataires restants
+    sont envoyés, ce qui évite de renvoyer le message aux mêmes personnes.
+
+    La liste des destinataires ne change jamais : elle est écrite une seule
+    fois à la création, dans un fichier par job (`recipients_dir`). Le fichier
+    principal, réécrit à chaque avancement, ne contient que le curseur et les
+    compteurs.
+    """
+
+    def __init__(self, path='data/broadcast_jobs.json', recipients_dir='data/broadcast_recipients', delay=1.0):
+        self.path = path
+        self.recipients_dir = recipients_dir
+        self.jobs = {}
+        self._positions = {}
+        self.writer = WriteBehindWriter(path, self.to_dict, delay=delay, indent=None)
+
+    def _recipients_path(self, job_id):
+        return os.path.join(self.recipients_dir, f"{job_id}.json")
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                jobs = json.load(f).get('jobs', {})
+        except FileNotFoundError:
+            jobs = {}
+        except Exception as e:
+            logger.error(f"Erreur lors du chargement des diffusions: {e}")
+            jobs = {}
+
+        self.jobs = {}
+        for job_id, job in jobs.items():
+            if 'recipients' in job:
+                # Ancien format : destinataires dans le fichier principal
+                atomic_write_json(self._recipients_path(job_id), job['recipients'], indent=None)
+                self.writer.mark_dirty()
+            else:
+                try:
+                    with open(self._recipients_path(job_id), 'r', encoding='utf-8') as f:
+                        job['recipients'] = json.load(f)
+                except Exception as e:
+                    logger.error(f"Destinataires introuvables pour la diffusion {job_id}: {e}")
+                    self.writer.mark_dirty()
+                    continue
+            self.jobs[job_id] = job
+
+    def to_dict(self):
+        return {'jobs': {
+            job_id: {key: value for key, value in job.items() if key != 'recipients'}
+            for job_id, job in self.jobs.items()
+        }}
+
+    def create(self, message, recipients, admin_chat_id, status_message_id=None):
+        """Crée un job ; `message` décrit le contenu à diffuser"""
+        job_id = uuid.uuid4().hex[:12]
+        recipients = list(recipients)
+        atomic_write_json(self._recipients_path(job_id), recipients, indent=None)
+        self.jobs[job_id] = {
+            'id': job_id,
+            'created': time.time(),
+            'status': 'pending',
+            'message': message,
+            'admin_chat_id': admin_chat_id,
+            'status_message_id': status_message_id,
+            'recipients': recipients,
+            'cursor': 0,
+            'done_ahead': [],
+            'sent': 0,
+            'failed': 0,
+            'unreachable': []
+        }
+        self.writer.mark_dirty()
+        return self.jobs[job_id]
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def pending(self):
+        """Jobs non terminés (à relancer au démarrage)"""
+        return [job for job in self.jobs.values() if job['status'] in ('pending', 'running')]
+
+    def remaining(self, job):
+        """Destinataires pas encore traités"""
+        done_ahead = set(job['done_ahead'])
+        recipients = job['recipients']
+        return [recipients[i] for i in range(job['cursor'], len(recipients)) if i not in done_ahead]
+
+    def _position(self, job, chat_id):
+        positions = self._positions.get(job['id'])
+        if positions is None:
+            positions = self._positions[job['id']] = {
+                recipient: i for i, recipient in enumerate(job['recipients'])
+            }
+        return positions[chat_id]
+
+    def record(self, job, chat_id, outcome):
+        """Enregistre le résultat d'un envoi et fait avancer le curseur"""
+        if outcome == 'sent':
+            job['sent'] += 1
+        else:
+            job['failed'] += 1
+            if outcome == 'unreachable':
+                job['unreachable'].append(chat_id)
+
+        position = self._position(job, chat_id)
+        if position == job['cursor']:
+            job['cursor'] += 1
+            done_ahead = set(job['done_ahead'])
+            while job['cursor'] in done_ahead:
+                done_ahead.discard(job['cursor'])
+                job['cursor'] += 1
+            job['done_ahead'] = sorted(done_ahead)
+        else:
+            job['done_ahead'].append(position)
+        self.writer.mark_dirty()
+
+    def set_status(self, job, status):
+        job['status'] = status
+        self.writer.mark_dirty()
+
+    def remove(self, job_id):
+        self.jobs.pop(job_id, None)
+        self._positions.pop(job_id, None)
+        self.writer.mark_dirty()
+        try:
+            os.remove(self._recipients_path(job_id))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Impossible de supprimer les destinataires de {job_id}: {e}")
+
+
+def create_broadcast_engine(config):
+    """Instancie le moteur de diffusion configuré dans config['broadcast']"""
+    options = config.get('broadcast', {})
+    return BroadcastEngine(
+        rate=options.get('rate', 30.0),
+        concurrency=options.get('concurrency', 20),
+        per_chat_interval=options.get('per_chat_interval', 1.0),
+        max_retries=options.get('max_retries', 5),
+        progress_interval=options.get('progress_interval', 3.0)
+    )
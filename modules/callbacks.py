@@ -0,0 +1,117 @@
+﻿# modules/callbacks.py
+import logging
+import zlib
+
+logger = logging.getLogger(__name__)
+
+BASE62_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+BASE62_INDEX = {c: i for i, c in enumerate(BASE62_ALPHABET)}
+SEPARATOR = ':'
+
+
+def base62_encode(number: int) -> str:
+    if number == 0:
+        return BASE62_ALPHABET[0]
+    digits = []
+    while number:
+        number, remainder = divmod(number, 62)
+        digits.append(BASE62_ALPHABET[remainder])
+    return ''.join(reversed(digits))
+
+
+def base62_decode(token: str) -> int:
+    number = 0
+    for char in token:
+        number = number * 62 + BASE62_INDEX[char]
+    return number
+
+
+def category_token(name: str) -> str:
+    """Jeton stable (identique entre processus) pour un nom de catégorie"""
+    return base62_encode(zlib.crc32(name.encode('utf-8')))
+
+
+# action -> (code court, types des arguments)
+# 'category' : nom de catégorie du catalogue, 'id' : identifiant numérique
+ACTIONS = {
+    'view_category': ('v', ('category',)),
+    'product': ('p', ('id',)),
+    'show_media': ('m', ('id', 'id')),
+    'select_category': ('sc', ('category',)),
+    'select_category_id': ('si', ('id',)),
+    'delete_product_category': ('dpc', ('category',)),
+    'confirm_delete_product': ('cdp', ('id',)),
+    'really_delete_product': ('rdp', ('id',)),
+    'confirm_delete_category': ('cdc', ('category',)),
+    'really_delete_category': ('rdc', ('category',)),
+    'edit_category': ('ec', ('category',)),
+    'edit_product': ('ep', ('id',)),
+    'remove_product': ('rp', ('id',)),
+    'really_remove_product': ('rrp', ('id',)),
+    'delete_category_id': ('dc', ('id',)),
+    'show_category_id': ('cat', ('id',)),
+    'product_details_id': ('pd', ('id',)),
+    'users_page': ('up', ('id', 'id')),
+}
+
+
+class CallbackCodec:
+    """Encode les boutons en callback_data courts « code:jeton:jeton ».
+
+    Les produits et catégories indexées sont représentés par leur id en
+    base62, les catégories du catalogue par un hash base62 de leur nom. Le
+    décodage se fait par recherches dans des dictionnaires, sans découpage
+    du nom (les noms contenant « _ » ou des emojis ne posent plus problème).
+    """
+
+    def __init__(self, actions=ACTIONS):
+        self.actions = actions
+        self._codes = {code: (action, arg_types) for action, (code, arg_types) in actions.items()}
+        self._categories = {}
+
+    def register_category(self, name):
+        token = category_token(name)
+        previous = self._categories.get(token)
+        if previous is not None and previous != name:
+            logger.warning(f"Collision de jeton entre les catégories {previous!r} et {name!r}")
+        self._categories[token] = name
+        return token
+
+    def register_categories(self, names):
+        for name in names:
+            self.register_category(name)
+
+    def encode(self, action, *args) -> str:
+        code, arg_types = self.actions[action]
+        tokens = [code]
+        for arg_type, value in zip(arg_types, args):
+            if arg_type == 'category':
+                tokens.append(self.register_category(value))
+            else:
+                tokens.append(base62_encode(int(value)))
+        return SEPARATOR.join(tokens)
+
+    def decode(self, data):
+        """Retourne (action, arguments) ou (None, None) si la donnée n'est pas encodée"""
+        parts = data.split(SEPARATOR)
+        entry = self._codes.get(parts[0])
+        if entry is None or len(parts) != len(entry[1]) + 1:
+            return None, None
+        action, arg_types = entry
+        args = []
+        for arg_type, token in zip(arg_types, parts[1:]):
+            if arg_type == 'category':
+                args.append(self._categories.get(token))
+            else:
+                try:
+                    args.append(str(base62_decode(token)))
+                except KeyError:
+                    return None, None
+        return action, args
+
+    def pattern(self, action) -> str:
+        """Expression régulière à utiliser dans un CallbackQueryHandler"""
+        return f"^{self.actions[action][0]}{SEPARATOR}"
+
+
+callback_codec = CallbackCodec()
@@ -0,0 +1,91 @@
+﻿# modules/catalog_cache.py
+import time
+
+
+class CatalogCache:
+    """Cache partagé des catégories et produits indexés par id.
+
+    Les données sont chargées une seule fois depuis le stockage puis servies
+    depuis des dictionnaires id -> élément. Elles ne sont rechargées que si
+    le compteur de version interne change (écriture via ce cache) ou si la
+    source sur disque a été modifiée (mtime, vérifiée au plus une fois par
+    `check_interval` secondes).
+    """
+
+    def __init__(self, storage, check_interval=1.0):
+        self.storage = storage
+        self.check_interval = check_interval
+        self.version = 0
+        self.generation = 0  # Incrémenté à chaque rechargement des données
+        self._loaded_version = -1
+        self._source_version = None
+        self._last_check = 0.0
+        self._categories = []
+        self._categories_by_id = {}
+        self._products_by_id = {}
+        self._products_by_category = {}
+
+    def invalidate(self):
+        """Force un rechargement au prochain accès"""
+        self.version += 1
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._loaded_version == self.version and now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        source_version = self.storage.source_version()
+        if self._loaded_version == self.version and source_version == self._source_version:
+            return
+
+        self._categories = self.storage.load_categories()
+        self._categories_by_id = {c['id']: c for c in self._categories}
+        self._products_by_id = {}
+        self._products_by_category = {}
+        for product in self.storage.load_products():
+            self._products_by_id[product['id']] = product
+            self._products_by_category.setdefault(product.get('category_id'), []).append(product)
+
+        self._loaded_version = self.version
+        self._source_version = source_version
+        self.generation += 1
+
+    # Lecture
+    def data_version(self):
+        """Version des données servies (change à chaque rechargement)"""
+        self._ensure_fresh()
+        return self.generation
+
+    def categories(self):
+        self._ensure_fresh()
+        return self._categories
+
+    def get_category(self, category_id):
+        self._ensure_fresh()
+        return self._categories_by_id.get(category_id)
+
+    def products(self):
+        self._ensure_fresh()
+        return list(self._products_by_id.values())
+
+    def get_product(self, product_id):
+        self._ensure_fresh()
+        return self._products_by_id.get(product_id)
+
+    def products_in_category(self, category_id):
+        self._ensure_fresh()
+        return self._products_by_category.get(category_id, [])
+
+    # Écriture (délègue au stockage puis invalide le cache)
+    def save_category(self, category):
+        self.storage.save_category(category)
+        self.invalidate()
+
+    def delete_category(self, category_id):
+        self.storage.delete_category(category_id)
+        self.invalidate()
+
+    def save_product(self, product):
+        self.storage.save_product(product)
+        self.invalidate()
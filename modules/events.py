@@ -0,0 +1,30 @@
+﻿# modules/events.py
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Événements du catalogue
+CATEGORY_DELETED = 'category_deleted'   # (catégorie)
+PRODUCT_DELETED = 'product_deleted'     # (catégorie, nom du produit)
+PRODUCT_RENAMED = 'product_renamed'     # (catégorie, ancien nom, nouveau nom)
+
+
+class EventBus:
+    """Diffusion synchrone d'événements aux modules abonnés.
+
+    Les abonnés sont appelés dans l'ordre d'inscription ; l'erreur d'un
+    abonné est journalisée sans empêcher les suivants d'être notifiés.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+
+    def subscribe(self, event, handler):
+        self._subscribers.setdefault(event, []).append(handler)
+
+    def emit(self, event, *args):
+        for handler in self._subscribers.get(event, ()):
+            try:
+                handler(*args)
+            except Exception as e:
+                logger.error(f"Erreur dans l'abonné {handler!r} à {event}: {e}")
@@ -0,0 +1,52 @@
+﻿# modules/hyperloglog.py
+import hashlib
+import math
+
+
+def _hash64(value):
+    """Hash 64 bits stable entre les redémarrages (contrairement à hash())"""
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """Estimation du nombre d'éléments distincts en mémoire fixe.
+
+    Avec une précision p, le sketch occupe 2**p octets (4 Ko pour p=12) et
+    l'erreur type est d'environ 1.04 / sqrt(2**p) (~1,6 % pour p=12). Deux
+    sketches de même précision se fusionnent par maximum des registres.
+    """
+
+    def __init__(self, precision=12, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+        if len(self.registers) != self.size:
+            raise ValueError("Taille des registres incompatible avec la précision")
+
+    def add(self, value):
+        """Ajoute un élément ; retourne True si le sketch a changé"""
+        h = _hash64(value)
+        bits = 64 - self.precision
+        index = h >> bits
+        rank = bits - (h & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other):
+        """Fusionne un autre sketch dans celui-ci"""
+        if other.precision != self.precision:
+            raise ValueError("Précisions différentes")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        """Nombre estimé d'éléments distincts"""
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Petites cardinalités : comptage linéaire, plus précis
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
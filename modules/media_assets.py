@@ -0,0 +1,91 @@
+﻿# modules/media_assets.py
+import hashlib
+import logging
+import os
+
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaAssetCache:
+    """file_id Telegram des fichiers locaux (bannière, ...) déjà envoyés.
+
+    Un fichier n'est envoyé qu'une fois : les envois suivants réutilisent le
+    file_id renvoyé par Telegram. L'entrée garde le SHA-256 du fichier ; il
+    n'est recalculé que si la taille ou la date de modification changent,
+    et un contenu différent provoque un nouvel envoi.
+    """
+
+    def __init__(self, entries, save=None):
+        self.entries = entries  # chemin -> {'file_id', 'sha256', 'size', 'mtime'}
+        self.save = save
+        self.uploads = 0
+        self.reuses = 0
+
+    def file_id(self, path):
+        """file_id valide pour le contenu actuel du fichier, ou None"""
+        entry = self.entries.get(path)
+        if not entry:
+            return None
+        stat = os.stat(path)
+        if (entry.get('size'), entry.get('mtime')) == (stat.st_size, stat.st_mtime):
+            return entry['file_id']
+        if file_sha256(path) != entry.get('sha256'):
+            return None
+        # Fichier touché sans changement de contenu
+        entry['size'], entry['mtime'] = stat.st_size, stat.st_mtime
+        self._save()
+        return entry['file_id']
+
+    def store(self, path, file_id):
+        stat = os.stat(path)
+        self.entries[path] = {
+            'file_id': file_id,
+            'sha256': file_sha256(path),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime
+        }
+        self._save()
+
+    def forget(self, path):
+        if self.entries.pop(path, None) is not None:
+            self._save()
+
+    def _save(self):
+        if self.save is not None:
+            self.save()
+
+    async def send(self, path, send):
+        """Appelle `send(media)` avec le file_id connu, sinon avec le fichier ouvert ; retourne le message.
+
+        Lève FileNotFoundError si le fichier n'existe pas.
+        """
+        file_id = self.file_id(path)
+        if file_id is not None:
+            try:
+                message = await send(file_id)
+                self.reuses += 1
+                return message
+            except BadRequest as e:
+                # file_id refusé (autre bot, fichier expiré) : renvoyer le fichier
+                logger.warning(f"file_id de {path} refusé, nouvel envoi: {e}")
+                self.forget(path)
+
+        with open(path, 'rb') as f:
+            message = await send(f)
+        self.uploads += 1
+        attachment = message.effective_attachment
+        if isinstance(attachment, (list, tuple)):
+            attachment = attachment[-1]  # Photo : plus grande taille
+        if attachment is not None:
+            self.store(path, attachment.file_id)
+        return message
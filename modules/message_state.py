@@ -0,0 +1,140 @@
+﻿# modules/message_state.py
+import json
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Parties d'un message modifiées par chaque méthode d'édition.
+# Sans reply_markup, Telegram retire le clavier : il fait donc toujours partie du contenu.
+EDIT_PARTS = {
+    'editMessageText': ('text', 'markup'),
+    'editMessageCaption': ('caption', 'markup'),
+    'editMessageMedia': ('media', 'markup'),
+    'editMessageReplyMarkup': ('markup',),
+}
+SEND_PARTS = {
+    'sendMessage': ('text', 'markup'),
+    'sendPhoto': ('caption', 'markup'),
+    'sendVideo': ('caption', 'markup'),
+    'sendAnimation': ('caption', 'markup'),
+    'sendDocument': ('caption', 'markup'),
+}
+# Paramètres qui composent chaque partie
+PART_FIELDS = {
+    'text': ('text', 'parse_mode', 'entities', 'disable_web_page_preview', 'link_preview_options'),
+    'caption': ('caption', 'parse_mode', 'caption_entities'),
+    'media': ('media',),
+    'markup': ('reply_markup',),
+}
+
+
+def _serialize(value):
+    to_dict = getattr(value, 'to_dict', None)
+    return to_dict() if to_dict is not None else str(value)
+
+
+def _fingerprint(data, part):
+    values = [data.get(field) for field in PART_FIELDS[part]]
+    return hash(json.dumps(values, default=_serialize, ensure_ascii=False, sort_keys=True))
+
+
+class MessageStateCache:
+    """Dernier contenu rendu de chaque message du bot, pour éviter les éditions inutiles.
+
+    Pour chaque (chat, message_id), une empreinte du texte, de la légende,
+    du média et du clavier envoyés est conservée (LRU borné). Les erreurs
+    « message is not modified » renvoyées par Telegram sont absorbées.
+
+    Avec `skip_unchanged`, une édition identique au contenu mémorisé est en
+    plus court-circuitée localement, sans appel à l'API. Le cache ne voit
+    que les envois de ce processus : l'option n'est valable que si un seul
+    processus modifie les messages du bot, sinon une empreinte périmée
+    ferait ignorer une édition nécessaire.
+    """
+
+    def __init__(self, max_messages=10000, skip_unchanged=False):
+        self.max_messages = max_messages
+        self.skip_unchanged = skip_unchanged
+        self._messages = OrderedDict()
+        self.skipped = 0        # Éditions identiques non envoyées
+        self.not_modified = 0   # Erreurs « message is not modified » absorbées
+        self.edits = 0          # Éditions envoyées
+
+    @staticmethod
+    def _key(chat_id, message_id, inline_message_id=None):
+        if inline_message_id is not None:
+            return ('inline', inline_message_id)
+        if chat_id is None or message_id is None:
+            return None
+        return (str(chat_id), int(message_id))
+
+    def _key_for(self, data):
+        return self._key(data.get('chat_id'), data.get('message_id'), data.get('inline_message_id'))
+
+    def is_unchanged(self, endpoint, data):
+        """True si l'édition demandée ne changerait rien au message affiché"""
+        parts = EDIT_PARTS.get(endpoint)
+        if parts is None or not self.skip_unchanged:
+            return False
+        key = self._key_for(data)
+        state = self._messages.get(key)
+        if state is None or any(state.get(part) != _fingerprint(data, part) for part in parts):
+            return False
+        self._messages.move_to_end(key)
+        self.skipped += 1
+        return True
+
+    def record(self, endpoint, data, result):
+        """Mémorise le contenu d'un message envoyé ou modifié avec succès"""
+        if endpoint in EDIT_PARTS:
+            self.edits += 1
+            self._update(self._key_for(data), data, EDIT_PARTS[endpoint], media_edit=endpoint == 'editMessageMedia')
+        elif endpoint in SEND_PARTS and isinstance(result, dict):
+            chat = result.get('chat') or {}
+            key = self._key(chat.get('id'), result.get('message_id'))
+            self._messages.pop(key, None)
+            self._update(key, data, SEND_PARTS[endpoint])
+        elif endpoint == 'deleteMessage':
+            self._messages.pop(self._key_for(data), None)
+
+    def record_not_modified(self, endpoint, data):
+        """Telegram a refusé une édition identique : le contenu demandé est celui affiché"""
+        self.not_modified += 1
+        self._update(self._key_for(data), data, EDIT_PARTS.get(endpoint, ()))
+
+    def _update(self, key, data, parts, media_edit=False):
+        if key is None:
+            return
+        state = self._messages.get(key)
+        if state is None:
+            state = self._messages[key] = {}
+            if len(self._messages) > self.max_messages:
+                self._messages.popitem(last=False)
+        else:
+            self._messages.move_to_end(key)
+        if media_edit:
+            state.pop('caption', None)  # La légende fait partie du nouveau média
+        for part in parts:
+            state[part] = _fingerprint(data, part)
+
+    def metrics(self):
+        return {
+            'skipped': self.skipped,
+            'not_modified': self.not_modified,
+            'edits': self.edits,
+            'tracked': len(self._messages)
+        }
+
+
+def create_message_state(config):
+    """Instancie le cache configuré dans config['message_state'].
+
+    `skip_unchanged` est désactivé par défaut : ne l'activer que si le bot
+    tourne dans un seul processus.
+    """
+    options = config.get('message_state', {})
+    return MessageStateCache(
+        max_messages=options.get('max_messages', 10000),
+        skip_unchanged=options.get('skip_unchanged', False)
+    )
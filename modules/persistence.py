@@ -0,0 +1,232 @@
+﻿# modules/persistence.py
+import asyncio
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+def atomic_write_text(path, text):
+    """Écrit un fichier de manière atomique (fichier temporaire + os.replace)"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp_')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path, data, indent=4):
+    """Sérialise des données en JSON et les écrit de manière atomique"""
+    atomic_write_text(path, json.dumps(data, indent=indent, ensure_ascii=False))
+
+
+class WriteBehindWriter:
+    """Persistance différée d'un fichier JSON.
+
+    Les modifications marquent simplement les données comme « sales » ; une tâche
+    de fond attend `delay` secondes puis écrit une seule fois, ce qui regroupe
+    une rafale de modifications en une seule écriture atomique.
+    """
+
+    def __init__(self, path, snapshot, delay=2.0, indent=4):
+        self.path = path
+        self.snapshot = snapshot  # Callable qui retourne les données à sérialiser
+        self.delay = delay
+        self.indent = indent
+        self._dirty = False
+        self._event = None
+        self._lock = None
+        self._task = None
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def mark_dirty(self):
+        """Signale une modification ; l'écriture aura lieu plus tard"""
+        self._dirty = True
+        if self._event is not None:
+            self._event.set()
+
+    async def start(self):
+        """Démarre la tâche d'écriture en arrière-plan (à appeler dans la boucle asyncio)"""
+        if self._task is not None:
+            return
+        self._event = asyncio.Event()
+        self._lock = asyncio.Lock()
+        if self._dirty:
+            self._event.set()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self._event.wait()
+            # Anti-rebond : on laisse les modifications s'accumuler
+            await asyncio.sleep(self.delay)
+            self._event.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Écrit immédiatement les données si elles ont été modifiées"""
+        if not self._dirty:
+            return
+        if self._lock is None:
+            self.flush_sync()
+            return
+        async with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            try:
+                # Le snapshot est pris dans la boucle pour rester cohérent,
+                # seule l'écriture disque part dans un thread
+                text = json.dumps(self.snapshot(), indent=self.indent, ensure_ascii=False)
+                await asyncio.to_thread(atomic_write_text, self.path, text)
+            except Exception as e:
+                self._dirty = True
+                logger.error(f"Erreur lors de l'écriture de {self.path}: {e}")
+
+    def flush_sync(self):
+        """Écriture synchrone, utilisée hors de la boucle asyncio"""
+        if not self._dirty:
+            return
+        try:
+            atomic_write_json(self.path, self.snapshot(), indent=self.indent)
+            self._dirty = False
+        except Exception as e:
+            logger.error(f"Erreur lors de l'écriture de {self.path}: {e}")
+
+    async def stop(self):
+        """Arrête la tâche de fond et écrit les dernières modifications"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+class OperationJournal:
+    """Journal append-only au format JSON lines.
+
+    Les enregistrements sont gardés en mémoire puis écrits et synchronisés
+    (fsync) par lots par une tâche de fond, toutes les `delay` secondes.
+    """
+
+    def __init__(self, path, delay=0.5):
+        self.path = path
+        self.delay = delay
+        self.size = 0  # Nombre d'enregistrements depuis le dernier snapshot
+        self._pending = []
+        self._event = None
+        self._task = None
+        self.lock = None
+
+    def append(self, record):
+        """Ajoute un enregistrement ; il sera écrit au prochain lot"""
+        self._pending.append(json.dumps(record, ensure_ascii=False))
+        self.size += 1
+        if self._event is not None:
+            self._event.set()
+
+    def read(self):
+        """Relit les enregistrements présents sur le disque"""
+        records = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # Dernière ligne tronquée par un arrêt brutal
+                        logger.warning(f"Enregistrement illisible ignoré dans {self.path}")
+                        break
+        except FileNotFoundError:
+            pass
+        self.size = len(records)
+        return records
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._event = asyncio.Event()
+        self.lock = asyncio.Lock()
+        if self._pending:
+            self._event.set()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self._event.wait()
+            await asyncio.sleep(self.delay)
+            self._event.clear()
+            await self.flush()
+
+    def _write(self, lines):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def flush(self):
+        """Écrit et synchronise le lot d'enregistrements en attente"""
+        if not self._pending:
+            return
+        if self.lock is None:
+            self.flush_sync()
+            return
+        async with self.lock:
+            lines, self._pending = self._pending, []
+            if not lines:
+                return
+            try:
+                await asyncio.to_thread(self._write, lines)
+            except Exception as e:
+                self._pending[:0] = lines
+                logger.error(f"Erreur lors de l'écriture du journal {self.path}: {e}")
+
+    def flush_sync(self):
+        if not self._pending:
+            return
+        lines, self._pending = self._pending, []
+        self._write(lines)
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def truncate(self, pending_count):
+        """Vide le journal après un snapshot qui inclut déjà ses enregistrements.
+
+        Seuls les `pending_count` premiers enregistrements en attente sont
+        abandonnés : ceux ajoutés pendant l'écriture du snapshot sont conservés.
+        """
+        del self._pending[:pending_count]
+        open(self.path, 'w', encoding='utf-8').close()
+        self.size = len(self._pending)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,144 @@
+﻿# modules/prober.py
+import json
+import logging
+import time
+
+from modules.broadcast import BroadcastEngine
+from modules.persistence import WriteBehindWriter
+
+logger = logging.getLogger(__name__)
+
+
+class UserProber:
+    """Vérification en arrière-plan des utilisateurs inactifs.
+
+    Seuls les utilisateurs sans activité depuis `stale_days` jours, et non
+    vérifiés depuis autant de temps, sont sondés. Les vérifications passent
+    par un BroadcastEngine (concurrence bornée, débit limité, RetryAfter).
+    La liste restante et le résultat du dernier passage sont persistés : un
+    passage interrompu reprend au redémarrage et les écrans admin lisent
+    `last_run` au lieu de lancer un scan complet.
+    """
+
+    def __init__(self, engine, path='data/prober.json', stale_days=7, delay=5.0):
+        self.engine = engine
+        self.path = path
+        self.stale_days = stale_days
+        self.probed_at = {}  # str(user_id) -> timestamp (clés texte comme en JSON)
+        self.pending = []
+        self._remaining = None
+        self.last_run = None
+        self.running = False
+        self.writer = WriteBehindWriter(path, self.to_dict, delay=delay)
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error(f"Erreur lors du chargement de l'état du prober: {e}")
+            return
+        self.probed_at = data.get('probed_at', {})
+        self.pending = data.get('pending', [])
+        self.last_run = data.get('last_run')
+
+    def to_dict(self):
+        pending = self.pending
+        if self._remaining is not None:
+            pending = [user_id for user_id in pending if user_id in self._remaining]
+        return {
+            'probed_at': self.probed_at,
+            'pending': pending,
+            'last_run': self.last_run
+        }
+
+    @property
+    def remaining_count(self):
+        """Nombre d'utilisateurs restant à vérifier dans le passage en cours"""
+        return len(self._remaining) if self._remaining is not None else len(self.pending)
+
+    def select(self, users, now=None):
+        """Utilisateurs du registre à sonder : inactifs et non vérifiés depuis `stale_days` jours"""
+        now = now or time.time()
+        threshold = now - self.stale_days * 86400
+        selected = []
+        for record in users.records():
+            if record.last_seen is not None and record.last_seen >= threshold:
+                continue
+            if self.probed_at.get(str(record.user_id), 0) >= threshold:
+                continue
+            selected.append(record.user_id)
+        return selected
+
+    async def run(self, users, probe, on_unreachable):
+        """Sonde les utilisateurs restants (ou une nouvelle sélection) ; retourne le résultat du passage.
+
+        `users` est le UserRegistry ; `probe(user_id)` lève une exception si l'utilisateur est injoignable ;
+        `on_unreachable(user_id)` est appelé pour chaque utilisateur à supprimer.
+        """
+        if self.running:
+            return self.last_run
+        self.running = True
+        try:
+            # Reprendre le passage interrompu, sinon sélectionner les utilisateurs inactifs
+            pending = [user_id for user_id in self.pending if user_id in users] or self.select(users)
+            remaining = self._remaining = set(pending)
+            self.pending = pending
+            result = {
+                'started': time.time(),
+                'finished': None,
+                'checked': 0,
+                'removed': 0,
+                'failed': 0,
+                'total_users': len(users)
+            }
+            self.last_run = result
+            self.writer.mark_dirty()
+
+            def on_result(user_id, outcome):
+                remaining.discard(user_id)
+                result['checked'] += 1
+                if outcome == 'sent':
+                    self.probed_at[str(user_id)] = time.time()
+                elif outcome == 'unreachable':
+                    self.probed_at.pop(str(user_id), None)
+                    result['removed'] += 1
+                    on_unreachable(user_id)
+                else:
+                    result['failed'] += 1
+                self.writer.mark_dirty()
+
+            await self.engine.run(pending, probe, on_result=on_result)
+
+            self.pending = []
+            self._remaining = None
+            result['finished'] = time.time()
+            result['total_users'] = len(users)
+            self.writer.mark_dirty()
+            return result
+        finally:
+            if self._remaining is not None:
+                # Passage interrompu : ne garder que les utilisateurs restants
+                self.pending = [user_id for user_id in self.pending if user_id in self._remaining]
+                self._remaining = None
+            self.running = False
+
+    def forget(self, user_ids):
+        """Oublie l'état de vérification d'utilisateurs supprimés"""
+        for user_id in user_ids:
+            self.probed_at.pop(str(user_id), None)
+        self.writer.mark_dirty()
+
+
+def create_user_prober(config):
+    """Instancie le prober configuré dans config['prober']"""
+    options = config.get('prober', {})
+    engine = BroadcastEngine(
+        rate=options.get('rate', 10.0),
+        concurrency=options.get('concurrency', 10),
+        per_chat_interval=0.0,
+        progress_interval=options.get('progress_interval', 30.0)
+    )
+    return UserProber(engine, stale_days=options.get('stale_days', 7))
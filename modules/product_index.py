@@ -0,0 +1,114 @@
+﻿# modules/product_index.py
+from modules.events import CATEGORY_DELETED, PRODUCT_DELETED, PRODUCT_RENAMED
+
+
+class ProductIndex:
+    """Index des produits du catalogue {catégorie: [produits]}.
+
+    Permet de retrouver un produit en O(1) par (catégorie, nom) ou par son
+    id stable (product['id']). Les méthodes d'ajout / modification /
+    suppression mettent à jour le catalogue et l'index en même temps, et
+    publient les suppressions et renommages sur le bus d'événements.
+    """
+
+    def __init__(self, catalog, events=None):
+        self.catalog = catalog
+        self.events = events
+        self.version = 0
+        self._by_key = {}
+        self._by_id = {}
+        self._next_id = 1
+
+    def build(self):
+        """Construit l'index ; retourne les (catégorie, produit) qui ont reçu un nouvel id"""
+        self._by_key = {}
+        self._by_id = {}
+        ids = [int(p['id']) for products in self.catalog.values() for p in products
+               if str(p.get('id', '')).isdigit()]
+        self._next_id = max(ids, default=0) + 1
+
+        assigned = []
+        for category, products in self.catalog.items():
+            for product in products:
+                if product.get('id') in self._by_id or not str(product.get('id', '')).isdigit():
+                    product['id'] = self._new_id()
+                    assigned.append((category, product))
+                self._index(category, product)
+        self.version += 1
+        return assigned
+
+    def _new_id(self):
+        product_id = str(self._next_id)
+        self._next_id += 1
+        return product_id
+
+    @staticmethod
+    def sort_media(product):
+        """Trie les médias du produit par order_index (une fois, à l'enregistrement)"""
+        media = product.get('media')
+        if isinstance(media, list):
+            media.sort(key=lambda m: m.get('order_index', 0))
+
+    def _index(self, category, product):
+        self.sort_media(product)
+        self._by_key[(category, product['name'])] = product
+        self._by_id[product['id']] = (category, product)
+
+    # Lecture
+    def get(self, category, name):
+        return self._by_key.get((category, name))
+
+    def get_by_id(self, product_id):
+        """Retourne (catégorie, produit) ou (None, None)"""
+        return self._by_id.get(product_id, (None, None))
+
+    # Écriture
+    def add(self, category, product):
+        """Ajoute un produit au catalogue en lui attribuant un id"""
+        product['id'] = self._new_id()
+        self.catalog.setdefault(category, []).append(product)
+        self._index(category, product)
+        self.version += 1
+        return product
+
+    def update(self, category, name, field, value):
+        """Modifie un champ d'un produit (gère le renommage)"""
+        product = self._by_key.get((category, name))
+        if product is None:
+            return None
+        product[field] = value
+        if field == 'media':
+            self.sort_media(product)
+        if field == 'name' and value != name:
+            del self._by_key[(category, name)]
+            self._by_key[(category, value)] = product
+            self._emit(PRODUCT_RENAMED, category, name, value)
+        self.version += 1
+        return product
+
+    def remove(self, category, name):
+        """Supprime un produit du catalogue"""
+        product = self._by_key.pop((category, name), None)
+        if product is None:
+            return None
+        self._by_id.pop(product.get('id'), None)
+        self.catalog[category] = [p for p in self.catalog[category] if p is not product]
+        self.version += 1
+        self._emit(PRODUCT_DELETED, category, name)
+        return product
+
+    def remove_category(self, category):
+        """Supprime une catégorie et tous ses produits"""
+        products = self.catalog.pop(category, None)
+        if products is None:
+            return None
+        for product in products:
+            self._by_key.pop((category, product['name']), None)
+            self._by_id.pop(product.get('id'), None)
+        self.version += 1
+        self._emit(CATEGORY_DELETED, category)
+        return products
+
+    def _emit(self, event, *args):
+        if self.events is not None:
+            self.events.emit(event, *args)
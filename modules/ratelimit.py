@@ -0,0 +1,82 @@
+﻿# modules/ratelimit.py
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Seau à jetons asyncio : `rate` jetons par seconde, rafale de `capacity`.
+
+    `pause()` bloque toutes les acquisitions pendant un délai donné (utilisé
+    quand Telegram renvoie un RetryAfter, qui s'applique à tout le bot).
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens=1):
+        # Le verrou garantit un ordre FIFO entre les tâches en attente
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def delay(self, tokens=1):
+        """Secondes à attendre avant que `tokens` jetons soient disponibles"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._refill(now)
+        if self._tokens >= tokens:
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    def try_acquire(self, tokens=1):
+        """Prend des jetons sans attendre ; retourne False s'il n'y en a pas assez"""
+        if self.delay(tokens) > 0:
+            return False
+        self._tokens -= tokens
+        return True
+
+    def pause(self, seconds):
+        """Suspend le seau pendant `seconds` secondes et le vide"""
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        self._updated = self._paused_until
+
+
+class KeyedRateLimiter:
+    """Impose un intervalle minimal entre deux envois vers la même clé (chat)"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next_allowed = {}
+
+    async def wait(self, key):
+        now = time.monotonic()
+        next_allowed = self._next_allowed.get(key, 0.0)
+        # Réserver le créneau avant d'attendre pour que les envois concurrents s'enchaînent
+        self._next_allowed[key] = max(now, next_allowed) + self.interval
+        if next_allowed > now:
+            await asyncio.sleep(next_allowed - now)
+
+    def prune(self):
+        """Oublie les clés dont l'intervalle est écoulé"""
+        now = time.monotonic()
+        self._next_allowed = {k: t for k, t in self._next_allowed.items() if t > now}
@@ -0,0 +1,39 @@
+﻿# modules/render_cache.py
+from collections import OrderedDict
+
+
+class RenderCache:
+    """Cache LRU des écrans rendus (texte et InlineKeyboardMarkup).
+
+    La clé contient la version du catalogue : après une modification, les
+    anciennes entrées ne sont plus jamais demandées et sortent du cache par
+    éviction LRU. Les InlineKeyboardMarkup sont immuables et peuvent donc
+    être partagés entre les requêtes.
+    """
+
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, view, target, version, is_admin, render):
+        """Retourne le rendu de (view, target, version, is_admin), en appelant `render()` si absent"""
+        key = (view, target, version, is_admin)
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            value = self._entries[key] = render()
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return value
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
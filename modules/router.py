@@ -0,0 +1,113 @@
+﻿# modules/router.py
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _TrieNode:
+    __slots__ = ('children', 'route')
+
+    def __init__(self):
+        self.children = {}
+        self.route = None
+
+
+class CallbackRouter:
+    """Aiguillage des callback_data vers leurs gestionnaires.
+
+    Chaque action est enregistrée une seule fois : soit comme valeur exacte
+    (dictionnaire), soit comme préfixe (trie), soit comme action du
+    CallbackCodec (préfixe « code: » dont les arguments sont décodés). Le coût
+    d'un aiguillage ne dépend que de la longueur du préfixe, pas du nombre de
+    routes enregistrées.
+
+    Les gestionnaires sont appelés avec (update, context, *arguments).
+    """
+
+    def __init__(self, codec=None):
+        self.codec = codec
+        self._exact = {}
+        self._trie = _TrieNode()
+
+    # Enregistrement
+    def add_exact(self, data, handler):
+        if data in self._exact:
+            raise ValueError(f"Route déjà enregistrée : {data!r}")
+        self._exact[data] = handler
+
+    def add_prefix(self, prefix, handler, decode=None):
+        node = self._trie
+        for char in prefix:
+            node = node.children.setdefault(char, _TrieNode())
+        if node.route is not None:
+            raise ValueError(f"Préfixe déjà enregistré : {prefix!r}")
+        node.route = (handler, decode)
+
+    def add_action(self, action, handler):
+        self.add_prefix(self.codec.pattern(action)[1:], handler, decode=self.codec.decode)
+
+    # API décorateur
+    def route(self, *datas):
+        """Enregistre un gestionnaire pour une ou plusieurs valeurs exactes"""
+        def decorator(handler):
+            for data in datas:
+                self.add_exact(data, handler)
+            return handler
+        return decorator
+
+    def prefix(self, *prefixes):
+        """Enregistre un gestionnaire pour des préfixes ; il reçoit le reste de la donnée"""
+        def decorator(handler):
+            for prefix in prefixes:
+                self.add_prefix(prefix, handler)
+            return handler
+        return decorator
+
+    def action(self, *actions):
+        """Enregistre un gestionnaire pour des actions du codec ; il reçoit les arguments décodés"""
+        def decorator(handler):
+            for action in actions:
+                self.add_action(action, handler)
+            return handler
+        return decorator
+
+    # Aiguillage
+    def resolve(self, data):
+        """Retourne (gestionnaire, arguments) ou (None, None)"""
+        if data is None:
+            return None, None
+        handler = self._exact.get(data)
+        if handler is not None:
+            return handler, ()
+
+        # Plus long préfixe enregistré
+        node = self._trie
+        match, match_length = None, 0
+        for length, char in enumerate(data, 1):
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.route is not None:
+                match, match_length = node.route, length
+        if match is None:
+            return None, None
+
+        handler, decode = match
+        if decode is None:
+            return handler, (data[match_length:],)
+        _, args = decode(data)
+        if args is None:
+            return None, None
+        return handler, tuple(args)
+
+    def matches(self, data):
+        """Filtre utilisable comme `pattern` d'un CallbackQueryHandler"""
+        return self.resolve(data)[0] is not None
+
+    async def dispatch(self, update, context):
+        handler, args = self.resolve(update.callback_query.data)
+        if handler is None:
+            logger.warning(f"Aucune route pour le callback {update.callback_query.data!r}")
+            await update.callback_query.answer()
+            return None
+        return await handler(update, context, *args)
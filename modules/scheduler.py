@@ -0,0 +1,181 @@
+﻿# modules/scheduler.py
+import asyncio
+import logging
+import time
+from collections import deque
+
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from modules.broadcast import retry_after_seconds
+from modules.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Classes de priorité, de la plus prioritaire à la moins prioritaire
+INTERACTIVE = 'interactive'
+ADMIN = 'admin'
+BULK = 'bulk'
+PRIORITIES = (INTERACTIVE, ADMIN, BULK)
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """Ordonnanceur des requêtes sortantes du bot, par classe de priorité.
+
+    Toutes les requêtes partagent un seau global (limite de l'API Bot). Chaque
+    classe peut en plus avoir son propre budget (jetons/s) ; lorsqu'un jeton
+    global se libère, il est attribué à la classe la plus prioritaire qui a
+    des requêtes en attente et du budget. Les clics des utilisateurs passent
+    ainsi devant les diffusions et les vérifications en masse.
+
+    La classe est choisie avec `rate_limit_args` lors de l'appel au bot
+    (ex. `bot.copy_message(..., rate_limit_args=BULK)`) ; sans argument, la
+    requête est considérée comme interactive.
+
+    Avec un MessageStateCache, les refus « message is not modified » sont
+    absorbés ; si le cache l'autorise (un seul processus), les éditions qui
+    ne changeraient pas le message affiché sont court-circuitées avant
+    d'entrer en file.
+    """
+
+    def __init__(self, rate=30.0, budgets=None, message_state=None):
+        self.message_state = message_state
+        self.bucket = TokenBucket(rate)
+        budgets = budgets if budgets is not None else {ADMIN: 10.0, BULK: 25.0}
+        self.class_buckets = {
+            priority: TokenBucket(budgets[priority]) if budgets.get(priority) else None
+            for priority in PRIORITIES
+        }
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        self._stats = {
+            priority: {'granted': 0, 'max_queued': 0, 'total_wait': 0.0}
+            for priority in PRIORITIES
+        }
+        self._wakeup = None
+        self._task = None
+
+    async def initialize(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        state = self.message_state
+        if state is not None and state.is_unchanged(endpoint, data):
+            return True  # Réponse de l'API pour une édition sans message renvoyé
+        priority = self._priority(rate_limit_args)
+        await self._acquire(priority)
+        try:
+            result = await callback(*args, **kwargs)
+        except RetryAfter as e:
+            # Le délai imposé par Telegram s'applique à tout le bot
+            self.bucket.pause(retry_after_seconds(e))
+            raise
+        except BadRequest as e:
+            if state is not None and 'message is not modified' in str(e).lower():
+                state.record_not_modified(endpoint, data)
+                return True
+            raise
+        if state is not None:
+            state.record(endpoint, data, result)
+        return result
+
+    @staticmethod
+    def _priority(rate_limit_args):
+        if isinstance(rate_limit_args, dict):
+            rate_limit_args = rate_limit_args.get('priority')
+        return rate_limit_args if rate_limit_args in PRIORITIES else INTERACTIVE
+
+    async def _acquire(self, priority):
+        if self._task is None:
+            return
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues[priority]
+        queue.append((future, time.monotonic()))
+        stats = self._stats[priority]
+        stats['max_queued'] = max(stats['max_queued'], len(queue))
+        self._wakeup.set()
+        await future
+
+    def _grant(self):
+        """Attribue un jeton à la classe la plus prioritaire ; retourne le délai d'attente sinon"""
+        wait = None
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and queue[0][0].done():
+                queue.popleft()  # Requête annulée entre-temps
+            if not queue:
+                continue
+            class_bucket = self.class_buckets[priority]
+            if class_bucket is not None and not class_bucket.try_acquire():
+                class_wait = class_bucket.delay()
+                wait = class_wait if wait is None else min(wait, class_wait)
+                continue
+            self.bucket.try_acquire()
+            future, enqueued = queue.popleft()
+            future.set_result(None)
+            stats = self._stats[priority]
+            stats['granted'] += 1
+            stats['total_wait'] += time.monotonic() - enqueued
+            return 0.0
+        return wait
+
+    async def _dispatch(self):
+        while True:
+            if not any(self._queues.values()):
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            global_wait = self.bucket.delay()
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+                continue
+            wait = self._grant()
+            if wait is None:
+                # Seules des requêtes annulées restaient en file
+                continue
+            if wait > 0:
+                # Toutes les classes en attente ont épuisé leur budget ;
+                # une requête plus prioritaire peut arriver entre-temps
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    def metrics(self):
+        """Profondeur des files et temps d'attente moyen par classe"""
+        result = {}
+        for priority in PRIORITIES:
+            stats = self._stats[priority]
+            granted = stats['granted']
+            result[priority] = {
+                'queued': len(self._queues[priority]),
+                'max_queued': stats['max_queued'],
+                'granted': granted,
+                'avg_wait': stats['total_wait'] / granted if granted else 0.0
+            }
+        return result
+
+
+def create_rate_limiter(config, message_state=None):
+    """Instancie l'ordonnanceur configuré dans config['rate_limits']"""
+    options = config.get('rate_limits', {})
+    return PriorityRateLimiter(
+        rate=options.get('rate', 30.0),
+        budgets={
+            INTERACTIVE: options.get(INTERACTIVE),
+            ADMIN: options.get(ADMIN, 10.0),
+            BULK: options.get(BULK, 25.0)
+        },
+        message_state=message_state
+    )
@@ -0,0 +1,346 @@
+﻿# modules/stats.py
+import base64
+import heapq
+import json
+import logging
+import time
+from array import array
+from datetime import datetime
+
+from modules.events import CATEGORY_DELETED, PRODUCT_DELETED, PRODUCT_RENAMED
+from modules.persistence import WriteBehindWriter
+
+logger = logging.getLogger(__name__)
+
+HOURS = 48  # Heures conservées (24 dernières + 24 précédentes)
+DAYS = 14   # Jours conservés (semaine en cours + semaine précédente)
+
+
+def _window_sum(buffer, end, count):
+    """Somme des `count` cases du tampon circulaire se terminant à la position absolue `end`"""
+    size = len(buffer)
+    start, stop = (end - count + 1) % size, end % size + 1
+    if start < stop:
+        return sum(buffer[start:stop])
+    return sum(buffer[start:]) + sum(buffer[:stop])
+
+
+class ViewSeries:
+    """Vues par heure et par jour dans des tampons circulaires de taille fixe"""
+
+    __slots__ = ('hourly', 'daily')
+
+    def __init__(self):
+        self.hourly = array('I', bytes(4 * HOURS))
+        self.daily = array('I', bytes(4 * DAYS))
+
+    def to_list(self):
+        return [base64.b64encode(self.hourly.tobytes()).decode('ascii'),
+                base64.b64encode(self.daily.tobytes()).decode('ascii')]
+
+    @classmethod
+    def from_list(cls, data):
+        series = cls()
+        hourly, daily = array('I'), array('I')
+        hourly.frombytes(base64.b64decode(data[0]))
+        daily.frombytes(base64.b64decode(data[1]))
+        if len(hourly) == HOURS and len(daily) == DAYS:
+            series.hourly, series.daily = hourly, daily
+        return series
+
+    def trends(self, hour, day):
+        """Vues des dernières 24 h, des 7 derniers jours, et évolution sur une semaine (en %)"""
+        last_24h = _window_sum(self.hourly, hour, 24)
+        last_7d = _window_sum(self.daily, day, 7)
+        previous_7d = _window_sum(self.daily, day - 7, 7)
+        week_over_week = (last_7d - previous_7d) * 100.0 / previous_7d if previous_7d else None
+        return {'last_24h': last_24h, 'last_7d': last_7d, 'previous_7d': previous_7d,
+                'week_over_week': week_over_week}
+
+
+class StatsEngine:
+    """Compteurs de vues en mémoire, séparés du catalogue.
+
+    Une vue coûte une incrémentation de dictionnaire ; l'état complet est
+    sauvegardé dans son propre fichier par un WriteBehindWriter. Tout tourne
+    dans la même boucle asyncio, aucun verrou n'est donc nécessaire.
+
+    Les `top_size` produits les plus vus sont tenus à jour à chaque vue (le
+    compteur ne fait qu'augmenter : le produit ne peut que remonter) ; le
+    classement n'est recalculé entièrement qu'après une suppression.
+
+    Chaque vue est aussi comptée dans des tampons circulaires horaires et
+    journaliers (ViewSeries) pour le total, chaque catégorie et chaque
+    produit : la mémoire reste bornée et les tendances s'obtiennent par
+    des sommes sur des tranches de array('I').
+    """
+
+    def __init__(self, path='data/stats.json', delay=30.0, top_size=10):
+        self.path = path
+        self.top_size = top_size
+        self._top = []  # (catégorie, produit), du plus vu au moins vu
+        self._hour = int(time.time() // 3600)
+        self._day = int(time.time() // 86400)
+        self.total_series = ViewSeries()
+        self.category_series = {}
+        self.product_series = {}
+        self.total_views = 0
+        self.category_views = {}
+        self.product_views = {}
+        self.last_updated = None  # Timestamp epoch de la dernière vue
+        self.last_reset = datetime.utcnow().strftime("%Y-%m-%d")
+        self.writer = WriteBehindWriter(path, self.to_dict, delay=delay)
+
+    def load(self, legacy_stats=None):
+        """Charge les compteurs depuis le fichier, ou depuis l'ancien bloc CATALOG['stats']"""
+        data = None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            if legacy_stats:
+                data = legacy_stats
+                self.writer.mark_dirty()
+        except Exception as e:
+            logger.error(f"Erreur lors du chargement des statistiques: {e}")
+
+        if not data:
+            return
+
+        self.total_views = data.get('total_views', 0)
+        self.category_views = dict(data.get('category_views', {}))
+        self.product_views = {
+            category: dict(products)
+            for category, products in data.get('product_views', {}).items()
+        }
+        self.last_reset = data.get('last_reset', self.last_reset)
+        last_updated = data.get('last_updated')
+        if isinstance(last_updated, (int, float)):
+            self.last_updated = last_updated
+        self._rebuild_top()
+        self._load_series(data.get('series'))
+
+    def _load_series(self, data):
+        if not data:
+            return
+        try:
+            self._hour = data['hour']
+            self._day = data['day']
+            self.total_series = ViewSeries.from_list(data['total'])
+            self.category_series = {
+                category: ViewSeries.from_list(series)
+                for category, series in data.get('categories', {}).items()
+            }
+            self.product_series = {
+                category: {product_name: ViewSeries.from_list(series) for product_name, series in products.items()}
+                for category, products in data.get('products', {}).items()
+            }
+        except Exception as e:
+            logger.error(f"Erreur lors du chargement de l'historique des vues: {e}")
+            self.total_series, self.category_series, self.product_series = ViewSeries(), {}, {}
+        self._advance()
+
+    def to_dict(self):
+        return {
+            'total_views': self.total_views,
+            'category_views': self.category_views,
+            'product_views': self.product_views,
+            'last_updated': self.last_updated,
+            'last_reset': self.last_reset,
+            'series': {
+                'hour': self._hour,
+                'day': self._day,
+                'total': self.total_series.to_list(),
+                'categories': {category: series.to_list() for category, series in self.category_series.items()},
+                'products': {
+                    category: {product_name: series.to_list() for product_name, series in products.items()}
+                    for category, products in self.product_series.items()
+                }
+            }
+        }
+
+    def record_category_view(self, category):
+        """Enregistre la vue d'une catégorie"""
+        self.category_views[category] = self.category_views.get(category, 0) + 1
+        series = self.category_series.get(category)
+        if series is None:
+            series = self.category_series[category] = ViewSeries()
+        self._touch(series)
+
+    def record_product_view(self, category, product_name):
+        """Enregistre la vue d'un produit"""
+        products = self.product_views.get(category)
+        if products is None:
+            products = self.product_views[category] = {}
+        products[product_name] = products.get(product_name, 0) + 1
+        self._update_top(category, product_name)
+        series = self.product_series.setdefault(category, {}).get(product_name)
+        if series is None:
+            series = self.product_series[category][product_name] = ViewSeries()
+        self._touch(series)
+
+    def _touch(self, series):
+        self.total_views += 1
+        self.last_updated = time.time()
+        self._advance(self.last_updated)
+        hour, day = self._hour % HOURS, self._day % DAYS
+        for buffers in (self.total_series, series):
+            buffers.hourly[hour] += 1
+            buffers.daily[day] += 1
+        self.writer.mark_dirty()
+
+    # Historique
+    def _all_series(self):
+        yield self.total_series
+        yield from self.category_series.values()
+        for products in self.product_series.values():
+            yield from products.values()
+
+    def _advance(self, now=None):
+        """Fait avancer les tampons jusqu'à l'heure courante en vidant les cases périmées"""
+        now = now if now is not None else time.time()
+        hour, day = int(now // 3600), int(now // 86400)
+        stale_hours = [h % HOURS for h in range(max(self._hour + 1, hour - HOURS + 1), hour + 1)]
+        stale_days = [d % DAYS for d in range(max(self._day + 1, day - DAYS + 1), day + 1)]
+        if not stale_hours and not stale_days:
+            return
+        for series in self._all_series():
+            for slot in stale_hours:
+                series.hourly[slot] = 0
+            for slot in stale_days:
+                series.daily[slot] = 0
+        self._hour, self._day = max(self._hour, hour), max(self._day, day)
+
+    def trends(self, category=None, product_name=None, now=None):
+        """Tendances (24 h, 7 jours, semaine/semaine) du total, d'une catégorie ou d'un produit"""
+        self._advance(now)
+        if product_name is not None:
+            series = self.product_series.get(category, {}).get(product_name)
+        elif category is not None:
+            series = self.category_series.get(category)
+        else:
+            series = self.total_series
+        return (series or ViewSeries()).trends(self._hour, self._day)
+
+    # Classement des produits
+    def _views(self, key):
+        return self.product_views[key[0]][key[1]]
+
+    def _update_top(self, category, product_name):
+        """Remonte le produit dans le classement après l'incrémentation de son compteur"""
+        key = (category, product_name)
+        top = self._top
+        try:
+            position = top.index(key)
+        except ValueError:
+            if len(top) >= self.top_size:
+                if self._views(key) <= self._views(top[-1]):
+                    return
+                top.pop()
+            top.append(key)
+            position = len(top) - 1
+        views = self._views(key)
+        while position > 0 and self._views(top[position - 1]) < views:
+            top[position] = top[position - 1]
+            position -= 1
+        top[position] = key
+
+    def _rebuild_top(self):
+        self._top = [
+            (category, product_name)
+            for _, category, product_name in heapq.nlargest(
+                self.top_size,
+                ((views, category, product_name)
+                 for category, products in self.product_views.items()
+                 for product_name, views in products.items())
+            )
+        ]
+
+    def top_products(self, count=None):
+        """Produits les plus vus : [(catégorie, produit, vues)]"""
+        return [(category, product_name, self._views((category, product_name)))
+                for category, product_name in self._top[:count]]
+
+    def top_categories(self, count=None):
+        """Catégories triées par nombre de vues décroissant (les `count` premières)"""
+        if count is None:
+            return sorted(self.category_views.items(), key=lambda x: x[1], reverse=True)
+        return heapq.nlargest(count, self.category_views.items(), key=lambda x: x[1])
+
+    def forget_category(self, category):
+        """Supprime les statistiques d'une catégorie"""
+        # Les séries survivent à reset() : elles sont retirées même sans compteur
+        removed = self.category_views.pop(category, None) is not None
+        removed = self.product_views.pop(category, None) is not None or removed
+        removed = self.category_series.pop(category, None) is not None or removed
+        removed = self.product_series.pop(category, None) is not None or removed
+        if removed:
+            self._rebuild_top()
+            self.writer.mark_dirty()
+        return removed
+
+    def forget_product(self, category, product_name):
+        """Supprime les statistiques d'un produit"""
+        removed = False
+        products = self.product_views.get(category)
+        if products and product_name in products:
+            del products[product_name]
+            if not products:
+                del self.product_views[category]
+            removed = True
+        # La série est retirée même sans compteur (reset() conserve les séries)
+        series = self.product_series.get(category)
+        if series is not None and series.pop(product_name, None) is not None:
+            if not series:
+                del self.product_series[category]
+            removed = True
+        if not removed:
+            return False
+        if (category, product_name) in self._top:
+            self._rebuild_top()
+        self.writer.mark_dirty()
+        return True
+
+    def rename_product(self, category, old_name, new_name):
+        """Reporte les statistiques d'un produit renommé sur son nouveau nom"""
+        products = self.product_views.get(category)
+        has_views = bool(products) and old_name in products
+        # La série est reportée même sans compteur (reset() conserve les séries)
+        series = self.product_series.get(category, {})
+        if not has_views and old_name not in series:
+            return False
+        if has_views:
+            products[new_name] = products.get(new_name, 0) + products.pop(old_name)
+        old_series = series.pop(old_name, None)
+        if old_series is not None:
+            merged = series.get(new_name)
+            if merged is None:
+                series[new_name] = old_series
+            else:
+                merged.hourly = array('I', map(sum, zip(merged.hourly, old_series.hourly)))
+                merged.daily = array('I', map(sum, zip(merged.daily, old_series.daily)))
+        self._rebuild_top()
+        self.writer.mark_dirty()
+        return True
+
+    def subscribe(self, events):
+        """Suit les suppressions et renommages du catalogue"""
+        events.subscribe(CATEGORY_DELETED, self.forget_category)
+        events.subscribe(PRODUCT_DELETED, self.forget_product)
+        events.subscribe(PRODUCT_RENAMED, self.rename_product)
+
+    def reset(self):
+        """Remet les compteurs cumulés à zéro (l'historique des tendances est conservé)"""
+        self.total_views = 0
+        self.category_views = {}
+        self.product_views = {}
+        self._top = []
+        self.last_updated = time.time()
+        self.last_reset = datetime.utcnow().strftime("%Y-%m-%d")
+        self.writer.mark_dirty()
+
+    def last_updated_str(self):
+        """Heure de la dernière vue au format HH:MM:SS"""
+        if self.last_updated is None:
+            return 'Jamais'
+        return datetime.utcfromtimestamp(self.last_updated).strftime("%H:%M:%S")
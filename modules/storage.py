@@ -0,0 +1,675 @@
+﻿# modules/storage.py
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+
+from modules.persistence import OperationJournal, WriteBehindWriter, atomic_write_json, atomic_write_text
+from modules.users import last_seen_epoch
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES_FILE = 'data/categories.json'
+PRODUCTS_FILE = 'data/products.json'
+USERS_FILE = 'data/active_users.json'
+STATS_FILE = 'data/stats.json'
+
+
+def _default_access_control():
+    return {'enabled': False, 'valid_codes': {}, 'authorized_users': []}
+
+
+def apply_catalog_operation(catalog, record):
+    """Rejoue une opération du journal sur le catalogue (opérations idempotentes)"""
+    op = record.get('op')
+    category = record.get('category')
+
+    if op == 'put_category':
+        catalog.setdefault(category, [])
+    elif op == 'delete_category':
+        catalog.pop(category, None)
+    elif op == 'put_product':
+        product = record['product']
+        products = catalog.setdefault(category, [])
+        names = (record.get('old_name'), product['name'])
+        for i, existing in enumerate(products):
+            if existing.get('name') in names:
+                products[i] = product
+                break
+        else:
+            products.append(product)
+    elif op == 'delete_product':
+        if category in catalog:
+            catalog[category] = [p for p in catalog[category] if p.get('name') != record['name']]
+    else:
+        logger.warning(f"Opération de journal inconnue : {op}")
+
+
+class StorageBackend:
+    """Interface commune des backends de stockage.
+
+    Chaque méthode d'écriture ne concerne qu'un seul élément (produit,
+    catégorie, utilisateur, code) afin que les backends capables de mises
+    à jour partielles n'aient jamais à tout réécrire.
+    """
+
+    async def start(self):
+        """Démarre les éventuelles tâches de fond"""
+
+    async def flush(self):
+        """Force l'écriture des modifications en attente"""
+
+    async def stop(self):
+        """Écrit les modifications en attente et libère les ressources"""
+
+    # Catalogue {catégorie: [produits]}
+    def load_catalog(self) -> dict:
+        raise NotImplementedError
+
+    def save_catalog(self, catalog):
+        raise NotImplementedError
+
+    def put_catalog_category(self, category):
+        raise NotImplementedError
+
+    def delete_catalog_category(self, category):
+        raise NotImplementedError
+
+    def put_catalog_product(self, category, product, old_name=None):
+        raise NotImplementedError
+
+    def delete_catalog_product(self, category, product_name):
+        raise NotImplementedError
+
+    # Catégories et produits indexés par id
+    def source_version(self):
+        """Jeton qui change quand les catégories/produits sont modifiés hors du processus"""
+        return None
+
+    def load_categories(self) -> list:
+        raise NotImplementedError
+
+    def save_category(self, category):
+        raise NotImplementedError
+
+    def delete_category(self, category_id):
+        raise NotImplementedError
+
+    def load_products(self) -> list:
+        raise NotImplementedError
+
+    def get_product(self, product_id):
+        raise NotImplementedError
+
+    def save_product(self, product):
+        raise NotImplementedError
+
+    # Utilisateurs
+    def load_users(self) -> dict:
+        raise NotImplementedError
+
+    def save_users(self, users):
+        """Insère ou met à jour les utilisateurs fournis {user_id: infos}"""
+        raise NotImplementedError
+
+    def delete_users(self, user_ids):
+        raise NotImplementedError
+
+    def attach_users(self, snapshot):
+        """Indique la source complète des utilisateurs en mémoire (callable -> {id: infos}).
+
+        Les backends qui réécrivent tout le fichier l'utilisent au lieu de
+        garder leur propre copie des utilisateurs.
+        """
+
+    # Contrôle d'accès
+    def load_access_control(self) -> dict:
+        raise NotImplementedError
+
+    def set_access_enabled(self, enabled):
+        raise NotImplementedError
+
+    def put_access_code(self, code, info):
+        raise NotImplementedError
+
+    def delete_access_codes(self, codes):
+        raise NotImplementedError
+
+    def add_authorized_user(self, user_id):
+        raise NotImplementedError
+
+
+class JsonStorage(StorageBackend):
+    """Backend historique : un fichier JSON par type de données.
+
+    Les modifications du catalogue sont ajoutées à un journal (JSON lines) ;
+    une compaction périodique les intègre dans un nouveau snapshot de
+    catalog.json puis vide le journal.
+    """
+
+    def __init__(self, config, config_path='config/config.json', flush_delay=2.0,
+                 compact_interval=300.0, compact_threshold=500):
+        self.config = config
+        self.config_path = config_path
+        self.catalog_path = config.get('catalog_file', 'config/catalog.json')
+        self._catalog = {}
+        self._users = {}
+        self._users_source = None
+        self.journal = OperationJournal(os.path.splitext(self.catalog_path)[0] + '.journal')
+        self.compact_interval = compact_interval
+        self.compact_threshold = compact_threshold
+        self._compact_event = None
+        self._compact_task = None
+        self._snapshot_needed = False
+        self.users_writer = WriteBehindWriter(USERS_FILE, self._users_snapshot, delay=flush_delay, indent=None)
+
+    async def start(self):
+        await self.journal.start()
+        await self.users_writer.start()
+        self._compact_event = asyncio.Event()
+        if self._snapshot_needed or self.journal.size >= self.compact_threshold:
+            self._compact_event.set()
+        self._compact_task = asyncio.create_task(self._compaction_loop())
+
+    async def flush(self):
+        await self.compact()
+        await self.users_writer.flush()
+
+    async def stop(self):
+        if self._compact_task is not None:
+            self._compact_task.cancel()
+            try:
+                await self._compact_task
+            except asyncio.CancelledError:
+                pass
+            self._compact_task = None
+        await self.journal.stop()
+        await self.compact()
+        await self.users_writer.stop()
+
+    async def _compaction_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._compact_event.wait(), timeout=self.compact_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._compact_event.clear()
+            await self.compact()
+
+    async def compact(self):
+        """Intègre le journal dans un nouveau snapshot du catalogue"""
+        if not self.journal.size and not self._snapshot_needed:
+            return
+        if self.journal.lock is None:
+            self.compact_sync()
+            return
+        async with self.journal.lock:
+            pending = self.journal.pending_count()
+            self._snapshot_needed = False
+            try:
+                text = json.dumps(self._catalog, indent=4, ensure_ascii=False)
+                await asyncio.to_thread(atomic_write_text, self.catalog_path, text)
+                self.journal.truncate(pending)
+            except Exception as e:
+                self._snapshot_needed = True
+                logger.error(f"Erreur lors de la compaction du catalogue : {e}")
+
+    def compact_sync(self):
+        atomic_write_json(self.catalog_path, self._catalog)
+        self.journal.truncate(self.journal.pending_count())
+        self._snapshot_needed = False
+
+    def _log(self, record):
+        self.journal.append(record)
+        if self._compact_event is not None and self.journal.size >= self.compact_threshold:
+            self._compact_event.set()
+
+    @staticmethod
+    def _read(path, default):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+
+    # Catalogue
+    def load_catalog(self):
+        """Charge le dernier snapshot puis rejoue le journal par-dessus"""
+        self._catalog = self._read(self.catalog_path, {})
+        for record in self.journal.read():
+            apply_catalog_operation(self._catalog, record)
+        return self._catalog
+
+    def save_catalog(self, catalog):
+        # Réécriture complète : un nouveau snapshot remplace le journal
+        self._catalog = catalog
+        self._snapshot_needed = True
+        if self._compact_event is not None:
+            self._compact_event.set()
+
+    def put_catalog_category(self, category):
+        self._log({'op': 'put_category', 'category': category})
+
+    def delete_catalog_category(self, category):
+        self._log({'op': 'delete_category', 'category': category})
+
+    def put_catalog_product(self, category, product, old_name=None):
+        record = {'op': 'put_product', 'category': category, 'product': product}
+        if old_name is not None and old_name != product['name']:
+            record['old_name'] = old_name
+        self._log(record)
+
+    def delete_catalog_product(self, category, product_name):
+        self._log({'op': 'delete_product', 'category': category, 'name': product_name})
+
+    # Catégories et produits indexés par id
+    def source_version(self):
+        versions = []
+        for path in (CATEGORIES_FILE, PRODUCTS_FILE):
+            try:
+                versions.append(os.stat(path).st_mtime_ns)
+            except FileNotFoundError:
+                versions.append(None)
+        return tuple(versions)
+
+    def load_categories(self):
+        return self._read(CATEGORIES_FILE, [])
+
+    def save_category(self, category):
+        categories = [c for c in self.load_categories() if c['id'] != category['id']]
+        categories.append(category)
+        atomic_write_json(CATEGORIES_FILE, categories)
+
+    def delete_category(self, category_id):
+        categories = [c for c in self.load_categories() if c['id'] != category_id]
+        atomic_write_json(CATEGORIES_FILE, categories)
+
+    def load_products(self):
+        return self._read(PRODUCTS_FILE, [])
+
+    def get_product(self, product_id):
+        return next((p for p in self.load_products() if p['id'] == product_id), None)
+
+    def save_product(self, product):
+        products = [p for p in self.load_products() if p['id'] != product['id']]
+        products.append(product)
+        atomic_write_json(PRODUCTS_FILE, products)
+
+    # Utilisateurs
+    def load_users(self):
+        data = self._read(USERS_FILE, {})
+        if isinstance(data, list):  # Ancien format (liste d'IDs)
+            now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+            data = {user_id: {'username': None, 'first_name': None, 'last_name': None, 'last_seen': now}
+                    for user_id in data}
+        users = {int(k): v for k, v in data.items()}
+        if self._users_source is None:
+            self._users = dict(users)
+        return users
+
+    def attach_users(self, snapshot):
+        # Le registre en mémoire devient la seule copie des utilisateurs
+        self._users_source = snapshot
+        self._users = {}
+
+    def _users_snapshot(self):
+        if self._users_source is not None:
+            return self._users_source()
+        return {str(user_id): info for user_id, info in self._users.items()}
+
+    def save_users(self, users):
+        if self._users_source is None:
+            self._users.update(users)
+        self.users_writer.mark_dirty()
+
+    def delete_users(self, user_ids):
+        if self._users_source is None:
+            for user_id in user_ids:
+                self._users.pop(user_id, None)
+        self.users_writer.mark_dirty()
+
+    # Contrôle d'accès (stocké dans config.json)
+    def load_access_control(self):
+        if 'access_control' not in self.config:
+            self.config['access_control'] = _default_access_control()
+            self._save_config()
+        return self.config['access_control']
+
+    def _save_config(self):
+        try:
+            atomic_write_json(self.config_path, self.config)
+        except Exception as e:
+            logger.error(f"Erreur lors de la sauvegarde de la configuration : {e}")
+
+    def set_access_enabled(self, enabled):
+        self.config['access_control']['enabled'] = enabled
+        self._save_config()
+
+    def put_access_code(self, code, info):
+        self.config['access_control']['valid_codes'][code] = info
+        self._save_config()
+
+    def delete_access_codes(self, codes):
+        for code in codes:
+            self.config['access_control']['valid_codes'].pop(code, None)
+        self._save_config()
+
+    def add_authorized_user(self, user_id):
+        authorized = self.config['access_control'].setdefault('authorized_users', [])
+        if user_id not in authorized:
+            authorized.append(user_id)
+        self._save_config()
+
+
+class SQLiteStorage(StorageBackend):
+    """Backend SQLite : chaque modification ne touche que les lignes concernées"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS catalog_categories (
+            name TEXT PRIMARY KEY,
+            position INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS catalog_products (
+            category TEXT NOT NULL,
+            name TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (category, name)
+        );
+        CREATE INDEX IF NOT EXISTS idx_catalog_products_category
+            ON catalog_products (category, position);
+        CREATE TABLE IF NOT EXISTS categories (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS products (
+            id TEXT PRIMARY KEY,
+            category_id TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_products_category ON products (category_id);
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            last_seen INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_users_last_seen ON users (last_seen);
+        CREATE TABLE IF NOT EXISTS access_codes (
+            code TEXT PRIMARY KEY,
+            used INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS authorized_users (
+            user_id TEXT PRIMARY KEY
+        );
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, path='data/bot.db'):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+        self._migrate_users()
+        self.conn.commit()
+        self._access = None
+
+    def _migrate_users(self):
+        """Anciennes bases : last_seen en TEXT (date texte) -> INTEGER (timestamp epoch)"""
+        columns = {name: col_type for _, name, col_type, *_ in self.conn.execute('PRAGMA table_info(users)')}
+        if columns.get('last_seen', '').upper() == 'INTEGER':
+            return
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE users_migrated (
+                    user_id INTEGER PRIMARY KEY,
+                    username TEXT,
+                    first_name TEXT,
+                    last_name TEXT,
+                    last_seen INTEGER
+                );
+                INSERT INTO users_migrated (user_id, username, first_name, last_name, last_seen)
+                SELECT user_id, username, first_name, last_name,
+                       CASE
+                           WHEN last_seen GLOB '[0-9]*' AND last_seen NOT GLOB '*[^0-9]*'
+                               THEN CAST(last_seen AS INTEGER)
+                           ELSE CAST(strftime('%s', last_seen) AS INTEGER)
+                       END
+                FROM users;
+                DROP TABLE users;
+                ALTER TABLE users_migrated RENAME TO users;
+                CREATE INDEX IF NOT EXISTS idx_users_last_seen ON users (last_seen);
+            """)
+
+    async def stop(self):
+        self.conn.close()
+
+    def get_setting(self, key, default=None):
+        row = self.conn.execute('SELECT value FROM settings WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_setting(self, key, value):
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                (key, json.dumps(value))
+            )
+
+    # Catalogue
+    def load_catalog(self):
+        catalog = {}
+        for (name,) in self.conn.execute('SELECT name FROM catalog_categories ORDER BY position'):
+            catalog[name] = []
+        rows = self.conn.execute('SELECT category, data FROM catalog_products ORDER BY category, position')
+        for category, data in rows:
+            catalog.setdefault(category, []).append(json.loads(data))
+        return catalog
+
+    def save_catalog(self, catalog):
+        with self.conn:
+            self.conn.execute('DELETE FROM catalog_categories')
+            self.conn.execute('DELETE FROM catalog_products')
+            for position, (category, products) in enumerate(catalog.items()):
+                self.conn.execute(
+                    'INSERT INTO catalog_categories (name, position) VALUES (?, ?)',
+                    (category, position)
+                )
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO catalog_products (category, name, position, data) VALUES (?, ?, ?, ?)',
+                    [(category, p['name'], i, json.dumps(p, ensure_ascii=False)) for i, p in enumerate(products)]
+                )
+
+    def put_catalog_category(self, category):
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR IGNORE INTO catalog_categories (name, position) '
+                'VALUES (?, (SELECT COALESCE(MAX(position), -1) + 1 FROM catalog_categories))',
+                (category,)
+            )
+
+    def delete_catalog_category(self, category):
+        with self.conn:
+            self.conn.execute('DELETE FROM catalog_categories WHERE name = ?', (category,))
+            self.conn.execute('DELETE FROM catalog_products WHERE category = ?', (category,))
+
+    def put_catalog_product(self, category, product, old_name=None):
+        data = json.dumps(product, ensure_ascii=False)
+        with self.conn:
+            if old_name is not None and old_name != product['name']:
+                self.conn.execute(
+                    'UPDATE catalog_products SET name = ?, data = ? WHERE category = ? AND name = ?',
+                    (product['name'], data, category, old_name)
+                )
+                return
+            updated = self.conn.execute(
+                'UPDATE catalog_products SET data = ? WHERE category = ? AND name = ?',
+                (data, category, product['name'])
+            ).rowcount
+            if not updated:
+                self.conn.execute(
+                    'INSERT OR IGNORE INTO catalog_categories (name, position) '
+                    'VALUES (?, (SELECT COALESCE(MAX(position), -1) + 1 FROM catalog_categories))',
+                    (category,)
+                )
+                self.conn.execute(
+                    'INSERT INTO catalog_products (category, name, position, data) '
+                    'VALUES (?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM catalog_products WHERE category = ?), ?)',
+                    (category, product['name'], category, data)
+                )
+
+    def delete_catalog_product(self, category, product_name):
+        with self.conn:
+            self.conn.execute(
+                'DELETE FROM catalog_products WHERE category = ? AND name = ?',
+                (category, product_name)
+            )
+
+    # Catégories et produits indexés par id
+    def load_categories(self):
+        rows = self.conn.execute('SELECT id, name FROM categories ORDER BY rowid')
+        return [{'id': category_id, 'name': name} for category_id, name in rows]
+
+    def save_category(self, category):
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO categories (id, name) VALUES (?, ?)',
+                (category['id'], category['name'])
+            )
+
+    def delete_category(self, category_id):
+        with self.conn:
+            self.conn.execute('DELETE FROM categories WHERE id = ?', (category_id,))
+
+    def load_products(self):
+        return [json.loads(data) for (data,) in self.conn.execute('SELECT data FROM products ORDER BY rowid')]
+
+    def get_product(self, product_id):
+        row = self.conn.execute('SELECT data FROM products WHERE id = ?', (product_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_product(self, product):
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO products (id, category_id, data) VALUES (?, ?, ?)',
+                (product['id'], product.get('category_id'), json.dumps(product, ensure_ascii=False))
+            )
+
+    # Utilisateurs
+    def load_users(self):
+        rows = self.conn.execute('SELECT user_id, username, first_name, last_name, last_seen FROM users')
+        return {
+            user_id: {'username': username, 'first_name': first_name, 'last_name': last_name, 'last_seen': last_seen}
+            for user_id, username, first_name, last_name, last_seen in rows
+        }
+
+    def save_users(self, users):
+        # last_seen toujours en timestamp epoch, même depuis l'ancien format texte (import JSON)
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO users (user_id, username, first_name, last_name, last_seen) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(int(user_id), info.get('username'), info.get('first_name'), info.get('last_name'),
+                  last_seen_epoch(info.get('last_seen')))
+                 for user_id, info in users.items()]
+            )
+
+    def delete_users(self, user_ids):
+        with self.conn:
+            self.conn.executemany('DELETE FROM users WHERE user_id = ?', [(int(u),) for u in user_ids])
+
+    # Contrôle d'accès
+    def load_access_control(self):
+        if self._access is None:
+            self._access = {
+                'enabled': self.get_setting('access_enabled', False),
+                'valid_codes': {
+                    code: {'used': bool(used), 'created_at': created_at}
+                    for code, used, created_at in self.conn.execute('SELECT code, used, created_at FROM access_codes')
+                },
+                'authorized_users': [u for (u,) in self.conn.execute('SELECT user_id FROM authorized_users')]
+            }
+        return self._access
+
+    def set_access_enabled(self, enabled):
+        self.load_access_control()['enabled'] = enabled
+        self.set_setting('access_enabled', enabled)
+
+    def put_access_code(self, code, info):
+        self.load_access_control()['valid_codes'][code] = info
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO access_codes (code, used, created_at) VALUES (?, ?, ?)',
+                (code, int(info.get('used', False)), info['created_at'])
+            )
+
+    def delete_access_codes(self, codes):
+        valid_codes = self.load_access_control()['valid_codes']
+        for code in codes:
+            valid_codes.pop(code, None)
+        with self.conn:
+            self.conn.executemany('DELETE FROM access_codes WHERE code = ?', [(c,) for c in codes])
+
+    def add_authorized_user(self, user_id):
+        authorized = self.load_access_control()['authorized_users']
+        if user_id not in authorized:
+            authorized.append(user_id)
+        with self.conn:
+            self.conn.execute('INSERT OR IGNORE INTO authorized_users (user_id) VALUES (?)', (user_id,))
+
+
+def migrate_json_to_sqlite(config, sqlite_storage):
+    """Importe une seule fois les fichiers JSON existants dans la base SQLite"""
+    if sqlite_storage.get_setting('json_migrated'):
+        return False
+
+    source = JsonStorage(config)
+    catalog = source.load_catalog()
+    # Les anciennes statistiques stockées dans le catalogue ont leur propre fichier
+    legacy_stats = catalog.pop('stats', None)
+    if legacy_stats is not None and not os.path.exists(STATS_FILE):
+        atomic_write_json(STATS_FILE, legacy_stats)
+    sqlite_storage.save_catalog(catalog)
+    for category in source.load_categories():
+        sqlite_storage.save_category(category)
+    for product in source.load_products():
+        sqlite_storage.save_product(product)
+    sqlite_storage.save_users(source.load_users())
+
+    access = config.get('access_control') or _default_access_control()
+    sqlite_storage.set_access_enabled(access.get('enabled', False))
+    for code, info in access.get('valid_codes', {}).items():
+        sqlite_storage.put_access_code(code, info)
+    for user_id in access.get('authorized_users', []):
+        sqlite_storage.add_authorized_user(user_id)
+
+    sqlite_storage.set_setting('json_migrated', True)
+    logger.info("Migration des fichiers JSON vers SQLite terminée")
+    return True
+
+
+def create_storage(config, config_path='config/config.json'):
+    """Instancie le backend configuré dans config['storage'] (JSON par défaut)"""
+    options = config.get('storage', {})
+    backend = options.get('backend', 'json')
+
+    if backend == 'sqlite':
+        storage = SQLiteStorage(options.get('path', 'data/bot.db'))
+        migrate_json_to_sqlite(config, storage)
+        return storage
+    if backend == 'json':
+        return JsonStorage(
+            config, config_path,
+            flush_delay=config.get('catalog_flush_delay', 2.0),
+            compact_interval=options.get('compact_interval', 300.0),
+            compact_threshold=options.get('compact_threshold', 500)
+        )
+    raise ValueError(f"Backend de stockage inconnu : {backend}")
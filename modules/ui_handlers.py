@@ -1,92 +1,102 @@
-﻿import json
-import logging
+﻿import logging
 from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from telegram import InputMediaPhoto
 from config.states import CHOOSING, CHOOSING_PRODUCT  # Ajoute les états dont tu as besoin
+from modules.callbacks import callback_codec
+from modules.media_assets import MediaAssetCache
+from modules.render_cache import RenderCache
 
 # États de conversation (à importer depuis un fichier central de constantes plus tard si tu veux)
 CHOOSING = "CHOOSING"
 
 class UIHandler:
-    def __init__(self, config, save_active_users_callback, catalog, admin_ids):
+    def __init__(self, config, save_active_users_callback, catalog, admin_ids, catalog_cache, render_cache=None,
+                 asset_cache=None):
         self.config = config
         self.save_active_users = save_active_users_callback
         self.catalog = catalog
         self.admin_ids = admin_ids # Ajout de cette ligne
+        self.catalog_cache = catalog_cache
+        self.render_cache = render_cache if render_cache is not None else RenderCache()
+        self.asset_cache = asset_cache if asset_cache is not None else MediaAssetCache({})
 
-    async def show_categories(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Affiche les catégories disponibles"""
+    def _render_categories(self):
         keyboard = []
     
-        # Charger les catégories depuis le fichier JSON
-        try:
-            with open('data/categories.json', 'r', encoding='utf-8') as f:
-                categories = json.load(f)
+        # Catégories servies depuis le cache partagé
+        categories = self.catalog_cache.categories()
             
-            # Créer les boutons pour chaque catégorie
-            for category in categories:
-                keyboard.append([InlineKeyboardButton(
-                    category['name'], 
-                    callback_data=f"category_{category['id']}"
-                )])
-        except FileNotFoundError:
-            keyboard = []
+        # Créer les boutons pour chaque catégorie
+        for category in categories:
+            keyboard.append([InlineKeyboardButton(
+                category['name'], 
+                callback_data=callback_codec.encode('show_category_id', category['id'])
+            )])
     
         # Ajouter le bouton retour
         keyboard.append([InlineKeyboardButton("🔙 Retour", callback_data="back_to_home")])
+        return "🗂 *Catégories disponibles*\n\nChoisissez une catégorie :", InlineKeyboardMarkup(keyboard)
+
+    async def show_categories(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Affiche les catégories disponibles"""
+        text, reply_markup = self.render_cache.get(
+            'ui_categories', None, self.catalog_cache.data_version(), False, self._render_categories
+        )
     
         if update.callback_query:
             await update.callback_query.answer()
             await update.callback_query.message.delete()
             await update.callback_query.message.reply_text(
-                "🗂 *Catégories disponibles*\n\nChoisissez une catégorie :",
-                reply_markup=InlineKeyboardMarkup(keyboard),
+                text,
+                reply_markup=reply_markup,
                 parse_mode='Markdown'
             )
         else:
             await update.message.reply_text(
-                "🗂 *Catégories disponibles*\n\nChoisissez une catégorie :",
-                reply_markup=InlineKeyboardMarkup(keyboard),
+                text,
+                reply_markup=reply_markup,
                 parse_mode='Markdown'
             )
     
         return CHOOSING
 
-    async def show_products(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def show_products(self, update: Update, context: ContextTypes.DEFAULT_TYPE, category_id):
         """Affiche les produits d'une catégorie"""
         query = update.callback_query
-        category = query.data.replace("category_", "")
+        category = self.catalog_cache.get_category(category_id)
         
-        if category in self.CATALOG:
-            products = self.CATALOG[category]
-            keyboard = []
-            for product in products:
-                keyboard.append([InlineKeyboardButton(
-                    product['name'], 
-                    callback_data=f"product_{category}_{product['name']}"
-                )])
-            keyboard.append([InlineKeyboardButton("🔙 Retour", callback_data="show_categories")])
-            
+        if category is not None:
+            text, reply_markup = self.render_cache.get(
+                'ui_products', category_id, self.catalog_cache.data_version(), False,
+                lambda: self._render_products(category)
+            )
             await query.edit_message_text(
-                f"*{category}*\n\nChoisissez un produit :",
-                reply_markup=InlineKeyboardMarkup(keyboard),
+                text,
+                reply_markup=reply_markup,
                 parse_mode='Markdown'
             )
         return CHOOSING
 
-    async def show_product_details(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    def _render_products(self, category):
+        products = self.catalog_cache.products_in_category(category['id'])
+        keyboard = []
+        for product in products:
+            keyboard.append([InlineKeyboardButton(
+                product['name'], 
+                callback_data=callback_codec.encode('product_details_id', product['id'])
+            )])
+        keyboard.append([InlineKeyboardButton("🔙 Retour", callback_data="show_categories")])
+        return f"*{category['name']}*\n\nChoisissez un produit :", InlineKeyboardMarkup(keyboard)
+
+    async def show_product_details(self, update: Update, context: ContextTypes.DEFAULT_TYPE, product_id):
         """Affiche les détails d'un produit"""
         query = update.callback_query
-        product_id = query.data.replace("product_", "")
         
         try:
-            # Charger le produit depuis le fichier JSON
-            with open('data/products.json', 'r', encoding='utf-8') as f:
-                products = json.load(f)
-            
-            product = next((p for p in products if p['id'] == product_id), None)
+            # Recherche O(1) dans le cache partagé
+            product = self.catalog_cache.get_product(product_id)
             
             if product:
                 media = product['media']
@@ -135,10 +145,11 @@ class UIHandler:
                     "Produit non trouvé.",
                     reply_markup=InlineKeyboardMarkup(keyboard)
                 )
-        except FileNotFoundError:
+        except Exception as e:
+            logging.error(f"Erreur dans show_product_details: {str(e)}")
             keyboard = [[InlineKeyboardButton("🔙 Retour", callback_data="show_categories")]]
             await query.message.edit_text(
-                "Erreur : fichier produits non trouvé.",
+                "Erreur : impossible de charger les produits.",
                 reply_markup=InlineKeyboardMarkup(keyboard)
             )
         
@@ -163,31 +174,39 @@ class UIHandler:
             )
 
             try:
-                with open('assets/banner.jpg', 'rb') as photo:
-                    if update.callback_query:
-                        await update.callback_query.message.delete()
-                        message = await update.callback_query.message.reply_photo(
+                # Bannière envoyée une seule fois, puis réutilisée par son file_id ;
+                # l'ancien message n'est supprimé qu'une fois le nouveau envoyé
+                if update.callback_query:
+                    await self.asset_cache.send(
+                        'assets/banner.jpg',
+                        lambda photo: update.callback_query.message.reply_photo(
                             photo=photo,
                             caption=message_text,
                             reply_markup=InlineKeyboardMarkup(keyboard),
                             parse_mode='Markdown'
                         )
-                        await update.callback_query.answer()
-                    else:
-                        await update.message.reply_photo(
+                    )
+                    await update.callback_query.message.delete()
+                    await update.callback_query.answer()
+                else:
+                    await self.asset_cache.send(
+                        'assets/banner.jpg',
+                        lambda photo: update.message.reply_photo(
                             photo=photo,
                             caption=message_text,
                             reply_markup=InlineKeyboardMarkup(keyboard),
                             parse_mode='Markdown'
                         )
+                    )
             except FileNotFoundError:
                 # Si la bannière n'est pas trouvée, envoyer juste le texte
                 if update.callback_query:
-                    await update.callback_query.message.edit_text(
+                    await update.callback_query.message.reply_text(
                         text=message_text,
                         reply_markup=InlineKeyboardMarkup(keyboard),
                         parse_mode='Markdown'
                     )
+                    await update.callback_query.message.delete()
                     await update.callback_query.answer()
                 else:
                     await update.message.reply_text(
@@ -203,26 +222,10 @@ class UIHandler:
     async def show_admin_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Affiche le menu administrateur"""
         user_id = str(update.effective_user.id)
-        keyboard = []
-        message_text = ""
-
-        # Vérifie si l'utilisateur est admin
-        if user_id not in self.admin_ids:
-            keyboard = [[InlineKeyboardButton("🔙 Retour", callback_data="back_to_home")]]
-            message_text = "⛔️ Accès refusé. Vous n'avez pas les droits d'administration."
-        else:
-            # Menu admin pour les utilisateurs autorisés
-            keyboard = [
-                [InlineKeyboardButton("➕ Ajouter un produit", callback_data="add_product")],
-                [InlineKeyboardButton("✏️ Modifier un produit", callback_data="edit_product")],
-                [InlineKeyboardButton("❌ Supprimer un produit", callback_data="remove_product")],
-                [InlineKeyboardButton("📁 Ajouter une catégorie", callback_data="add_category")],
-                [InlineKeyboardButton("🗑 Supprimer une catégorie", callback_data="remove_category")],
-                [InlineKeyboardButton("🔐 Gérer les accès", callback_data="manage_access")],
-                [InlineKeyboardButton("📢 Message général", callback_data="broadcast")],
-                [InlineKeyboardButton("🔙 Retour", callback_data="back_to_home")]
-            ]
-            message_text = "🔧 *Menu Administrateur*\n\nQue souhaitez-vous faire ?"
+        is_admin = user_id in self.admin_ids
+        message_text, reply_markup = self.render_cache.get(
+            'ui_admin_menu', None, 0, is_admin, lambda: self._render_admin_menu(is_admin)
+        )
 
         if update.callback_query:
             await update.callback_query.answer()
@@ -232,14 +235,35 @@ class UIHandler:
                 pass
             await update.callback_query.message.reply_text(
                 text=message_text,
-                reply_markup=InlineKeyboardMarkup(keyboard),
+                reply_markup=reply_markup,
                 parse_mode='Markdown'
             )
         else:
             await update.message.reply_text(
                 text=message_text,
-                reply_markup=InlineKeyboardMarkup(keyboard),
+                reply_markup=reply_markup,
                 parse_mode='Markdown'
             )
 
-        return CHOOSING if user_id in self.admin_ids else CHOOSING
\ No newline at end of file
+        return CHOOSING if user_id in self.admin_ids else CHOOSING
+
+    @staticmethod
+    def _render_admin_menu(is_admin):
+        # Vérifie si l'utilisateur est admin
+        if not is_admin:
+            keyboard = [[InlineKeyboardButton("🔙 Retour", callback_data="back_to_home")]]
+            message_text = "⛔️ Accès refusé. Vous n'avez pas les droits d'administration."
+        else:
+            # Menu admin pour les utilisateurs autorisés
+            keyboard = [
+                [InlineKeyboardButton("➕ Ajouter un produit", callback_data="add_product")],
+                [InlineKeyboardButton("✏️ Modifier un produit", callback_data="edit_product")],
+                [InlineKeyboardButton("❌ Supprimer un produit", callback_data="remove_product")],
+                [InlineKeyboardButton("📁 Ajouter une catégorie", callback_data="add_category")],
+                [InlineKeyboardButton("🗑 Supprimer une catégorie", callback_data="remove_category")],
+                [InlineKeyboardButton("🔐 Gérer les accès", callback_data="manage_access")],
+                [InlineKeyboardButton("📢 Message général", callback_data="broadcast")],
+                [InlineKeyboardButton("🔙 Retour", callback_data="back_to_home")]
+            ]
+            message_text = "🔧 *Menu Administrateur*\n\nQue souhaitez-vous faire ?"
+        return message_text, InlineKeyboardMarkup(keyboard)
\ No newline at end of file
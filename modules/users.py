@@ -0,0 +1,202 @@
+﻿# modules/users.py
+import sys
+import time
+from array import array
+from datetime import datetime, timezone
+
+LAST_SEEN_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Ordres de tri disponibles pour la liste paginée
+SORT_RECENT = 'recent'
+SORT_NAME = 'name'
+
+
+def last_seen_epoch(value):
+    """Convertit un last_seen (texte UTC, timestamp ou timestamp en texte) en timestamp epoch entier, ou None"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    if not value:
+        return None
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    try:
+        # fromisoformat accepte LAST_SEEN_FORMAT et est bien plus rapide que strptime
+        return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def _intern(value):
+    return sys.intern(value) if value else None
+
+
+class UserRecord:
+    """Utilisateur connu du bot (représentation compacte, sans __dict__)"""
+
+    __slots__ = ('user_id', 'username', 'first_name', 'last_name', 'last_seen')
+
+    def __init__(self, user_id, username=None, first_name=None, last_name=None, last_seen=None):
+        self.user_id = user_id
+        self.username = _intern(username)
+        self.first_name = _intern(first_name)
+        self.last_name = _intern(last_name)
+        self.last_seen = last_seen  # Timestamp epoch (int) ou None
+
+    @property
+    def full_name(self):
+        return f"{self.first_name or ''} {self.last_name or ''}".strip() or "Nom inconnu"
+
+    def seen_key(self):
+        return (self.last_seen or 0, self.user_id)
+
+    def name_key(self):
+        return (self.full_name.casefold(), self.user_id)
+
+    def last_seen_str(self):
+        if self.last_seen is None:
+            return 'Inconnu'
+        return datetime.utcfromtimestamp(self.last_seen).strftime(LAST_SEEN_FORMAT)
+
+    def to_dict(self):
+        return {
+            'username': self.username,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'last_seen': self.last_seen
+        }
+
+
+class UserRegistry:
+    """Registre en mémoire des utilisateurs actifs.
+
+    Les enregistrements utilisent __slots__, last_seen est un entier epoch et
+    les noms sont internés (les prénoms courants ne sont stockés qu'une fois).
+    Deux index triés (dernière activité, nom) sont tenus à jour par
+    dichotomie à chaque modification : une page de la liste des utilisateurs
+    se lit par simple découpage, sans tri. Les index ne contiennent que les
+    user_id (array de 8 octets par entrée) ; les clés de tri sont recalculées
+    depuis les enregistrements lors des comparaisons.
+    """
+
+    def __init__(self):
+        self._users = {}
+        self._seen_index = array('q')  # user_id par (last_seen, user_id) croissants
+        self._name_index = array('q')  # user_id par (nom en minuscules, user_id) croissants
+
+    def _seen_key(self, user_id):
+        return self._users[user_id].seen_key()
+
+    def _name_key(self, user_id):
+        return self._users[user_id].name_key()
+
+    def load(self, users):
+        """Charge les utilisateurs depuis le format du stockage {user_id: infos}"""
+        self._users = {}
+        for user_id, info in users.items():
+            user_id = int(user_id)
+            self._users[user_id] = UserRecord(
+                user_id,
+                info.get('username'),
+                info.get('first_name'),
+                info.get('last_name'),
+                last_seen_epoch(info.get('last_seen'))
+            )
+        self._seen_index = array('q', sorted(self._users, key=self._seen_key))
+        self._name_index = array('q', sorted(self._users, key=self._name_key))
+
+    # Lecture
+    def __len__(self):
+        return len(self._users)
+
+    def __contains__(self, user_id):
+        return user_id in self._users
+
+    def __iter__(self):
+        return iter(self._users)
+
+    def get(self, user_id):
+        return self._users.get(user_id)
+
+    def ids(self):
+        """Liste figée des identifiants (pour une diffusion)"""
+        return list(self._users)
+
+    def records(self):
+        return self._users.values()
+
+    def page(self, sort=SORT_RECENT, offset=0, limit=20):
+        """Utilisateurs [offset, offset + limit) dans l'ordre demandé (récents d'abord, ou par nom)"""
+        if sort == SORT_NAME:
+            user_ids = self._name_index[offset:offset + limit]
+        else:
+            end = len(self._seen_index) - offset
+            user_ids = reversed(self._seen_index[max(0, end - limit):max(0, end)])
+        return [self._users[user_id] for user_id in user_ids]
+
+    # Écriture
+    def touch(self, user_id, username=None, first_name=None, last_name=None, now=None):
+        """Crée ou met à jour un utilisateur et son last_seen"""
+        last_seen = int(now if now is not None else time.time())
+        record = self._users.get(user_id)
+        if record is None:
+            record = self._users[user_id] = UserRecord(user_id, username, first_name, last_name, last_seen)
+            self._insert(self._seen_index, record.seen_key(), self._seen_key)
+            self._insert(self._name_index, record.name_key(), self._name_key)
+            return record
+
+        # Une entrée d'index est retirée avant que sa clé change, puis réinsérée
+        if record.username != username:
+            record.username = _intern(username)
+        if (record.first_name, record.last_name) != (first_name, last_name):
+            self._discard(self._name_index, record.name_key(), self._name_key)
+            record.first_name = _intern(first_name)
+            record.last_name = _intern(last_name)
+            self._insert(self._name_index, record.name_key(), self._name_key)
+        if record.last_seen != last_seen:
+            self._discard(self._seen_index, record.seen_key(), self._seen_key)
+            record.last_seen = last_seen
+            self._insert(self._seen_index, record.seen_key(), self._seen_key)
+        return record
+
+    def remove(self, user_ids):
+        """Supprime des utilisateurs ; retourne les identifiants effectivement supprimés"""
+        removed = []
+        for user_id in user_ids:
+            record = self._users.get(user_id)
+            if record is None:
+                continue
+            # Retrait des index avant celui du registre : leurs clés lisent self._users
+            self._discard(self._seen_index, record.seen_key(), self._seen_key)
+            self._discard(self._name_index, record.name_key(), self._name_key)
+            del self._users[user_id]
+            removed.append(user_id)
+        return removed
+
+    @staticmethod
+    def _bisect(index, key, key_of):
+        """Première position de `index` dont la clé n'est pas inférieure à `key`"""
+        low, high = 0, len(index)
+        while low < high:
+            middle = (low + high) // 2
+            if key_of(index[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _insert(self, index, key, key_of):
+        index.insert(self._bisect(index, key, key_of), key[-1])
+
+    def _discard(self, index, key, key_of):
+        position = self._bisect(index, key, key_of)
+        if position < len(index) and index[position] == key[-1]:
+            del index[position]
+
+    # Persistance
+    def to_storage(self, user_ids):
+        """Format du stockage pour les utilisateurs donnés"""
+        return {user_id: self._users[user_id].to_dict() for user_id in user_ids if user_id in self._users}
+
+    def snapshot(self):
+        """Tous les utilisateurs, au format du fichier JSON"""
+        return {str(user_id): record.to_dict() for user_id, record in self._users.items()}